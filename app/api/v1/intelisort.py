@@ -7,27 +7,64 @@ from fastapi import (
     UploadFile,
     BackgroundTasks,
     HTTPException,
-    Query,
+    Query as FastAPIQuery,
+    Depends,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from loguru import logger
-from app.function import example
-from app.function.validator.data_import import validate_csv
+from app.function.validator.data_import import validate_csv, validate_fields
 from app.model import base_response, kumyarb, query
 import os
 from redis import asyncio as aioredis
-import pandas as pd
-import numpy as np
-from pythainlp.tokenize import word_tokenize
-import pythainlp
-from app.function.helper import *
+from app.function.helper import (
+    clear_database,
+    count_pending_embeddings,
+    get_info_index,
+    iter_raw_data,
+    migrate_index_schema,
+    query_all_texts_from_distance,
+    query_all_texts_from_similarity,
+)
+from app.function.batcher import get_query_batcher
+from app.function.embedding_cache import embedding_cache
+from app.function.query_cache import query_cache
+from app.db.redis import init_redis, get_redis, close_redis, file_fingerprint, run_once
+from app.function.lexicon import kumyarb_lexicon, read_lexicon_csv
+from app.function.encoder import warm_up_encoder
+from app.function.startup import startup_profile, warm_up
+from app.function.metrics import publish_metrics_forever
+from app.function.geo import query_all_texts_from_area
+from app.function.hybrid import query_all_texts_hybrid
+from app.function.priority import (
+    query_top_priority,
+    queue_all_priorities,
+    requeue_neighbours,
+    score_pending_priorities,
+)
+from app.function.cluster import cluster_all, cluster_pending
+from app.function.ingest import spool_upload, open_csv
+from app.function.jobs import ImportJob, run_import_job, get_job, list_jobs, cancel_job
+from app.function.tokenizer import (
+    start_tokenizer_pool,
+    shutdown_tokenizer_pool,
+    tokenize_many,
+    iter_tokenized,
+    warm_up as warm_up_tokenizer,
+)
+from app.config.config import (
+    LEXICON_VERSION_KEY_NAME,
+    IMPORT_INDEX_LOCK_KEY_NAME,
+    TEXT_INDEX_NAME,
+    KUMYARB_CSV_PATH,
+    STARTUP_WARM_UP,
+)
+import asyncio
 import io
+import json
 import csv
 import codecs
-from typing import List, Optional
-
-redis = None
+from typing import List, Literal, Optional
 
 # define logger format
 logger.remove(0)
@@ -38,22 +75,48 @@ logger.add(
 )
 
 
+_warm_up_task = None
+_metrics_task = None
+
+
 async def startup_event():
+    global _warm_up_task, _metrics_task
+    startup_profile.begin()
     logger.info("Connecting to database...")
-    global redis
-    redis = await aioredis.from_url(
-        os.environ.get("REDISCLOUD_URL", "redis://localhost")
-    )  # Default to localhost if env var is missing
-    logger.info("Loading csv into Redis")
-    logger.info(os.getcwd())
-    await load_csv_to_redis(redis=redis)
-    logger.info("Kumyarb words loaded into Redis")
+    with startup_profile.phase("connect"):
+        redis = await init_redis()
+    # every worker runs this hook, only one of them loads the lexicon file
+    with startup_profile.phase("lexicon"):
+        loaded = await run_once(
+            redis,
+            "kumyarb",
+            file_fingerprint(KUMYARB_CSV_PATH),
+            lambda: load_csv_to_redis(redis=redis),
+        )
+        if loaded:
+            logger.info("Loaded kumyarb csv into Redis")
+        await kumyarb_lexicon.refresh(redis)
+    logger.info(f"Kumyarb words loaded from Redis ({len(kumyarb_lexicon.severity)} words)")
+    with startup_profile.phase("tokenizer_pool"):
+        start_tokenizer_pool()
+    logger.info("Tokenizer pool warming up")
+    if STARTUP_WARM_UP:
+        # small batches are tokenized in this process, so it needs pythainlp too
+        _warm_up_task = asyncio.create_task(
+            warm_up({"tokenizer": warm_up_tokenizer, "encoder": warm_up_encoder})
+        )
+    _metrics_task = asyncio.create_task(publish_metrics_forever(redis))
+    startup_profile.ready()
 
 
 # Define your shutdown event handler
 async def shutdown_event():
     logger.info("Disconnecting from database...")
-    await redis.close()
+    for task in (_warm_up_task, _metrics_task):
+        if task is not None:
+            task.cancel()
+    shutdown_tokenizer_pool()
+    await close_redis()
 
 
 router = APIRouter()
@@ -71,27 +134,18 @@ async def health_check(request: Request) -> base_response.BaseResponseModel:
 
 
 # upload CSV data
-from starlette.status import HTTP_409_CONFLICT
-
-processing_lock = False
-chunk_counter = 0
-
-
 @router.post("/import/csv", tags=["1. import data"])
 async def import_csv(
     background_tasks: BackgroundTasks,
     csv_file: UploadFile = File(...),
+    full_export: bool = False,
+    redis: aioredis.Redis = Depends(get_redis),
 ) -> base_response.BaseStatusResponseModel:
-    global processing_lock, chunk_counter
-    if processing_lock:
-        raise HTTPException(
-            status_code=HTTP_409_CONFLICT,
-            detail="Another file is already being processed. Please try again later.",
-        )
-
-    processing_lock = True
-    chunk_counter = 0
-
+    """
+    Upserts the rows of the file, skipping unchanged ones. With `full_export`
+    the file is treated as the complete ticket list and stored tickets
+    missing from it are deleted once the import succeeds.
+    """
     logger.info(f"Uploading file: {csv_file.filename}")
     valid_columns = [
         "ticket_id",
@@ -111,69 +165,140 @@ async def import_csv(
         "count_reopen",
         "last_activity",
     ]
+    spooled = None
     try:
         if not csv_file.filename.endswith(".csv"):
             raise TypeError(
                 f"Invalid file type, only accept .csv file, but got {csv_file.filename}"
             )
-        csv_content = csv.reader(codecs.iterdecode(csv_file.file, "utf-8-sig"))
-        header = next(csv_content)
+        spooled = await spool_upload(csv_file)
+        total_bytes = spooled.seek(0, io.SEEK_END)
+        spooled.seek(0)
+        header, rows = open_csv(spooled)
         if not all([column in valid_columns for column in header]):
             raise ValueError(
                 f"Invalid file column, Required: [{', '.join(valid_columns)}] but got [{', '.join(header)}]"
             )
-        data_json = []
-        chunk_size = 200
-        for row in csv_content:
-            data_json.append(dict(zip(header, row)))
-            if len(data_json) == chunk_size:
-                chunk_counter += 1
-                background_tasks.add_task(
-                    process_chunk, data_json, redis, chunk_counter
-                )
-                data_json = []
-        if data_json:
-            chunk_counter += 1
-            background_tasks.add_task(process_chunk, data_json, redis, chunk_counter)
-        logger.info(f"File {csv_file.filename} is read successfully")
+        logger.info(f"File {csv_file.filename} is spooled successfully")
     except Exception as e:
         logger.error(f"Error reading file: {str(e)}")
-        processing_lock = False
+        if spooled is not None:
+            spooled.close()
         return base_response.BaseStatusResponseModel(
             success=False, status=f"Error reading file: {str(e)}"
         )
 
-    background_tasks.add_task(complete_processing, redis)
+    job = await ImportJob.create(redis, csv_file.filename, spooled, total_bytes, full_export)
+    background_tasks.add_task(ingest_csv, job, header, rows, redis)
     return base_response.BaseStatusResponseModel(
-        success=True, status="CSV file processing started in the background"
+        success=True,
+        status=f"CSV file import {job.id} queued",
+        content={"job_id": job.id},
     )
 
 
-async def process_chunk(data_chunk, redis, chunk_number):
-    logger.info(f"Processing data chunk: {chunk_number}")
-    await batch_add_data(data_chunk, redis)
-    await generate_embeddings_redis(redis)
+async def ingest_csv(job, header, rows, redis):
+    try:
+        await run_import_job(redis, job, header, rows, lambda: complete_processing(redis))
+    finally:
+        job.file.close()
+
+
+@router.get("/import/jobs", tags=["1. import data"])
+async def get_import_jobs(limit: int = 20, redis: aioredis.Redis = Depends(get_redis)):
+    return {"success": True, "content": await list_jobs(redis, limit)}
+
+
+@router.get("/import/jobs/{job_id}", tags=["1. import data"])
+async def get_import_job(job_id: str, redis: aioredis.Redis = Depends(get_redis)):
+    job = await get_job(redis, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown import job {job_id}")
+    return {"success": True, "content": job}
+
+
+@router.post("/import/jobs/{job_id}/cancel", tags=["1. import data"])
+async def cancel_import_job(job_id: str, redis: aioredis.Redis = Depends(get_redis)):
+    job = await cancel_job(redis, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown import job {job_id}")
+    return {"success": True, "content": job}
 
 
 async def complete_processing(redis):
-    global processing_lock
-    response = await create_index_text(redis)
+    pending = await count_pending_embeddings(redis)
+    if pending:
+        logger.warning(f"{pending} documents are still waiting for embeddings")
+    # concurrent imports on any worker finish one at a time here, so only one
+    # of them creates or migrates the index
+    async with redis.lock(IMPORT_INDEX_LOCK_KEY_NAME, timeout=3600):
+        # creates the index, or migrates it when the stored schema is outdated
+        response = await migrate_index_schema(redis)
     logger.info(f"Indexing completed successfully, {response}")
+    # new tickets change the density of the tickets around them, once per import
+    logger.info(f"Queued {await requeue_neighbours(redis)} neighbours of new tickets for rescoring")
+    # a schema migration queues every backfilled document for scoring
+    logger.info(f"Scored {await score_pending_priorities(redis)} pending tickets")
     info = await get_info_index(redis)
     logger.info(f"Data processing completed successfully, {info}")
     # await drop_index(redis) # auto delete index wtf
-    processing_lock = False
     return response
 
 
 @router.get("/index_info", tags=["Functionality"])
-async def get_index_info():
+async def get_index_info(redis: aioredis.Redis = Depends(get_redis)):
     info = await get_info_index(redis)
     return {"success": True, "content": info}
 
 
+@router.get("/embedding_cache_info", tags=["Functionality"])
+async def get_embedding_cache_info():
+    return {"success": True, "content": embedding_cache.stats()}
+
+
+@router.get("/query_cache_info", tags=["Functionality"])
+async def get_query_cache_info():
+    return {"success": True, "content": query_cache.stats()}
+
+
+@router.get("/startup_info", tags=["Functionality"])
+async def get_startup_info():
+    return {"success": True, "content": startup_profile.report()}
+
+
+@router.get("/query_batcher_info", tags=["Functionality"])
+async def get_query_batcher_info():
+    batcher = get_query_batcher()
+    return {
+        "success": True,
+        "content": {
+            "batch_size": batcher.batch_size.snapshot(),
+            "latency_seconds": batcher.latency.snapshot(),
+        },
+    }
+
+
+@router.post("/migrate_index", tags=["Functionality"])
+async def migrate_index(
+    background_tasks: BackgroundTasks,
+    algorithm: Literal["FLAT", "HNSW"] = "HNSW",
+    redis: aioredis.Redis = Depends(get_redis),
+) -> base_response.BaseStatusResponseModel:
+    background_tasks.add_task(run_index_migration, redis, algorithm)
+    return base_response.BaseStatusResponseModel(
+        success=True, status=f"Rebuilding {TEXT_INDEX_NAME} as {algorithm} in the background"
+    )
+
+
+async def run_index_migration(redis, algorithm):
+    try:
+        logger.info(await migrate_index_schema(redis, algorithm, force=True))
+    except Exception as e:
+        logger.error(f"Index migration failed: {str(e)}")
+
+
 @router.get("/complete_processing", tags=["preprocessing data"])
-async def complete_processing_api():
+async def complete_processing_api(redis: aioredis.Redis = Depends(get_redis)):
     response = await complete_processing(redis)
     return {"success": True, "content": response}
 
@@ -181,6 +306,7 @@ async def complete_processing_api():
 @router.post("/query_from_similarity", tags=["2. query data"])
 async def query_data_from_similarity(
     request: query.QuerySimilarityRequest,
+    redis: aioredis.Redis = Depends(get_redis),
 ) -> query.QuerySimilarityResponseModel:
     result = await query_all_texts_from_similarity(
         redis, queries=request.queries, top_k=request.top_k
@@ -191,25 +317,173 @@ async def query_data_from_similarity(
 @router.post("/query_from_distance", tags=["2. query data"])
 async def query_data_from_distance(
     request: query.QueryDistanceRequest,
+    redis: aioredis.Redis = Depends(get_redis),
 ) -> query.QueryDistanceResponseModel:
+    try:
+        validate_fields(request.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     result = await query_all_texts_from_distance(
-        redis, request.queries, top_k=request.top_k, radius=request.radius
+        redis,
+        request.queries,
+        top_k=request.top_k,
+        radius=request.radius,
+        fields=request.fields,
     )
     return query.QueryDistanceResponseModel(success=True, content=result)
 
 
+@router.post("/query_from_area", tags=["2. query data"])
+async def query_data_from_area(
+    request: query.QueryAreaRequest,
+    redis: aioredis.Redis = Depends(get_redis),
+) -> query.QueryDistanceResponseModel:
+    try:
+        validate_fields(request.fields)
+        result = await query_all_texts_from_area(
+            redis,
+            [q.model_dump() for q in request.queries],
+            top_k=request.top_k,
+            filters={
+                "state": request.state,
+                "type": request.type,
+                "district": request.district,
+            },
+            any=request.any,
+            fields=request.fields,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return query.QueryDistanceResponseModel(success=True, content=result)
+
+
+@router.post("/query_hybrid", tags=["2. query data"])
+async def query_data_hybrid(
+    request: query.QueryHybridRequest,
+    redis: aioredis.Redis = Depends(get_redis),
+) -> query.QueryHybridResponseModel:
+    result = await query_all_texts_hybrid(
+        redis,
+        queries=request.queries,
+        top_k=request.top_k,
+        radius=request.radius,
+        filters={
+            "state": request.state,
+            "type": request.type,
+            "district": request.district,
+        },
+        similarity_weight=request.similarity_weight,
+    )
+    return query.QueryHybridResponseModel(success=True, content=result)
+
+
+@router.post("/top_priority", tags=["2. query data"])
+async def top_priority(
+    request: query.TopPriorityRequest,
+    redis: aioredis.Redis = Depends(get_redis),
+) -> query.TopPriorityResponseModel:
+    try:
+        result = await query_top_priority(
+            redis,
+            page_size=request.page_size,
+            cursor=request.cursor,
+            filters={
+                "state": request.state,
+                "type": request.type,
+                "district": request.district,
+            },
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return query.TopPriorityResponseModel(success=True, content=result)
+
+
+@router.post("/score_priority", tags=["Functionality"])
+async def score_priority(
+    background_tasks: BackgroundTasks,
+    all: bool = False,
+    redis: aioredis.Redis = Depends(get_redis),
+):
+    background_tasks.add_task(run_priority_scoring, redis, all)
+    target = "all" if all else "pending"
+    return {"success": True, "content": f"Scoring {target} tickets in the background"}
+
+
+async def run_priority_scoring(redis, all: bool = False):
+    try:
+        if all:
+            logger.info(f"Queued {await queue_all_priorities(redis)} tickets for rescoring")
+        await requeue_neighbours(redis)
+        logger.info(f"Scored {await score_pending_priorities(redis)} tickets")
+    except Exception as e:
+        logger.error(f"Priority scoring failed: {str(e)}")
+
+
+@router.post("/cluster", tags=["Functionality"])
+async def cluster(
+    background_tasks: BackgroundTasks,
+    full: bool = False,
+    redis: aioredis.Redis = Depends(get_redis),
+):
+    background_tasks.add_task(run_clustering, redis, full)
+    mode = "Rebuilding all clusters" if full else "Clustering newly imported tickets"
+    return {"success": True, "content": f"{mode} in the background"}
+
+
+async def run_clustering(redis, full):
+    try:
+        if full:
+            await cluster_all(redis)
+        else:
+            logger.info(f"Clustered {await cluster_pending(redis)} tickets")
+    except Exception as e:
+        logger.error(f"Clustering failed: {str(e)}")
+
+
 @router.post("/curse_check", tags=["Functionality"])
-async def curse_check(text: List[str]):
+async def curse_check(text: List[str], redis: aioredis.Redis = Depends(get_redis)):
+    await kumyarb_lexicon.refresh_if_changed(redis)
     result = []
-    for t in text:
-        meta, new_text = await check_kumyarb(t)
+    for t, tokens in zip(text, await tokenize_many(text)):
+        meta, new_text = kumyarb_lexicon.match(tokens)
         result.append({"original": t, "censored": new_text, "meta": meta})
 
     return kumyarb.KumYarbResponseModel(success=True, content=result)
 
 
+@router.post("/curse_check/stream", tags=["Functionality"])
+async def curse_check_stream(
+    text: List[str],
+    redis: aioredis.Redis = Depends(get_redis),
+):
+    """Streams one JSON line per text, {"index", "original", "censored", "meta"}, as shards finish."""
+    await kumyarb_lexicon.refresh_if_changed(redis)
+
+    async def generate():
+        async for i, tokens in iter_tokenized(text):
+            meta, new_text = kumyarb_lexicon.match(tokens)
+            line = {"index": i, "original": text[i], "censored": new_text, "meta": meta}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.get("/export", tags=["Functionality"])
+async def export(
+    since: Optional[float] = None,
+    redis: aioredis.Redis = Depends(get_redis),
+):
+    """Streams the raw_data of stored tickets as NDJSON in import order, optionally only those imported since an epoch time."""
+
+    async def generate():
+        async for raw_data in iter_raw_data(redis, start="-inf" if since is None else since):
+            yield json.dumps(raw_data, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.delete("/drop_database", tags=["Functionality"])
-async def drop_database():
+async def drop_database(redis: aioredis.Redis = Depends(get_redis)):
     okay: bool = await clear_database(redis)
     if okay:
         return {"success": True, "content": "Database cleared"}
@@ -219,29 +493,16 @@ async def drop_database():
 
 # -- Function --
 async def load_csv_to_redis(redis):
-    df = pd.read_csv("app/api/v1/static/kumyarb.csv")
+    """Replaces the words:{level} sets with the file's words in one transaction."""
+    words = read_lexicon_csv(KUMYARB_CSV_PATH)
+    pipeline = redis.pipeline(transaction=True)
     # using HIGH MID LOW
     for level in ["HIGH", "MID", "LOW"]:
         key = f"words:{level.lower()}"  # Redis key pattern, e.g., "words:high"
-        values = df[level].dropna().tolist()
+        values = words[level]
+        await pipeline.delete(key)
         if values:
-            await redis.sadd(key, *values)
-
-
-async def check_kumyarb(text):
-    arr = []
-    new_text = ""
-    for i, v in enumerate(word_tokenize(text, engine="newmm")):
-        # Check membership in the Redis sets
-        if await redis.sismember("words:high", v):
-            arr.append({"word_num": i, "word": v, "severity": "HIGH"})
-            new_text += "xxx"
-        elif await redis.sismember("words:mid", v):
-            arr.append({"word_num": i, "word": v, "severity": "MID"})
-            new_text += "xxx"
-        elif await redis.sismember("words:low", v):
-            arr.append({"word_num": i, "word": v, "severity": "LOW"})
-            new_text += "xxx"
-        else:
-            new_text += v
-    return arr, new_text
+            await pipeline.sadd(key, *values)
+    # lets every worker's in-memory lexicon pick up the change
+    await pipeline.incr(LEXICON_VERSION_KEY_NAME)
+    await pipeline.execute()
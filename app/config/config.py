@@ -1,6 +1,161 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 TEXT_KEY_NAME = "text"
 EMBEDDING_KEY_NAME = "embedding"
 TEXT_INDEX_NAME = "idx:text"
 LOCATION_KEY_NAME = "locations"
 PREFIX_INDEX_KEY = TEXT_KEY_NAME + ":"
-VECTOR_DIMENSION = 384
\ No newline at end of file
+VECTOR_DIMENSION = 384
+
+# set of document keys whose `$.embedding` has not been generated yet
+PENDING_EMBEDDING_KEY_NAME = "pending:" + EMBEDDING_KEY_NAME
+# document key -> hash of the import job credited with its embedding
+PENDING_EMBEDDING_OWNER_KEY_NAME = PENDING_EMBEDDING_KEY_NAME + ":owner"
+EMBEDDING_BATCH_SIZE = 256
+
+# sentence encoder client, see app/function/encoder.py
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "modal")  # modal | local
+ENCODER_BATCH_SIZE = int(os.getenv("ENCODER_BATCH_SIZE", 64))
+ENCODER_MAX_CONCURRENCY = int(os.getenv("ENCODER_MAX_CONCURRENCY", 4))
+ENCODER_MAX_RETRIES = int(os.getenv("ENCODER_MAX_RETRIES", 3))
+ENCODER_RETRY_BACKOFF = float(os.getenv("ENCODER_RETRY_BACKOFF", 0.5))
+
+# content-hash embedding cache, see app/function/embedding_cache.py
+EMBEDDING_CACHE_KEY_NAME = "embcache"
+EMBEDDING_CACHE_LOCAL_SIZE = int(os.getenv("EMBEDDING_CACHE_LOCAL_SIZE", 10000))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 7 * 24 * 3600))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 500000))
+
+# coalescing of /query_from_similarity texts into shared encoder calls
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 64))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", 5))
+
+# per-query results of query_from_similarity/distance; entries belong to one
+# dataset generation, which every write to the dataset bumps
+QUERY_CACHE_KEY_NAME = "querycache"
+QUERY_CACHE_GENERATION_KEY_NAME = QUERY_CACHE_KEY_NAME + ":generation"
+QUERY_CACHE_LOCAL_SIZE = int(os.getenv("QUERY_CACHE_LOCAL_SIZE", 2048))  # 0 disables the in-process tier
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", 300))  # 0 disables the Redis tier
+# decimals coords are rounded to, 5 is ~1 m
+QUERY_CACHE_COORD_PRECISION = int(os.getenv("QUERY_CACHE_COORD_PRECISION", 5))
+
+# number of FT.SEARCH commands sent per pipeline round trip
+SEARCH_PIPELINE_SIZE = int(os.getenv("SEARCH_PIPELINE_SIZE", 100))
+
+# vector index, see create_index_text / migrate_index_text in app/function/helper.py
+INDEX_VERSION_KEY_NAME = TEXT_INDEX_NAME + ":version"
+INDEX_ALGORITHM = os.getenv("INDEX_ALGORITHM", "FLAT").upper()  # FLAT | HNSW
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_RUNTIME = int(os.getenv("HNSW_EF_RUNTIME", 10))
+INDEX_INITIAL_CAP = int(os.getenv("INDEX_INITIAL_CAP", 0))  # 0 lets redis decide
+
+# curse word lexicon, see app/function/lexicon.py
+LEXICON_KEY_NAME = "words"
+LEXICON_VERSION_KEY_NAME = LEXICON_KEY_NAME + ":version"
+LEXICON_REFRESH_INTERVAL = float(os.getenv("LEXICON_REFRESH_INTERVAL", 30))
+
+# thai tokenization process pool, see app/function/tokenizer.py
+# every gunicorn worker starts its own pool, so by default they split the cpus
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 4))
+TOKENIZER_WORKERS = int(
+    os.getenv("TOKENIZER_WORKERS", max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY)))
+)
+TOKENIZER_SHARD_SIZE = int(os.getenv("TOKENIZER_SHARD_SIZE", 64))
+TOKENIZER_INLINE_THRESHOLD = int(os.getenv("TOKENIZER_INLINE_THRESHOLD", 32))
+
+# streaming csv ingestion, see app/function/ingest.py
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 200))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 8))
+
+# import jobs: progress hashes, a lease-based slot set shared by every API
+# worker, and a rows/second cap over all running imports (0 = no cap)
+IMPORT_JOB_KEY_NAME = "import:job"
+IMPORT_JOBS_KEY_NAME = "import:jobs"
+IMPORT_SLOTS_KEY_NAME = "import:slots"
+IMPORT_RATE_KEY_NAME = "import:rate"
+IMPORT_INDEX_LOCK_KEY_NAME = "import:index_lock"
+IMPORT_MAX_CONCURRENCY = int(os.getenv("IMPORT_MAX_CONCURRENCY", 2))
+IMPORT_MAX_ROWS_PER_SECOND = int(os.getenv("IMPORT_MAX_ROWS_PER_SECOND", 0))
+IMPORT_SLOT_TTL = int(os.getenv("IMPORT_SLOT_TTL", 60))
+IMPORT_JOB_TTL = int(os.getenv("IMPORT_JOB_TTL", 7 * 24 * 3600))
+
+# rows written per redis pipeline by batch_add_data
+WRITE_PIPELINE_SIZE = int(os.getenv("WRITE_PIPELINE_SIZE", 500))
+
+# tickets fetched per JSON.MGET when hydrating query results
+HYDRATION_BATCH_SIZE = int(os.getenv("HYDRATION_BATCH_SIZE", 500))
+
+# upper bound of candidates fetched before box/polygon containment filtering
+AREA_MAX_RESULTS = int(os.getenv("AREA_MAX_RESULTS", 10000))
+
+# bump when build_text_schema or the derived document fields change
+# v4: documents are listed in the ticket registry
+# v5: closed tickets unranked
+# v6: priorities rescored with ages measured from the scoring time
+SCHEMA_VERSION = 6
+INDEX_SCHEMA_KEY_NAME = TEXT_INDEX_NAME + ":schema"
+
+# priority scoring, see app/function/priority.py
+PENDING_PRIORITY_KEY_NAME = "pending:priority"
+# newly located tickets, whose neighbours' density term must be recomputed
+PENDING_DENSITY_KEY_NAME = "pending:density"
+PRIORITY_BATCH_SIZE = int(os.getenv("PRIORITY_BATCH_SIZE", 500))
+PRIORITY_DENSITY_RADIUS = float(os.getenv("PRIORITY_DENSITY_RADIUS", 100))  # meters
+PRIORITY_DENSITY_CAP = int(os.getenv("PRIORITY_DENSITY_CAP", 50))
+PRIORITY_CLOSED_STATES = ("เสร็จสิ้น",)
+PRIORITY_WEIGHTS = {
+    "star": 1.0,  # dissatisfaction, (5 - star) / 4
+    "count_reopen": 1.5,  # log1p(count_reopen)
+    "age": 0.05,  # per 30 days since reported
+    "inactivity": 0.1,  # per 30 days since last activity
+    "curse": 1.0,  # HIGH 1, MID 0.6, LOW 0.3
+    "density": 2.0,  # log1p(neighbours) / log1p(PRIORITY_DENSITY_CAP)
+}
+
+# near-duplicate clustering, see app/function/cluster.py
+CLUSTER_KEY_NAME = "cluster"
+PENDING_CLUSTER_KEY_NAME = "pending:cluster"
+CLUSTER_GEOHASH_PRECISION = int(os.getenv("CLUSTER_GEOHASH_PRECISION", 6))  # ~1.2 x 0.6 km cells
+CLUSTER_RADIUS = float(os.getenv("CLUSTER_RADIUS", 200))  # meters, must stay below the cell size
+CLUSTER_SIMILARITY_THRESHOLD = float(os.getenv("CLUSTER_SIMILARITY_THRESHOLD", 0.85))
+CLUSTER_BATCH_SIZE = int(os.getenv("CLUSTER_BATCH_SIZE", 500))
+
+# vector storage: "json" keeps $.embedding float arrays in the text documents,
+# "hash" keeps binary blobs in vec:{ticket_id} hashes indexed by VECTOR_INDEX_NAME
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "json").lower()
+VECTOR_STORAGE_TYPE = os.getenv("VECTOR_STORAGE_TYPE", "FLOAT32").upper()  # FLOAT16 needs redis-stack 7.4+
+VECTOR_KEY_NAME = "vec"
+VECTOR_INDEX_NAME = "idx:" + VECTOR_KEY_NAME
+VECTOR_INDEX_VERSION_KEY_NAME = VECTOR_INDEX_NAME + ":version"
+
+# ticket ids scored by import time; bulk jobs iterate it instead of the keyspace
+TICKET_REGISTRY_KEY_NAME = "tickets"
+REGISTRY_BATCH_SIZE = int(os.getenv("REGISTRY_BATCH_SIZE", 500))
+
+# shared connection pool of each API worker; requests wait up to
+# REDIS_POOL_TIMEOUT seconds for a free connection when all are in use
+REDIS_URL = os.environ.get("REDISCLOUD_URL", "redis://localhost")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 64))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 10))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 30))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+# one-time startup work shared by all workers: init:{name} holds the
+# fingerprint of the last completed run, init:{name}:lock its runner
+INIT_KEY_NAME = "init"
+KUMYARB_CSV_PATH = "app/api/v1/static/kumyarb.csv"
+
+# load pythainlp and the encoder client in the background after startup,
+# instead of on the first request that needs them
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "true").lower() == "true"
+INIT_LOCK_TIMEOUT = int(os.getenv("INIT_LOCK_TIMEOUT", 120))
+
+# metrics of every API worker are merged through metrics:{hostname}
+METRICS_KEY_NAME = "metrics"
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", 5))
@@ -1,2 +1,95 @@
-# import redis
-# redis_client = redis.StrictRedis(host='localhost', port=6379, db=0)
\ No newline at end of file
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from redis.asyncio import BlockingConnectionPool, Redis
+
+from app.config.config import (
+    REDIS_URL,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    INIT_KEY_NAME,
+    INIT_LOCK_TIMEOUT,
+)
+from app.function.metrics import instrument_redis
+
+_client: Optional[Redis] = None
+
+
+async def init_redis(url: str = REDIS_URL) -> Redis:
+    """
+    Creates this worker's client over a blocking connection pool: at most
+    REDIS_MAX_CONNECTIONS connections, callers wait for a free one instead
+    of failing, and idle connections are PINGed before reuse.
+    """
+    global _client
+    if _client is None:
+        pool = BlockingConnectionPool.from_url(
+            url,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            retry_on_timeout=True,
+        )
+        client = instrument_redis(Redis.from_pool(pool))
+        await client.ping()
+        _client = client
+    return _client
+
+
+def get_redis() -> Redis:
+    """FastAPI dependency returning the worker's shared client."""
+    if _client is None:
+        raise RuntimeError("Redis is not initialized, init_redis() runs on startup")
+    return _client
+
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def file_fingerprint(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+async def run_once(
+    r: Redis,
+    name: str,
+    fingerprint: str,
+    init: Callable[[], Awaitable],
+    poll_interval: float = 0.2,
+) -> bool:
+    """
+    Runs `init` once per `fingerprint` for every worker sharing this Redis.
+    The worker that takes the init:{name}:lock lock runs it and stores the
+    fingerprint, the others wait until the fingerprint is stored. A runner
+    that dies leaves the lock to expire, and the next waiter takes over.
+    returns: bool - True when this worker ran `init`
+    """
+    key = f"{INIT_KEY_NAME}:{name}"
+    while True:
+        if await r.get(key) == fingerprint.encode("utf-8"):
+            return False
+        lock = r.lock(f"{key}:lock", timeout=INIT_LOCK_TIMEOUT)
+        if await lock.acquire(blocking=False):
+            try:
+                # another worker may have finished between the check and the lock
+                if await r.get(key) == fingerprint.encode("utf-8"):
+                    return False
+                logger.info(f"Running one-time init {name} ({fingerprint[:12]})")
+                await init()
+                await r.set(key, fingerprint)
+                return True
+            finally:
+                await lock.release()
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config.config import QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS
+from app.function.embedding_cache import encode_with_cache
+from app.function.metrics import histogram, LATENCY_BUCKETS, SIZE_BUCKETS
+
+
+class MicroBatcher:
+    """
+    Coalesces items submitted by concurrent callers into shared handler calls.
+    A batch is dispatched as soon as it reaches `max_batch_size`, or
+    `max_wait_ms` after its first item arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS,
+        name: str = "batcher",
+    ):
+        self.handler = handler
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batch_size = histogram(
+            f"{name}_batch_size", SIZE_BUCKETS, "Items per dispatched batch"
+        )
+        self.latency = histogram(
+            f"{name}_latency_seconds",
+            LATENCY_BUCKETS,
+            "Time from submission to result, including the wait window",
+        )
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._pending.append((item, future, now))
+            futures.append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    async def submit(self, item: Any) -> Any:
+        return (await self.submit_many([item]))[0]
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch_size):
+            task = asyncio.ensure_future(self._run(pending[i : i + self.max_batch_size]))
+            # keep a reference so the task is not garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]):
+        self.batch_size.observe(len(batch))
+        try:
+            results = await self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if len(results) != len(batch):
+            error = RuntimeError(f"{self.name} handler returned {len(results)} results for {len(batch)} items")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        done = time.perf_counter()
+        for (_, future, submitted), result in zip(batch, results):
+            self.latency.observe(done - submitted)
+            if not future.done():
+                future.set_result(result)
+
+
+async def _encode_queries(items: List[Tuple[Any, str]]) -> List[List[float]]:
+    """Encodes (client, text) items, one encode_with_cache call per client."""
+    by_client: Dict[int, Tuple[Any, List[int]]] = {}
+    for i, (r, _) in enumerate(items):
+        by_client.setdefault(id(r), (r, []))[1].append(i)
+    embeddings: List[Any] = [None] * len(items)
+    for r, indices in by_client.values():
+        encoded = await encode_with_cache(r, [items[i][1] for i in indices])
+        for i, embedding in zip(indices, encoded):
+            embeddings[i] = embedding
+    return embeddings
+
+
+_query_batcher: Optional[MicroBatcher] = None
+
+
+def get_query_batcher() -> MicroBatcher:
+    """Shared batcher encoding query texts through the embedding cache."""
+    global _query_batcher
+    if _query_batcher is None:
+        _query_batcher = MicroBatcher(_encode_queries, name="query_encoder")
+    return _query_batcher
+
+
+async def encode_queries(r, texts: List[str]) -> List[List[float]]:
+    """Embeds texts through the shared batcher, reading the cache with the caller's client."""
+    return await get_query_batcher().submit_many([(r, text) for text in texts])
@@ -0,0 +1,297 @@
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.config.config import (
+    TEXT_KEY_NAME,
+    LOCATION_KEY_NAME,
+    CLUSTER_KEY_NAME,
+    PENDING_CLUSTER_KEY_NAME,
+    PENDING_EMBEDDING_KEY_NAME,
+    CLUSTER_GEOHASH_PRECISION,
+    CLUSTER_RADIUS,
+    CLUSTER_SIMILARITY_THRESHOLD,
+    CLUSTER_BATCH_SIZE,
+)
+from app.function.geo import haversine
+from app.function.helper import parse_coords
+from app.function.registry import iter_ticket_keys, scan_batches
+from app.function.vector_store import read_embeddings, ticket_id_of
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(longitude: float, latitude: float, precision: int = CLUSTER_GEOHASH_PRECISION) -> str:
+    lon_range, lat_range = [-180.0, 180.0], [-90.0, 90.0]
+    bits, even = [], True
+    while len(bits) < precision * 5:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits.append(1)
+            rng[0] = mid
+        else:
+            bits.append(0)
+            rng[1] = mid
+        even = not even
+    return "".join(
+        BASE32[int("".join(map(str, bits[i : i + 5])), 2)] for i in range(0, len(bits), 5)
+    )
+
+
+def cell_size(precision: int = CLUSTER_GEOHASH_PRECISION) -> Tuple[float, float]:
+    """Width and height of a geohash cell in degrees."""
+    lon_bits = (precision * 5 + 1) // 2
+    lat_bits = precision * 5 // 2
+    return 360 / 2**lon_bits, 180 / 2**lat_bits
+
+
+def forward_neighbours(longitude: float, latitude: float) -> List[str]:
+    """E, N, NE and NW cells: visiting these from every cell covers each adjacent pair once."""
+    width, height = cell_size()
+    return [
+        geohash(longitude + dx * width, max(-90.0, min(90.0, latitude + dy * height)))
+        for dx, dy in ((1, 0), (0, 1), (1, 1), (-1, 1))
+    ]
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+
+    def find(self, x: str) -> str:
+        self.parent.setdefault(x, x)
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: str, b: str):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # the smaller ticket id names the cluster, so ids are stable across runs
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def linked_pairs(
+    a: np.ndarray, a_points: np.ndarray, b: np.ndarray, b_points: np.ndarray, same: bool
+) -> Iterable[Tuple[int, int]]:
+    """Index pairs with cosine similarity and distance within the thresholds."""
+    similarity = a @ b.T
+    if same:
+        similarity = np.triu(similarity, k=1)
+    for i, j in zip(*np.nonzero(similarity >= CLUSTER_SIMILARITY_THRESHOLD)):
+        if haversine(*a_points[i], *b_points[j]) <= CLUSTER_RADIUS:
+            yield int(i), int(j)
+
+
+def normalize(vectors: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+async def fetch_vectors(r, ids: List[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Embeddings and points of the given tickets; tickets without either are dropped."""
+    keys = [f"{TEXT_KEY_NAME}:{i}" for i in ids]
+    embeddings = await read_embeddings(r, ids)
+    locations = await r.json().mget(keys, "$.location") if keys else []
+    kept, vectors, points = [], [], []
+    for i, embedding, location in zip(ids, embeddings, locations):
+        point = parse_coords(location[0]) if location else None
+        if embedding is not None and point:
+            kept.append(i)
+            vectors.append(embedding)
+            points.append(point)
+    if not kept:
+        return [], np.empty((0, 0), dtype=np.float32), np.empty((0, 2))
+    return kept, normalize(vectors), np.asarray(points)
+
+
+async def write_clusters(r, union: UnionFind, ids: Iterable[str]):
+    members = defaultdict(list)
+    for i in ids:
+        members[union.find(i)].append(i)
+    pipeline = r.pipeline(transaction=False)
+    queued = 0
+    for cluster_id, cluster in members.items():
+        for i in cluster:
+            await pipeline.json().set(f"{TEXT_KEY_NAME}:{i}", "$.cluster_id", cluster_id)
+        if len(cluster) > 1:
+            await pipeline.sadd(f"{CLUSTER_KEY_NAME}:{cluster_id}", *cluster)
+        queued += len(cluster)
+        if queued >= CLUSTER_BATCH_SIZE:
+            await pipeline.execute()
+            pipeline = r.pipeline(transaction=False)
+            queued = 0
+    await pipeline.execute()
+
+
+async def cluster_all(r) -> Dict:
+    """
+    Rebuilds every cluster. Tickets are bucketed by geohash cell and only
+    compared with tickets of the same cell and its forward neighbours, so
+    the cost grows with the density of cells, not with the corpus squared.
+    Tickets without an embedding yet stay in pending:cluster.
+    """
+    started = time.perf_counter()
+    cells: Dict[str, List[str]] = defaultdict(list)
+    centers: Dict[str, Tuple[float, float]] = {}
+    async for keys in iter_ticket_keys(r, CLUSTER_BATCH_SIZE):
+        for key, location in zip(keys, await r.json().mget(keys, "$.location")):
+            point = parse_coords(location[0]) if location else None
+            if point:
+                cell = geohash(*point)
+                cells[cell].append(ticket_id_of(key))
+                centers.setdefault(cell, point)
+
+    async for keys in scan_batches(r, f"{CLUSTER_KEY_NAME}:*", CLUSTER_BATCH_SIZE):
+        await r.delete(*keys)
+
+    union = UnionFind()
+    loaded: "OrderedDict[str, tuple]" = OrderedDict()
+    # tickets with a vector; the others are still waiting for their embedding
+    clustered = set()
+
+    async def load(cell: str):
+        if cell not in loaded:
+            loaded[cell] = await fetch_vectors(r, cells[cell])
+            clustered.update(loaded[cell][0])
+            if len(loaded) > 64:
+                loaded.popitem(last=False)
+        loaded.move_to_end(cell)
+        return loaded[cell]
+
+    comparisons = 0
+    for cell in sorted(cells):
+        ids, vectors, points = await load(cell)
+        if not ids:
+            continue
+        for i, j in linked_pairs(vectors, points, vectors, points, same=True):
+            union.union(ids[i], ids[j])
+        comparisons += len(ids) * (len(ids) - 1) // 2
+        for neighbour in forward_neighbours(*centers[cell]):
+            if neighbour not in cells:
+                continue
+            other_ids, other_vectors, other_points = await load(neighbour)
+            if not other_ids:
+                continue
+            for i, j in linked_pairs(vectors, points, other_vectors, other_points, same=False):
+                union.union(ids[i], other_ids[j])
+            comparisons += len(ids) * len(other_ids)
+
+    all_ids = [i for cell in cells.values() for i in cell if i in clustered]
+    await write_clusters(r, union, all_ids)
+    # clustered tickets leave the queue, cluster_pending picks up the rest once embedded
+    unembedded = [i for cell in cells.values() for i in cell if i not in clustered]
+    for start in range(0, max(len(all_ids), len(unembedded)), CLUSTER_BATCH_SIZE):
+        pipeline = r.pipeline(transaction=False)
+        done = all_ids[start : start + CLUSTER_BATCH_SIZE]
+        waiting = unembedded[start : start + CLUSTER_BATCH_SIZE]
+        if done:
+            await pipeline.srem(PENDING_CLUSTER_KEY_NAME, *[f"{TEXT_KEY_NAME}:{i}" for i in done])
+        if waiting:
+            await pipeline.sadd(PENDING_CLUSTER_KEY_NAME, *[f"{TEXT_KEY_NAME}:{i}" for i in waiting])
+        await pipeline.execute()
+    stats = {
+        "tickets": len(all_ids),
+        "unembedded": len(unembedded),
+        "cells": len(cells),
+        "clusters": len({union.find(i) for i in all_ids}),
+        "comparisons": comparisons,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Clustering finished: {stats}")
+    return stats
+
+
+async def cluster_pending(r, batch_size: int = CLUSTER_BATCH_SIZE) -> int:
+    """
+    Assigns newly imported tickets to clusters: each is compared with its
+    GEOSEARCH neighbours within CLUSTER_RADIUS and joins (or merges) their
+    clusters. Tickets without an embedding yet stay queued, including
+    those taken from pending:embedding whose vector is not written yet.
+    returns: int - number of tickets assigned
+    """
+    assigned = 0
+    while True:
+        keys = await r.spop(PENDING_CLUSTER_KEY_NAME, batch_size)
+        if not keys:
+            return assigned
+        try:
+            waiting = await r.smismember(PENDING_EMBEDDING_KEY_NAME, keys)
+            not_ready = [k for k, w in zip(keys, waiting) if w]
+            ready = [ticket_id_of(k) for k, w in zip(keys, waiting) if not w]
+            ids, vectors, points = await fetch_vectors(r, ready)
+            # a located ticket without a vector is still being embedded, only
+            # tickets without a location (or deleted ones) are never clustered
+            dropped = sorted(set(ready) - set(ids))
+            if dropped:
+                dropped_keys = [f"{TEXT_KEY_NAME}:{i}" for i in dropped]
+                locations = await r.json().mget(dropped_keys, "$.location")
+                not_ready += [k for k, location in zip(dropped_keys, locations) if location]
+            assigned += await _cluster_batch(r, ids, vectors, points)
+        except Exception:
+            await r.sadd(PENDING_CLUSTER_KEY_NAME, *keys)
+            raise
+        if not_ready:
+            await r.sadd(PENDING_CLUSTER_KEY_NAME, *not_ready)
+            # the rest of the queue is waiting for embeddings as well
+            return assigned
+
+
+async def _cluster_batch(r, ids: List[str], vectors: np.ndarray, points: np.ndarray) -> int:
+    if not ids:
+        return 0
+    pipeline = r.pipeline(transaction=False)
+    for longitude, latitude in points:
+        await pipeline.geosearch(
+            LOCATION_KEY_NAME,
+            longitude=longitude,
+            latitude=latitude,
+            radius=CLUSTER_RADIUS,
+            unit="m",
+        )
+    neighbourhoods = [[ticket_id_of(m) for m in members] for members in await pipeline.execute()]
+
+    candidate_ids = sorted({n for members in neighbourhoods for n in members} - set(ids))
+    candidates, candidate_vectors, candidate_points = await fetch_vectors(r, candidate_ids)
+    cluster_ids = await r.json().mget(
+        [f"{TEXT_KEY_NAME}:{i}" for i in candidates], "$.cluster_id"
+    ) if candidates else []
+
+    union = UnionFind()
+    stored = {}
+    for candidate, cluster_id in zip(candidates, cluster_ids):
+        # a cluster id is the smallest ticket id of its members
+        stored[candidate] = cluster_id[0] if cluster_id else candidate
+        union.union(candidate, stored[candidate])
+    if candidates:
+        for i, j in linked_pairs(vectors, points, candidate_vectors, candidate_points, same=False):
+            union.union(ids[i], candidates[j])
+    for i, j in linked_pairs(vectors, points, vectors, points, same=True):
+        union.union(ids[i], ids[j])
+
+    # every member of an existing cluster the new tickets joined is rewritten
+    touched = {union.find(i) for i in ids}
+    old_clusters = sorted({c for c in stored.values() if union.find(c) in touched})
+    pipeline = r.pipeline(transaction=False)
+    for old in old_clusters:
+        await pipeline.smembers(f"{CLUSTER_KEY_NAME}:{old}")
+        await pipeline.delete(f"{CLUSTER_KEY_NAME}:{old}")
+    responses = await pipeline.execute() if old_clusters else []
+
+    members = set(ids)
+    for old, old_members in zip(old_clusters, responses[::2]):
+        members.add(old)
+        for member in old_members:
+            member = member.decode("utf-8")
+            union.union(member, old)
+            members.add(member)
+    await write_clusters(r, union, members)
+    return len(ids)
@@ -0,0 +1,161 @@
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config.config import (
+    EMBEDDING_CACHE_KEY_NAME,
+    EMBEDDING_CACHE_LOCAL_SIZE,
+    EMBEDDING_CACHE_TTL,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+)
+from app.function.encoder import encode_sentences
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes a preprocessed prompt so trivially different copies share one key."""
+    text = unicodedata.normalize("NFC", text or "")
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by the content hash of the normalized text.
+    Tier one is an in-process LRU; tier two stores FLOAT32 blobs in Redis with
+    a TTL renewed on access, and a sorted set of last-access times used to
+    evict the oldest entries once `max_entries` is exceeded. Members whose
+    blob expired are dropped from the set on a miss and when trimming.
+    """
+
+    def __init__(
+        self,
+        local_size: int = EMBEDDING_CACHE_LOCAL_SIZE,
+        ttl: int = EMBEDDING_CACHE_TTL,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        key_name: str = EMBEDDING_CACHE_KEY_NAME,
+    ):
+        self.local_size = local_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_name = key_name
+        self.lru_key = f"{key_name}:lru"
+        self._local: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, digest: str) -> str:
+        return f"{self.key_name}:{digest}"
+
+    def _remember(self, digest: str, vector: np.ndarray):
+        self._local[digest] = vector
+        self._local.move_to_end(digest)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get_many(self, r, digests: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        remote = []
+        for digest in digests:
+            vector = self._local.get(digest)
+            if vector is not None:
+                self._local.move_to_end(digest)
+                found[digest] = vector
+            else:
+                remote.append(digest)
+        self.local_hits += len(found)
+
+        if remote:
+            blobs = await r.mget([self._redis_key(d) for d in remote])
+            now = time.time()
+            touched, expired = {}, []
+            for digest, blob in zip(remote, blobs):
+                if blob is None:
+                    expired.append(digest)
+                    continue
+                vector = np.frombuffer(blob, dtype=np.float32)
+                found[digest] = vector
+                touched[digest] = now
+                self._remember(digest, vector)
+            pipeline = r.pipeline(transaction=False)
+            for digest in touched:
+                await pipeline.expire(self._redis_key(digest), self.ttl)
+            if touched:
+                await pipeline.zadd(self.lru_key, touched)
+            if expired:
+                # never stored, or its blob expired: either way not a cache entry
+                await pipeline.zrem(self.lru_key, *expired)
+            await pipeline.execute()
+            self.redis_hits += len(touched)
+            self.misses += len(remote) - len(touched)
+        return found
+
+    async def set_many(self, r, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        now = time.time()
+        pipeline = r.pipeline(transaction=False)
+        for digest, vector in vectors.items():
+            self._remember(digest, vector)
+            await pipeline.set(self._redis_key(digest), vector.tobytes(), ex=self.ttl)
+        await pipeline.zadd(self.lru_key, {d: now for d in vectors})
+        # not accessed within the TTL means the blob is gone
+        await pipeline.zremrangebyscore(self.lru_key, "-inf", now - self.ttl)
+        await pipeline.zcard(self.lru_key)
+        size = (await pipeline.execute())[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = await r.zpopmin(self.lru_key, overflow)
+            if evicted:
+                await r.delete(*[self._redis_key(d.decode()) for d, _ in evicted])
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_entries": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache()
+
+
+async def encode_with_cache(r, texts: List[str]) -> List[List[float]]:
+    """
+    Encodes texts, sending only the distinct, never-seen-before ones to the
+    encoder. Duplicates within the batch are encoded once.
+    params: texts: list[str] - preprocessed prompts
+    returns: list[list[float]] - one embedding per input text, in order
+    """
+    digests = [text_hash(t) for t in texts]
+    found = await embedding_cache.get_many(r, list(dict.fromkeys(digests)))
+
+    missing: Dict[str, str] = {}
+    for digest, text in zip(digests, texts):
+        if digest not in found and digest not in missing:
+            # the normalized text only keys the cache, the encoder sees the text as sent
+            missing[digest] = text
+    if missing:
+        embeddings = await encode_sentences(list(missing.values()))
+        encoded = {
+            digest: np.asarray(embedding, dtype=np.float32)
+            for digest, embedding in zip(missing, embeddings)
+        }
+        await embedding_cache.set_many(r, encoded)
+        found.update(encoded)
+
+    return [found[digest].tolist() for digest in digests]
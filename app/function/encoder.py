@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import threading
+from typing import List, Optional, Protocol
+
+import numpy as np
+from loguru import logger
+
+from app.config.config import (
+    VECTOR_DIMENSION,
+    ENCODER_BACKEND,
+    ENCODER_BATCH_SIZE,
+    ENCODER_MAX_CONCURRENCY,
+    ENCODER_MAX_RETRIES,
+    ENCODER_RETRY_BACKOFF,
+)
+from app.function.metrics import SIZE_BUCKETS, histogram, stage_timer
+
+_ENCODE_SECONDS = stage_timer("encode")
+_ENCODER_BATCH_SIZE = histogram("encoder_batch_size", SIZE_BUCKETS, "Sentences per encoder backend call")
+
+
+class EncoderBackend(Protocol):
+    """Blocking encoder, called from a worker thread by EncoderClient."""
+
+    def encode(self, sentences: List[str]) -> List[List[float]]:
+        ...
+
+
+class ModalEncoderBackend:
+    """
+    Calls the sentence-encoder function deployed on modal.
+    The function handle is looked up once and reused for every batch.
+    """
+
+    def __init__(
+        self,
+        app_name: str = "sentence-encoder",
+        function_name: str = "sentence_encoder",
+        environment_name: str = "main",
+    ):
+        self.app_name = app_name
+        self.function_name = function_name
+        self.environment_name = environment_name
+        self._function = None
+        self._lock = threading.Lock()
+
+    def _lookup(self):
+        if self._function is None:
+            with self._lock:
+                if self._function is None:
+                    import modal
+
+                    self._function = modal.Function.lookup(
+                        self.app_name,
+                        self.function_name,
+                        environment_name=self.environment_name,
+                    )
+        return self._function
+
+    def warm_up(self):
+        self._lookup()
+
+    def encode(self, sentences: List[str]) -> List[List[float]]:
+        return self._lookup().remote(sentences)
+
+
+class LocalEncoderBackend:
+    """
+    Deterministic in-process stub for tests and offline benchmarks.
+    Every sentence maps to a fixed random unit vector seeded by its hash,
+    so identical texts always get identical embeddings.
+    """
+
+    def __init__(self, dimension: int = VECTOR_DIMENSION):
+        self.dimension = dimension
+
+    def encode(self, sentences: List[str]) -> List[List[float]]:
+        embeddings = []
+        for sentence in sentences:
+            digest = hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).digest()
+            rng = np.random.default_rng(int.from_bytes(digest, "little"))
+            vector = rng.standard_normal(self.dimension).astype(np.float32)
+            vector /= np.linalg.norm(vector)
+            embeddings.append(vector.tolist())
+        return embeddings
+
+
+BACKENDS = {
+    "modal": ModalEncoderBackend,
+    "local": LocalEncoderBackend,
+}
+
+
+class EncoderClient:
+    """
+    Splits input into micro-batches and encodes them concurrently off the
+    event loop, with at most `max_concurrency` batches in flight and
+    exponential-backoff retries for failed batches.
+    """
+
+    def __init__(
+        self,
+        backend: EncoderBackend,
+        batch_size: int = ENCODER_BATCH_SIZE,
+        max_concurrency: int = ENCODER_MAX_CONCURRENCY,
+        max_retries: int = ENCODER_MAX_RETRIES,
+        retry_backoff: float = ENCODER_RETRY_BACKOFF,
+    ):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def encode(self, sentences: List[str]) -> List[List[float]]:
+        """
+        Encodes sentences, preserving input order.
+        params: sentences: list[str] - a list of sentences to encode
+        returns: list[list[float]] - one embedding per sentence
+        """
+        if not sentences:
+            return []
+        batches = [
+            sentences[i : i + self.batch_size]
+            for i in range(0, len(sentences), self.batch_size)
+        ]
+        results = await asyncio.gather(*[self._encode_batch(b) for b in batches])
+        return [embedding for batch in results for embedding in batch]
+
+    async def _encode_batch(self, batch: List[str]) -> List[List[float]]:
+        _ENCODER_BATCH_SIZE.observe(len(batch))
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with _ENCODE_SECONDS.time():
+                        result = await asyncio.to_thread(self.backend.encode, batch)
+                    if len(result) != len(batch):
+                        raise ValueError(
+                            f"Encoder returned {len(result)} embeddings for {len(batch)} sentences"
+                        )
+                    return result
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_backoff * 2**attempt
+                    logger.warning(
+                        f"Encoder batch of {len(batch)} failed ({e}), retrying in {delay:.2f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+
+_client: Optional[EncoderClient] = None
+
+
+def get_encoder() -> EncoderClient:
+    global _client
+    if _client is None:
+        _client = EncoderClient(BACKENDS[ENCODER_BACKEND]())
+    return _client
+
+
+def set_encoder_backend(backend: EncoderBackend, **kwargs) -> EncoderClient:
+    """Replaces the shared client, e.g. with LocalEncoderBackend in tests."""
+    global _client
+    _client = EncoderClient(backend, **kwargs)
+    return _client
+
+
+def warm_up_encoder():
+    """Imports the backend's client and looks up its remote function, for backends that have one."""
+    warm_up = getattr(get_encoder().backend, "warm_up", None)
+    if warm_up is not None:
+        warm_up()
+
+
+async def encode_sentences(sentences: List[str]) -> List[List[float]]:
+    return await get_encoder().encode(sentences)
@@ -0,0 +1,220 @@
+import asyncio
+import math
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config.config import LOCATION_KEY_NAME, TEXT_INDEX_NAME, AREA_MAX_RESULTS
+from app.function.helper import hydrate_distance_results, parse_coords
+from app.function.metrics import stage_timer
+
+EARTH_RADIUS_M = 6372797.560856  # same constant redis uses for GEO distances
+FILTER_FIELDS = ("state", "type", "district")
+_GEOSEARCH_SECONDS = stage_timer("geosearch")
+_FT_AGGREGATE_SECONDS = stage_timer("ft_aggregate")
+
+_TAG_SPECIAL = re.compile(r"[,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\\s]")
+
+Polygon = Sequence[Sequence[float]]  # [[lon, lat], ...]
+
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def point_in_polygon(longitude: float, latitude: float, polygon: Polygon) -> bool:
+    """Ray casting; the polygon may be open or closed."""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i][0], polygon[i][1]
+        xj, yj = polygon[j][0], polygon[j][1]
+        if (yi > latitude) != (yj > latitude) and longitude < (xj - xi) * (
+            latitude - yi
+        ) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def in_box(longitude, latitude, origin, width, height) -> bool:
+    return (
+        haversine(origin[0], latitude, longitude, latitude) <= width / 2
+        and haversine(longitude, origin[1], longitude, latitude) <= height / 2
+    )
+
+
+def polygon_centroid(polygon: Polygon) -> Tuple[float, float]:
+    return (
+        sum(p[0] for p in polygon) / len(polygon),
+        sum(p[1] for p in polygon) / len(polygon),
+    )
+
+
+def polygon_box(origin: Tuple[float, float], polygon: Polygon) -> Tuple[float, float]:
+    """
+    Width and height in meters of the smallest box centered on `origin` covering the polygon.
+    BYBOX measures width at each point's own latitude, so the width is taken
+    where the polygon is closest to the equator.
+    """
+    lats = [p[1] for p in polygon]
+    widest = 0.0 if min(lats) <= 0 <= max(lats) else min(lats, key=abs)
+    width = max(haversine(origin[0], widest, p[0], widest) for p in polygon) * 2
+    height = max(haversine(origin[0], origin[1], origin[0], p[1]) for p in polygon) * 2
+    return width + 1, height + 1
+
+
+def escape_tag_value(value: str) -> str:
+    """Backslash-escapes the characters RediSearch treats as separators inside {...}."""
+    return _TAG_SPECIAL.sub(lambda m: "\\" + m.group(0), value.strip())
+
+
+def build_filter_clause(filters: Dict[str, Optional[List[str]]]) -> str:
+    """Turns {"state": ["a", "b"], ...} into `@state:{a | b} ...`, values OR-ed per field."""
+    clauses = []
+    for field in FILTER_FIELDS:
+        values = [v for v in (filters.get(field) or []) if v and v.strip()]
+        if values:
+            clauses.append(f"@{field}:{{" + " | ".join(map(escape_tag_value, values)) + "}")
+    return " ".join(clauses)
+
+
+async def search_area_members(
+    r,
+    origin: Tuple[float, float],
+    radius: Optional[float] = None,
+    width: Optional[float] = None,
+    height: Optional[float] = None,
+    count: Optional[int] = None,
+    any: bool = False,
+) -> List[tuple]:
+    """GEOSEARCH BYRADIUS or BYBOX on the locations set, nearest first."""
+    with _GEOSEARCH_SECONDS.time():
+        return await r.geosearch(
+            LOCATION_KEY_NAME,
+            longitude=origin[0],
+            latitude=origin[1],
+            radius=radius,
+            width=width,
+            height=height,
+            unit="m",
+            sort="ASC",
+            count=count,
+            any=any and count is not None,
+            withdist=True,
+            withcoord=True,
+        )
+
+
+async def search_area_index(
+    r, origin: Tuple[float, float], radius: float, filter_clause: str, limit: int
+) -> List[tuple]:
+    """
+    Radius search with attribute filters applied by RediSearch. Rows are
+    returned in the same (member, distance, (lon, lat)) shape as GEOSEARCH.
+    """
+    longitude, latitude = origin
+    query = f"@location:[{longitude} {latitude} {radius} m] {filter_clause}".strip()
+    with _FT_AGGREGATE_SECONDS.time():
+        response = await r.execute_command(
+            "FT.AGGREGATE",
+            TEXT_INDEX_NAME,
+            query,
+            "LOAD",
+            2,
+            "@__key",
+            "@location",
+            "APPLY",
+            f"geodistance(@location, {longitude}, {latitude})",
+            "AS",
+            "distance",
+            "SORTBY",
+            2,
+            "@distance",
+            "ASC",
+            "LIMIT",
+            0,
+            limit,
+            "DIALECT",
+            2,
+        )
+    rows = []
+    for row in response[1:]:
+        values = dict(zip(row[::2], row[1::2]))
+        point = parse_coords(values[b"location"].decode("utf-8"))
+        ticket_id = values[b"__key"].decode("utf-8").split(":", 1)[-1]
+        rows.append(
+            (f"{LOCATION_KEY_NAME}:{ticket_id}".encode("utf-8"), float(values[b"distance"]), point)
+        )
+    return rows
+
+
+async def query_area(
+    r,
+    origin: Optional[Tuple[float, float]],
+    top_k: int,
+    radius: Optional[float] = None,
+    width: Optional[float] = None,
+    height: Optional[float] = None,
+    polygon: Optional[Polygon] = None,
+    filters: Optional[Dict[str, Optional[List[str]]]] = None,
+    any: bool = False,
+) -> List[tuple]:
+    """
+    Finds tickets inside a radius, a box or a polygon around `origin`,
+    sorted by distance from it. Without filters this is a GEOSEARCH on the
+    locations set; with state/type/district filters the search runs in
+    idx:text so non-matching tickets never leave Redis.
+    A polygon is searched by its enclosing box, then refined in Python.
+    """
+    if polygon:
+        origin = origin or polygon_centroid(polygon)
+        width, height = polygon_box(origin, polygon)
+    if origin is None:
+        raise ValueError("coords are required unless a polygon is given")
+    if radius is None and (width is None or height is None):
+        raise ValueError("one of radius, width and height, or polygon is required")
+
+    exact = polygon is None and width is None
+    filter_clause = build_filter_clause(filters or {})
+    if filter_clause:
+        # RediSearch only filters by radius, so a box is searched by its circumcircle
+        search_radius = radius if width is None else math.hypot(width, height) / 2
+        limit = top_k if exact else AREA_MAX_RESULTS
+        rows = await search_area_index(r, origin, search_radius, filter_clause, limit)
+        if width is not None:
+            rows = [row for row in rows if in_box(*row[2], origin, width, height)]
+    else:
+        count = top_k if polygon is None else AREA_MAX_RESULTS
+        rows = await search_area_members(
+            r, origin, radius=radius, width=width, height=height, count=count, any=any
+        )
+
+    if polygon:
+        rows = [row for row in rows if point_in_polygon(*row[2], polygon)]
+    return rows[:top_k]
+
+
+async def query_all_texts_from_area(
+    r, queries: List[dict], top_k: int = 10, filters=None, any=False, fields=None
+) -> List[List[Dict]]:
+    results = await asyncio.gather(
+        *[
+            query_area(
+                r,
+                parse_coords(q.get("coords") or ""),
+                top_k,
+                radius=q.get("radius"),
+                width=q.get("width"),
+                height=q.get("height"),
+                polygon=q.get("polygon"),
+                filters=filters,
+                any=any,
+            )
+            for q in queries
+        ]
+    )
+    return await hydrate_distance_results(r, results, fields)
@@ -5,10 +5,33 @@ from app.config.config import (
     PREFIX_INDEX_KEY,
     VECTOR_DIMENSION,
     LOCATION_KEY_NAME,
+    PENDING_EMBEDDING_KEY_NAME,
+    PENDING_EMBEDDING_OWNER_KEY_NAME,
+    EMBEDDING_BATCH_SIZE,
+    SEARCH_PIPELINE_SIZE,
+    INDEX_VERSION_KEY_NAME,
+    INDEX_ALGORITHM,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_RUNTIME,
+    INDEX_INITIAL_CAP,
+    WRITE_PIPELINE_SIZE,
+    HYDRATION_BATCH_SIZE,
+    INDEX_SCHEMA_KEY_NAME,
+    SCHEMA_VERSION,
+    PENDING_PRIORITY_KEY_NAME,
+    PENDING_DENSITY_KEY_NAME,
+    PENDING_CLUSTER_KEY_NAME,
+    CLUSTER_KEY_NAME,
+    VECTOR_KEY_NAME,
+    VECTOR_INDEX_NAME,
+    VECTOR_INDEX_VERSION_KEY_NAME,
+    VECTOR_STORAGE_TYPE,
 )
-import numpy as np
+import math
 from redis import Redis
 from redis.commands.search.field import (
+    GeoField,
     NumericField,
     TagField,
     TextField,
@@ -16,39 +39,58 @@ from redis.commands.search.field import (
 )
 from pydantic import BaseModel
 from app.model import base_response, kumyarb, query
+from app.function.embedding_cache import encode_with_cache, text_hash
+from app.function.batcher import encode_queries
+from app.function.query_cache import query_cache, query_key, round_coords, bump_generation
+from app.function.metrics import stage_timer
+from app.function.vector_store import (
+    uses_hash_storage,
+    search_index_name,
+    to_blob,
+    ticket_id_of,
+    vector_key,
+    hash_fields,
+    write_embeddings,
+)
+from app.function.registry import (
+    document_key,
+    register_tickets,
+    unregister_tickets,
+    iter_ticket_ids,
+    iter_ticket_keys,
+    backfill_ticket_registry,
+)
 
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.commands.search.query import Query
+from redis.commands.search.document import Document
+from collections import Counter
+from functools import lru_cache
 import asyncio
-import modal
+import hashlib
+import json
+import re
+import time
+from datetime import datetime
 from typing import Literal
 import base64
 from dotenv import load_dotenv
-from typing import List, Dict
+from loguru import logger
+from typing import List, Dict, Optional
 
 load_dotenv()
 
+_REDIS_SECONDS = stage_timer("redis")
+_FT_SEARCH_SECONDS = stage_timer("ft_search")
+_GEOSEARCH_SECONDS = stage_timer("geosearch")
+_HYDRATION_SECONDS = stage_timer("hydration")
 
-# Helper functions
-def call_sentence_encoder(sentences: list[str]) -> list[list[float]]:
-    """
-    Calls the sentence-encoder function in the modal package.
-    params: sentences: list[str] - a list of sentences to encode
-    returns: list[list[float]] - a list of lists of floats, representing the embeddings of the sentences
-    """
-    try:
-        inf_fx = modal.Function.lookup(
-            "sentence-encoder",
-            "sentence_encoder",
-            environment_name="main",
-        )
-        result: list[list[float]] = inf_fx.remote(sentences)
-        return result
-
-    except Exception as e:  # will be raised from modal if inf_fx.remote fails
-        raise e
+_TIMESTAMP = re.compile(
+    r"^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})(?:\.(\d+))?([+-]\d{2}(?::?\d{2})?|Z)?$"
+)
 
 
+# Helper functions
 def replace_nan_with_empty_string(obj):
     if isinstance(obj, dict):
         for key, value in obj.items():
@@ -56,7 +98,7 @@ def replace_nan_with_empty_string(obj):
     elif isinstance(obj, list):
         for i in range(len(obj)):
             obj[i] = replace_nan_with_empty_string(obj[i])
-    elif isinstance(obj, float) and np.isnan(obj):
+    elif isinstance(obj, float) and math.isnan(obj):
         return ""
     return obj
 
@@ -92,44 +134,282 @@ def preprocess_raw_data(data: dict) -> dict:
     return data
 
 
-async def add_geospatial_index(pipeline, data: dict):
-    preprocess_coords = preprocess_coords_dict(data)
+def parse_coords(coords: str) -> Optional[tuple[float, float]]:
+    """Parses "lon,lat" into floats, None when missing or malformed."""
+    try:
+        longitude, latitude = (float(c) for c in str(coords).split(","))
+    except ValueError:
+        return None
+    if not (-180 <= longitude <= 180 and -85.05112878 <= latitude <= 85.05112878):
+        return None
+    return longitude, latitude
+
+
+def parse_timestamp(value: str) -> Optional[float]:
+    """Parses export timestamps like "2024-02-03 12:29:05.727076+00" into epoch seconds."""
+    match = _TIMESTAMP.match(str(value).strip())
+    if not match:
+        return None
+    date, time_of_day, fraction, offset = match.groups()
+    fraction = (fraction or "").ljust(6, "0")[:6]
+    offset = (offset or "+00").replace("Z", "+00").replace(":", "")
+    offset = f"{offset[:3]}:{offset[3:5] or '00'}"
+    try:
+        parsed = datetime.fromisoformat(f"{date}T{time_of_day}.{fraction}{offset}")
+    except ValueError:
+        return None
+    return parsed.timestamp()
+
+
+def parse_number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+def document_attributes(data: dict) -> dict:
+    """
+    Typed copies of raw_data fields for TAG/NUMERIC indexing; fields that
+    do not parse are left out so they never fail indexing of the document.
+    """
+    attrs = {"type": ",".join(t.strip() for t in str(data.get("type", "")).strip("{}").split(",") if t.strip())}
+    for field in ("timestamp", "last_activity"):
+        epoch = parse_timestamp(data.get(field, ""))
+        if epoch is not None:
+            attrs[field] = epoch
+    for field in ("star", "count_reopen"):
+        number = parse_number(data.get(field))
+        if number is not None:
+            attrs[field] = number
+    return attrs
 
-    longitude: float = preprocess_coords["longitude"]
-    latitude: float = preprocess_coords["latitude"]
-    member_name: str = preprocess_coords["name"]
 
-    await pipeline.geoadd(LOCATION_KEY_NAME, [longitude, latitude, member_name])
+def content_hash(raw_data: dict) -> str:
+    canonical = json.dumps(raw_data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
 
 
-async def preprocess_and_store_data(data, r):
+def build_document(data) -> tuple[str, dict]:
     data = preprocess_raw_data(data)
     preprocess_prompt = preprocess_prompt_dict(data)
 
     data_key = f"{TEXT_KEY_NAME}:{data['ticket_id']}"
-    pipeline = r.pipeline(transaction=False)
-    preprocess_prompt = {"raw_data": data, "preprocess_prompt": preprocess_prompt}
-    await pipeline.json().set(data_key, "$", preprocess_prompt)
+    document = {
+        "raw_data": data,
+        "preprocess_prompt": preprocess_prompt,
+        "attrs": document_attributes(data),
+        "content_hash": content_hash(data),
+    }
+    # only valid points are indexed as GEO, an invalid value would fail the whole document
+    coords = parse_coords(data.get("coords", ""))
+    if coords:
+        document["location"] = f"{coords[0]},{coords[1]}"
+    return data_key, document
 
-    await add_geospatial_index(pipeline, data)
 
-    await pipeline.execute()
+async def leave_cluster(pipeline, key: str, cluster_id: str):
+    """Takes a rewritten or moved ticket out of its cluster until it is clustered again."""
+    await pipeline.srem(f"{CLUSTER_KEY_NAME}:{cluster_id}", ticket_id_of(key))
+    await pipeline.json().delete(key, "$.cluster_id")
 
 
-async def store_embeddings(key, embeddings, r):
+async def fetch_stored_state(r, keys: list) -> List[Optional[dict]]:
+    """Fields of stored documents the delta import compares against, None for new keys."""
     pipeline = r.pipeline(transaction=False)
-    for embedding in embeddings:
-        await pipeline.json().set(key, "$", embedding)
-    await pipeline.execute()
+    paths = {
+        "content_hash": "$.content_hash",
+        "preprocess_prompt": "$.preprocess_prompt",
+        "last_activity": "$.attrs.last_activity",
+        "location": "$.location",
+        "cluster_id": "$.cluster_id",
+    }
+    for key in keys:
+        await pipeline.json().get(key, *paths.values())
+    states = []
+    for value in await pipeline.execute():
+        if value:
+            value = {name: (value.get(path) or [None])[0] for name, path in paths.items()}
+        states.append(value or None)
+    return states
 
 
-async def add_data(data: dict, r):
-    await preprocess_and_store_data(data, r)
+def classify_change(document: dict, stored: Optional[dict]) -> str:
+    """
+    returns: "new", "comment" (needs a new embedding), "fields" (metadata
+    only), "unchanged", or "stale" when the stored row has a newer last_activity
+    """
+    if stored is None:
+        return "new"
+    if stored["content_hash"] == document["content_hash"]:
+        return "unchanged"
+    incoming = document["attrs"].get("last_activity")
+    if incoming is not None and stored["last_activity"] is not None and incoming < stored["last_activity"]:
+        return "stale"
+    if stored["preprocess_prompt"] is None or text_hash(stored["preprocess_prompt"]) != text_hash(
+        document["preprocess_prompt"]
+    ):
+        return "comment"
+    return "fields"
+
+
+async def _update_fields(pipeline, key: str, document: dict):
+    """Rewrites everything but the comment, keeping the stored embedding and cluster."""
+    await pipeline.json().set(key, "$.raw_data", document["raw_data"])
+    await pipeline.json().set(key, "$.attrs", document["attrs"])
+    await pipeline.json().set(key, "$.content_hash", document["content_hash"])
+    if "location" in document:
+        await pipeline.json().set(key, "$.location", document["location"])
+    else:
+        await pipeline.json().delete(key, "$.location")
+    if uses_hash_storage():
+        fields = hash_fields(document["raw_data"], document["attrs"], document.get("location"))
+        await pipeline.hset(vector_key(ticket_id_of(key)), mapping=fields)
+        if "location" not in document:
+            await pipeline.hdel(vector_key(ticket_id_of(key)), "location")
+
+
+async def batch_add_data(
+    data: list[dict],
+    r,
+    pipeline_size: int = WRITE_PIPELINE_SIZE,
+    seen_key: str = None,
+    owner: str = None,
+) -> dict:
+    """
+    Upserts a chunk of rows, one read and one write pipeline per
+    `pipeline_size` rows. Rows are compared with the stored documents:
+    unchanged rows and rows older than the stored last_activity are skipped,
+    rows whose comment changed are rewritten and queued for embedding, and
+    other changes update the document in place, keeping its embedding.
+    Rows with unparsable coords are stored without a location.
+    params:
+        seen_key: set collecting every ticket id of the upload, for full exports
+        owner: hash of the import job whose `rows_embedded` counts the rows queued here
+    returns: dict - rows, written/updated/unchanged/stale counts and rows/sec
+    """
+    started = time.perf_counter()
+    stats = {"rows": len(data), "written": 0, "updated": 0, "unchanged": 0, "stale": 0, "invalid_coords": 0}
+    for i in range(0, len(data), pipeline_size):
+        # a ticket repeated within the batch keeps its last row
+        documents = dict(build_document(row) for row in data[i : i + pipeline_size])
+        keys = list(documents)
+        pipeline = r.pipeline(transaction=False)
+        written, updated, relocated = [], [], []
+        locations, unlocated = [], []
+        with _REDIS_SECONDS.time():
+            states = await fetch_stored_state(r, keys)
+        for key, stored in zip(keys, states):
+            document = documents[key]
+            change = classify_change(document, stored)
+            if change in ("unchanged", "stale"):
+                stats[change] += 1
+                continue
+            if change == "fields":
+                await _update_fields(pipeline, key, document)
+                updated.append(key)
+                if stored["location"] != document.get("location"):
+                    relocated.append(key)
+                    if stored["cluster_id"]:
+                        await leave_cluster(pipeline, key, stored["cluster_id"])
+            else:
+                await pipeline.json().set(key, "$", document)
+                written.append(key)
+                if stored and stored["cluster_id"]:
+                    await leave_cluster(pipeline, key, stored["cluster_id"])
+                if change == "comment" and uses_hash_storage():
+                    # the old vector would keep answering KNN for the old text until re-embedded
+                    await pipeline.delete(vector_key(ticket_id_of(key)))
+
+            member = f"{LOCATION_KEY_NAME}:{ticket_id_of(key)}"
+            coords = parse_coords(document["raw_data"].get("coords", ""))
+            if coords:
+                locations += [coords[0], coords[1], member]
+            else:
+                stats["invalid_coords"] += 1
+                unlocated.append(member)
+
+        if written:
+            # (re)written documents have no embedding, priority or cluster until the next pass
+            await pipeline.sadd(PENDING_EMBEDDING_KEY_NAME, *written)
+            await pipeline.sadd(PENDING_CLUSTER_KEY_NAME, *written)
+            if owner:
+                await pipeline.hset(PENDING_EMBEDDING_OWNER_KEY_NAME, mapping={k: owner for k in written})
+        if relocated:
+            await pipeline.sadd(PENDING_CLUSTER_KEY_NAME, *relocated)
+        if written or relocated:
+            # their arrival changes the density term of tickets around them
+            await pipeline.sadd(PENDING_DENSITY_KEY_NAME, *written, *relocated)
+        if written or updated:
+            await pipeline.sadd(PENDING_PRIORITY_KEY_NAME, *written, *updated)
+            await register_tickets(pipeline, written + updated)
+        if locations:
+            await pipeline.geoadd(LOCATION_KEY_NAME, locations)
+        if unlocated:
+            await pipeline.zrem(LOCATION_KEY_NAME, *unlocated)
+        if seen_key and keys:
+            await pipeline.sadd(seen_key, *[ticket_id_of(key) for key in keys])
+        if written or updated:
+            await bump_generation(pipeline)
+        with _REDIS_SECONDS.time():
+            await pipeline.execute()
+        stats["written"] += len(written)
+        stats["updated"] += len(updated)
+
+    elapsed = time.perf_counter() - started
+    stats["rows_per_second"] = round(len(data) / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+async def delete_tickets(r, ticket_ids: List[str]):
+    """Removes documents, vectors, geo members, registry and cluster entries of tickets."""
+    keys = [document_key(i) for i in ticket_ids]
+    cluster_ids = await r.json().mget(keys, "$.cluster_id")
+    pipeline = r.pipeline(transaction=False)
+    await pipeline.delete(*keys, *[vector_key(i) for i in ticket_ids])
+    await pipeline.zrem(LOCATION_KEY_NAME, *[f"{LOCATION_KEY_NAME}:{i}" for i in ticket_ids])
+    await pipeline.hdel(PENDING_EMBEDDING_OWNER_KEY_NAME, *keys)
+    for pending in (
+        PENDING_EMBEDDING_KEY_NAME,
+        PENDING_PRIORITY_KEY_NAME,
+        PENDING_DENSITY_KEY_NAME,
+        PENDING_CLUSTER_KEY_NAME,
+    ):
+        await pipeline.srem(pending, *keys)
+    for ticket_id, cluster_id in zip(ticket_ids, cluster_ids):
+        if cluster_id:
+            await pipeline.srem(f"{CLUSTER_KEY_NAME}:{cluster_id[0]}", ticket_id)
+    await unregister_tickets(pipeline, ticket_ids)
+    await bump_generation(pipeline)
+    await pipeline.execute()
 
 
-async def batch_add_data(data: list[dict], r):
-    for d in data:
-        await preprocess_and_store_data(d, r)
+async def remove_missing_tickets(
+    r, seen_key: str, imported_before: float, batch_size: int = WRITE_PIPELINE_SIZE
+) -> int:
+    """
+    After a full export: deletes registered tickets that are not in
+    `seen_key`. Only tickets last written before `imported_before` are
+    considered, so rows of imports running meanwhile are kept. Missing ids
+    are staged in a set first, deleting while paging the registry would
+    move its cursor.
+    returns: int - number of tickets deleted
+    """
+    if not await r.scard(seen_key):
+        return 0
+    missing_key = f"{seen_key}:missing"
+    async for ticket_ids in iter_ticket_ids(r, batch_size, stop=imported_before):
+        flags = await r.smismember(seen_key, ticket_ids)
+        missing = [i for i, seen in zip(ticket_ids, flags) if not seen]
+        if missing:
+            await r.sadd(missing_key, *missing)
+    removed = 0
+    while ticket_ids := await r.spop(missing_key, batch_size):
+        ticket_ids = [i.decode("utf-8") for i in ticket_ids]
+        await delete_tickets(r, ticket_ids)
+        removed += len(ticket_ids)
+    return removed
 
 
 # Database helper
@@ -137,66 +417,329 @@ async def clear_database(r: Redis):
     """Clear the Redis database."""
     try:
         await r.flushall()
+        # starts from the clock, above every generation cached before the flush
+        await bump_generation(r)
         return True
     except Exception as e:
-        print(e)
+        logger.error(f"Failed to clear database: {str(e)}")
         return False
 
 
 async def drop_index(r):
-    drop_index_command = ["FT.DROPINDEX", TEXT_INDEX_NAME]  # , -DD]
+    index_name = await resolve_index_name(r)
+    if index_name != TEXT_INDEX_NAME:
+        await r.ft(index_name).aliasdel(TEXT_INDEX_NAME)
+    drop_index_command = ["FT.DROPINDEX", index_name]  # , -DD]
     await r.execute_command(*drop_index_command)
 
 
-# TODO : batch inference
-async def generate_embeddings_redis(r):
-    keys = await r.keys(f"{TEXT_KEY_NAME}:*")
-    keys = sorted(keys)
-    texts = await r.json().mget(keys, "$.preprocess_prompt")
-    texts = [t for sublist in texts for t in sublist]
-    embeddings = call_sentence_encoder(texts)
-    embeddings = embeddings
-
+async def generate_embeddings_redis(r, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    Generates embeddings for the documents queued in the pending set only.
+    Keys are popped atomically, so concurrent callers never encode the same
+    document twice; a failed batch is put back into the pending set.
+    params: batch_size: int - number of documents encoded per encoder call
+    returns: int - number of documents embedded
+    """
+    embedded = 0
+    while True:
+        keys = await r.spop(PENDING_EMBEDDING_KEY_NAME, batch_size)
+        if not keys:
+            return embedded
+        try:
+            texts = await r.json().mget(keys, "$.preprocess_prompt")
+            # documents deleted since they were queued come back as None
+            found = [(key, text[0]) for key, text in zip(keys, texts) if text]
+            if not found:
+                continue
+            keys, texts = zip(*found)
+            embeddings = await encode_with_cache(r, list(texts))
+        except Exception:
+            await r.sadd(PENDING_EMBEDDING_KEY_NAME, *keys)
+            raise
+
+        pipeline = r.pipeline(transaction=False)
+        await write_embeddings(r, pipeline, keys, embeddings)
+        await bump_generation(pipeline)
+        with _REDIS_SECONDS.time():
+            await pipeline.execute()
+        await credit_owners(r, keys)
+        embedded += len(keys)
+
+
+# adds to a job's counter unless the job hash expired meanwhile
+_CREDIT_OWNER = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+end
+return 0
+"""
+
+
+async def credit_owners(r, keys: list):
+    """
+    Counts embedded documents in `rows_embedded` of the import that queued
+    them, whichever import's worker encoded them.
+    """
+    owners = await r.hmget(PENDING_EMBEDDING_OWNER_KEY_NAME, list(keys))
+    counts = Counter(owner for owner in owners if owner)
+    if not counts:
+        return
     pipeline = r.pipeline(transaction=False)
-    for key, embedding in zip(keys, embeddings):
-        await pipeline.json().set(key, "$.embedding", embedding)
-
+    await pipeline.hdel(PENDING_EMBEDDING_OWNER_KEY_NAME, *keys)
+    for owner, count in counts.items():
+        await pipeline.eval(_CREDIT_OWNER, 1, owner, "rows_embedded", count)
     await pipeline.execute()
 
 
+async def count_pending_embeddings(r) -> int:
+    return await r.scard(PENDING_EMBEDDING_KEY_NAME)
+
+
 # index helper
-async def create_index_text(r):
-    try:
-        schema = (
-            # TextField('$.preprocess_prompt', no_stem=True, as_name='preprocess_prompt'),
-            TextField("$.raw_data.state", no_stem=True, as_name="state"),
-            TextField("$.raw_data.comment", no_stem=True, as_name="comment"),
-            TextField("$.raw_data.type", no_stem=True, as_name="type"),
-            TextField("$.raw_data.address", no_stem=True, as_name="address"),
-            TextField("$.raw_data.district", no_stem=True, as_name="district"),
-            TextField("$.raw_data.province", no_stem=True, as_name="province"),
-            TextField("$.raw_data.subdistrict", no_stem=True, as_name="subdistrict"),
-            VectorField(
-                f"$.{EMBEDDING_KEY_NAME}",
-                "FLAT",
-                {
-                    "TYPE": "FLOAT32",
-                    "DIM": VECTOR_DIMENSION,
-                    "DISTANCE_METRIC": "COSINE",
-                },
-                as_name="vector",
-            ),
-        )
-        definition = IndexDefinition(
-            prefix=[PREFIX_INDEX_KEY], index_type=IndexType.JSON
+def vector_index_attributes(
+    algorithm: str = INDEX_ALGORITHM, vector_type: str = "FLOAT32"
+) -> dict:
+    algorithm = algorithm.upper()
+    attributes = {
+        "TYPE": vector_type,
+        "DIM": VECTOR_DIMENSION,
+        "DISTANCE_METRIC": "COSINE",
+    }
+    if algorithm == "HNSW":
+        attributes.update(
+            {
+                "M": HNSW_M,
+                "EF_CONSTRUCTION": HNSW_EF_CONSTRUCTION,
+                "EF_RUNTIME": HNSW_EF_RUNTIME,
+            }
         )
-        await r.ft(TEXT_INDEX_NAME).create_index(fields=schema, definition=definition)
+    elif algorithm != "FLAT":
+        raise ValueError(f"Unsupported index algorithm {algorithm}, use FLAT or HNSW")
+    if INDEX_INITIAL_CAP:
+        attributes["INITIAL_CAP"] = INDEX_INITIAL_CAP
+    return attributes
+
+
+def build_text_schema(algorithm: str = INDEX_ALGORITHM) -> tuple:
+    return (
+        # TextField('$.preprocess_prompt', no_stem=True, as_name='preprocess_prompt'),
+        TextField("$.raw_data.comment", no_stem=True, as_name="comment"),
+        TextField("$.raw_data.address", no_stem=True, as_name="address"),
+        TagField("$.raw_data.state", as_name="state"),
+        TagField("$.attrs.type", separator=",", as_name="type"),
+        TagField("$.raw_data.district", as_name="district"),
+        TagField("$.raw_data.province", as_name="province"),
+        TagField("$.raw_data.subdistrict", as_name="subdistrict"),
+        NumericField("$.attrs.timestamp", sortable=True, as_name="timestamp"),
+        NumericField("$.attrs.last_activity", sortable=True, as_name="last_activity"),
+        NumericField("$.attrs.star", as_name="star"),
+        NumericField("$.attrs.count_reopen", sortable=True, as_name="count_reopen"),
+        NumericField("$.priority", sortable=True, as_name="priority"),
+        GeoField("$.location", as_name="location"),
+        VectorField(
+            f"$.{EMBEDDING_KEY_NAME}",
+            algorithm.upper(),
+            vector_index_attributes(algorithm),
+            as_name="vector",
+        ),
+    )
+
+
+async def index_exists(r, index_name: str) -> bool:
+    try:
+        await r.ft(index_name).info()
+        return True
+    except Exception:
+        return False
+
+
+async def resolve_index_name(r, index_name: str = TEXT_INDEX_NAME) -> str:
+    """Returns the physical index behind an alias (or the index itself)."""
+    info = await r.ft(index_name).info()
+    name = info["index_name"]
+    return name.decode("utf-8") if isinstance(name, bytes) else name
+
+
+async def create_versioned_index(r, algorithm: str = INDEX_ALGORITHM) -> str:
+    version = await r.incr(INDEX_VERSION_KEY_NAME)
+    index_name = f"{TEXT_INDEX_NAME}:v{version}"
+    definition = IndexDefinition(prefix=[PREFIX_INDEX_KEY], index_type=IndexType.JSON)
+    await r.ft(index_name).create_index(
+        fields=build_text_schema(algorithm), definition=definition
+    )
+    return index_name
 
-    except:
-        await r.ft(TEXT_INDEX_NAME).info()
+
+async def wait_for_indexing(r, index_name: str, poll_interval: float = 0.5):
+    while float((await r.ft(index_name).info())["percent_indexed"]) < 1:
+        await asyncio.sleep(poll_interval)
+
+
+async def create_index_text(r, algorithm: str = INDEX_ALGORITHM):
+    """
+    Creates a versioned physical index and points the TEXT_INDEX_NAME alias
+    at it, so it can later be swapped by migrate_index_text.
+    """
+    if await index_exists(r, TEXT_INDEX_NAME):
         return f"Index {TEXT_INDEX_NAME} already exists"
 
-    return f"Index {TEXT_INDEX_NAME} created"
+    index_name = await create_versioned_index(r, algorithm)
+    await r.ft(index_name).aliasadd(TEXT_INDEX_NAME)
+    await r.set(INDEX_SCHEMA_KEY_NAME, SCHEMA_VERSION)
+    await bump_generation(r)
+    return f"Index {TEXT_INDEX_NAME} created ({index_name}, {algorithm})"
+
+
+async def migrate_index_text(r, algorithm: str = INDEX_ALGORITHM):
+    """
+    Rebuilds the index online: builds a new versioned index next to the
+    current one, waits for the backfill, swaps the alias and drops the old
+    index (documents are kept). Queries keep using the old index until the swap.
+    """
+    if not await index_exists(r, TEXT_INDEX_NAME):
+        await backfill_ticket_registry(r)
+        return await create_index_text(r, algorithm)
+
+    old_index = await resolve_index_name(r)
+    new_index = await create_versioned_index(r, algorithm)
+    await swap_alias(r, TEXT_INDEX_NAME, old_index, new_index)
+    return f"Index {TEXT_INDEX_NAME} migrated from {old_index} to {new_index} ({algorithm})"
+
+
+async def swap_alias(r, alias: str, old_index: str, new_index: str):
+    """Points `alias` at `new_index` once it is fully indexed and drops `old_index`."""
+    await wait_for_indexing(r, new_index)
+    if old_index == alias:
+        # legacy index created before aliases; the name must be freed first
+        await r.ft(old_index).dropindex(delete_documents=False)
+        await r.ft(new_index).aliasadd(alias)
+    else:
+        await r.ft(new_index).aliasupdate(alias)
+        await r.ft(old_index).dropindex(delete_documents=False)
+    await bump_generation(r)
+
+
+def build_vector_schema(algorithm: str = INDEX_ALGORITHM) -> tuple:
+    return (
+        TagField("state", as_name="state"),
+        TagField("type", separator=",", as_name="type"),
+        TagField("district", as_name="district"),
+        GeoField("location", as_name="location"),
+        VectorField(
+            "vector",
+            algorithm.upper(),
+            vector_index_attributes(algorithm, VECTOR_STORAGE_TYPE),
+            as_name="vector",
+        ),
+    )
+
+
+async def create_versioned_vector_index(r, algorithm: str = INDEX_ALGORITHM) -> str:
+    version = await r.incr(VECTOR_INDEX_VERSION_KEY_NAME)
+    index_name = f"{VECTOR_INDEX_NAME}:v{version}"
+    definition = IndexDefinition(prefix=[f"{VECTOR_KEY_NAME}:"], index_type=IndexType.HASH)
+    await r.ft(index_name).create_index(
+        fields=build_vector_schema(algorithm), definition=definition
+    )
+    return index_name
+
+
+async def create_vector_index(r, algorithm: str = INDEX_ALGORITHM):
+    """
+    Creates the HASH index over vec:{ticket_id} blobs used by
+    VECTOR_STORAGE=hash, versioned behind the VECTOR_INDEX_NAME alias.
+    """
+    if await index_exists(r, VECTOR_INDEX_NAME):
+        return f"Index {VECTOR_INDEX_NAME} already exists"
+    index_name = await create_versioned_vector_index(r, algorithm)
+    await r.ft(index_name).aliasadd(VECTOR_INDEX_NAME)
+    await bump_generation(r)
+    return f"Index {VECTOR_INDEX_NAME} created ({index_name}, {algorithm}, {VECTOR_STORAGE_TYPE})"
+
+
+async def migrate_vector_index(r, algorithm: str = INDEX_ALGORITHM):
+    """Rebuilds idx:vec online next to the current index, like migrate_index_text."""
+    if not await index_exists(r, VECTOR_INDEX_NAME):
+        return await create_vector_index(r, algorithm)
+    old_index = await resolve_index_name(r, VECTOR_INDEX_NAME)
+    new_index = await create_versioned_vector_index(r, algorithm)
+    await swap_alias(r, VECTOR_INDEX_NAME, old_index, new_index)
+    return f"Index {VECTOR_INDEX_NAME} migrated from {old_index} to {new_index} ({algorithm})"
+
+
+async def backfill_document_fields(r, batch_size: int = WRITE_PIPELINE_SIZE) -> int:
+    """
+    Recomputes the derived `attrs` and `location` fields of stored documents
+    from their raw_data, for documents written by an older schema, and
+    queues them for priority scoring.
+    returns: int - number of documents updated
+    """
+    updated = 0
+    async for keys in iter_ticket_keys(r, batch_size):
+        updated += await _backfill_batch(r, keys)
+    return updated
+
+
+async def iter_raw_data(r, batch_size: int = HYDRATION_BATCH_SIZE, start="-inf"):
+    """
+    Yields the raw_data of every registered ticket in import order, one
+    JSON.MGET per batch, so exports run in bounded memory.
+    params:
+        start: only tickets imported at or after this epoch time
+    """
+    async for keys in iter_ticket_keys(r, batch_size, start=start):
+        for raw_data in await r.json().mget(keys, "$.raw_data"):
+            if raw_data:
+                yield raw_data[0]
+
+
+async def _backfill_batch(r, keys: list) -> int:
+    pipeline = r.pipeline(transaction=False)
+    updated = 0
+    for key, raw_data in zip(keys, await r.json().mget(keys, "$.raw_data")):
+        if not raw_data:
+            continue
+        data = raw_data[0]
+        await pipeline.json().set(key, "$.attrs", document_attributes(data))
+        coords = parse_coords(data.get("coords", ""))
+        if coords:
+            await pipeline.json().set(key, "$.location", f"{coords[0]},{coords[1]}")
+        await pipeline.sadd(PENDING_PRIORITY_KEY_NAME, key)
+        updated += 1
+    await pipeline.execute()
+    return updated
+
+
+async def migrate_index_schema(r, algorithm: str = INDEX_ALGORITHM, force: bool = False):
+    """
+    Brings documents and the index up to SCHEMA_VERSION: backfills derived
+    fields when the stored schema is older, then rebuilds the index behind
+    the alias. `force` rebuilds even when up to date, e.g. to switch algorithm.
+    """
+    if not await index_exists(r, TEXT_INDEX_NAME):
+        if uses_hash_storage():
+            await create_vector_index(r, algorithm)
+        await backfill_ticket_registry(r)
+        return await create_index_text(r, algorithm)
+
+    version = int(await r.get(INDEX_SCHEMA_KEY_NAME) or 1)
+    if version >= SCHEMA_VERSION and not force:
+        if uses_hash_storage():
+            await create_vector_index(r, algorithm)
+        return f"Index {TEXT_INDEX_NAME} is up to date (schema v{version})"
+
+    if uses_hash_storage():
+        # queries search idx:vec in hash mode, so it follows the algorithm switch
+        await migrate_vector_index(r, algorithm)
+
+    backfilled = 0
+    if version < SCHEMA_VERSION:
+        await backfill_ticket_registry(r)
+        backfilled = await backfill_document_fields(r)
+    message = await migrate_index_text(r, algorithm)
+    await r.set(INDEX_SCHEMA_KEY_NAME, SCHEMA_VERSION)
+    return f"{message}, schema v{version} -> v{SCHEMA_VERSION}, {backfilled} documents backfilled"
 
 
 async def get_info_index(r):
@@ -216,15 +759,36 @@ async def get_info_index(r):
 async def query_embeddings_by_similarity(
     r, embeddings: List[List[float]], top_k: int = 5
 ) -> List[List[Dict]]:
-    similarity_query = create_similarity_query(top_k)
-    return await asyncio.gather(
-        *[
-            process_single_embedding_similarity_query(r, embedding, similarity_query)
-            for embedding in embeddings
-        ]
-    )
-
-
+    """
+    Runs one KNN search per embedding, pipelined SEARCH_PIPELINE_SIZE at a
+    time, so a batch of queries costs a few round trips instead of one each.
+    returns: list[list[dict]] - results per embedding, in request order
+    """
+    query_args = create_similarity_query(top_k).get_args()
+    responses = []
+    for i in range(0, len(embeddings), SEARCH_PIPELINE_SIZE):
+        pipeline = r.pipeline(transaction=False)
+        for embedding in embeddings[i : i + SEARCH_PIPELINE_SIZE]:
+            await pipeline.execute_command(
+                "FT.SEARCH",
+                search_index_name(),
+                *query_args,
+                "PARAMS",
+                2,
+                "query_vector",
+                to_blob(embedding),
+            )
+        with _FT_SEARCH_SECONDS.time():
+            replies = await pipeline.execute()
+        responses += [parse_search_response(reply) for reply in replies]
+    responses = await hydrate_vector_results(r, responses)
+    return [
+        [process_result_similarity_query(result) for result in response]
+        for response in responses
+    ]
+
+
+@lru_cache(maxsize=32)
 def create_similarity_query(top_k: int) -> Query:
     return (
         Query(f"(*)=>[KNN {top_k} @vector $query_vector AS similarity_score]")
@@ -243,13 +807,41 @@ def create_similarity_query(top_k: int) -> Query:
     )
 
 
-async def process_single_embedding_similarity_query(
-    r, embedding: List[float], q: Query
-) -> List[Dict]:
-    results = await r.ft(TEXT_INDEX_NAME).search(
-        q, {"query_vector": np.array(embedding, dtype=np.float32).tobytes()}
-    )
-    return [process_result_similarity_query(result) for result in results.docs]
+async def hydrate_vector_results(
+    r, responses: List[List[Document]]
+) -> List[List[Document]]:
+    """
+    With VECTOR_STORAGE=hash, KNN hits are vec:{id} hashes that only hold
+    the vector and filter fields; the remaining fields come from the text
+    documents in one batched fetch. A no-op for JSON storage.
+    """
+    if not uses_hash_storage():
+        return responses
+    ids = list(dict.fromkeys(ticket_id_of(doc.id) for docs in responses for doc in docs))
+    with _HYDRATION_SECONDS.time():
+        documents = await fetch_result_data_distance_query(r, ids)
+    hydrated = []
+    for docs in responses:
+        hydrated.append([])
+        for doc in docs:
+            fields = {**documents.get(ticket_id_of(doc.id), {}), **doc.__dict__}
+            fields.pop("payload", None)
+            hydrated[-1].append(Document(**fields))
+    return hydrated
+
+
+def parse_search_response(response: list) -> List[Document]:
+    """Parses a raw RESP2 FT.SEARCH reply: [total, id, [field, value, ...], ...]."""
+    documents = []
+    for i in range(1, len(response), 2):
+        doc_id = response[i].decode("utf-8")
+        values = response[i + 1] if i + 1 < len(response) else []
+        fields = {
+            values[j].decode("utf-8"): values[j + 1].decode("utf-8", errors="replace")
+            for j in range(0, len(values), 2)
+        }
+        documents.append(Document(doc_id, **fields))
+    return documents
 
 
 def process_result_similarity_query(result) -> Dict:
@@ -269,77 +861,145 @@ def process_result_similarity_query(result) -> Dict:
 async def query_all_texts_from_similarity(r: Redis, queries: List[dict], top_k=5):
     queries = [preprocess_raw_data(q) for q in queries]
     queries = [preprocess_prompt_dict(q) for q in queries]
-    embeddings = np.random.rand(len(queries), VECTOR_DIMENSION).tolist()
-    # embeddings = call_sentence_encoder(queries)
-    return await query_embeddings_by_similarity(r, embeddings, top_k=top_k)
+    keys = [query_key("similarity", text_hash(q), top_k) for q in queries]
+
+    async def search(indices: List[int]) -> List[List[Dict]]:
+        embeddings = await encode_queries(r, [queries[i] for i in indices])
+        return await query_embeddings_by_similarity(r, embeddings, top_k=top_k)
+
+    return await query_cache.get_or_compute(r, "similarity", keys, search)
 
 
 async def query_all_texts_from_distance(
-    r: Redis, queries: List[dict], top_k: int = 5, radius: int = 600
+    r: Redis,
+    queries: List[dict],
+    top_k: int = 5,
+    radius: int = 600,
+    fields: Optional[List[str]] = None,
 ) -> List[List[Dict]]:
     top_k += 1
     try:
         queries = [preprocess_raw_data(q) for q in queries]
-        results = await process_queries_distance_query(r, queries, top_k, radius)
-        return results
+        keys = []
+        for q in queries:
+            # searched from the rounded point, so cached and fresh results agree
+            coords = round_coords(q.get("coords"))
+            if coords:
+                q["coords"] = coords
+            keys.append(query_key("distance", coords, top_k, radius, fields) if coords else None)
+
+        async def search(indices: List[int]) -> List[List[Dict]]:
+            results = await process_queries_distance_query(r, [queries[i] for i in indices], top_k, radius)
+            return await hydrate_distance_results(r, results, fields)
+
+        return await query_cache.get_or_compute(r, "distance", keys, search)
     except Exception as e:
-        print(e)
+        logger.error(f"Distance query failed: {str(e)}")
         return []
 
 
 async def process_queries_distance_query(
     r: Redis, queries: List[dict], top_k: int, radius: int
-) -> List[List[Dict]]:
-    return await asyncio.gather(
-        *[process_single_distance_query(r, q, top_k, radius) for q in queries]
-    )
+) -> List[List[tuple]]:
+    """Runs every GEOSEARCH of a request in one pipeline; unparsable queries get []."""
+    pipeline = r.pipeline(transaction=False)
+    valid = []
+    for q in queries:
+        try:
+            q = preprocess_coords_dict(q)
+        except (KeyError, ValueError, IndexError, UnboundLocalError):
+            valid.append(False)
+            continue
+        # nan, inf and out-of-range points would fail the whole GEOSEARCH pipeline
+        if parse_coords(f"{q['longitude']},{q['latitude']}") is None:
+            valid.append(False)
+            continue
+        valid.append(True)
+        await pipeline.geosearch(
+            LOCATION_KEY_NAME,
+            longitude=q["longitude"],
+            latitude=q["latitude"],
+            radius=radius,
+            unit="m",
+            sort="ASC",
+            count=top_k,
+            withdist=True,
+            withcoord=True,
+        )
+    with _GEOSEARCH_SECONDS.time():
+        responses = iter(await pipeline.execute() if any(valid) else [])
+    return [next(responses) if ok else [] for ok in valid]
 
 
-async def process_single_distance_query(
-    r: Redis, q: dict, top_k: int, radius: int
-) -> List[Dict]:
-    q = preprocess_coords_dict(q)
-    try:
-        query_coords = {"longitude": q["longitude"], "latitude": q["latitude"]}
-    except KeyError:
-        print(f"Could not extract coordinates from query: {q}")
-        return []
-    results = await r.georadius(
-        LOCATION_KEY_NAME,
-        query_coords["longitude"],
-        query_coords["latitude"],
-        radius,
-        unit="m",
-        withdist=True,
-        withcoord=True,
-        count=top_k,
+async def hydrate_distance_results(
+    r: Redis, results: List[List[tuple]], fields: Optional[List[str]] = None
+) -> List[List[Dict]]:
+    """
+    Fetches the documents of every neighbour across all queries at once,
+    each distinct ticket exactly once, and joins them back per query.
+    """
+    ticket_ids = list(
+        dict.fromkeys(
+            member_name.decode("utf-8").split(":")[-1]
+            for result in results
+            for member_name, _, _ in result
+        )
     )
-    return await process_results_distance_output(r, results)
+    with _HYDRATION_SECONDS.time():
+        documents = await fetch_result_data_distance_query(r, ticket_ids, fields)
+    return [process_results_distance_output(result, documents) for result in results]
 
 
-async def process_results_distance_output(r: Redis, results: List[tuple]) -> List[Dict]:
+def process_results_distance_output(
+    results: List[tuple], documents: Dict[str, Dict]
+) -> List[Dict]:
     processed_results = []
-    print("results 2", results)
     for result in results:
         member_name, distance, (latitude, longitude) = result
         ticket_id = member_name.decode("utf-8").split(":")[-1]
 
-        data = await fetch_result_data_distance_query(r, ticket_id)
         processed_results.append(
             {
                 "distance": distance,
                 "latitude": latitude,
                 "longitude": longitude,
-                "data": data.get("raw_data", {}) if data else {},
+                "data": documents.get(ticket_id) or {},
             }
         )
-    print("processed_results", processed_results)
     return processed_results
 
 
-async def fetch_result_data_distance_query(r: Redis, ticket_id: str) -> Dict:
-    data_key = f"{TEXT_KEY_NAME}:{ticket_id}"
-    try:
-        return (await r.json().get(data_key, "$"))[0]
-    except Exception:
-        return None
+async def fetch_result_data_distance_query(
+    r: Redis, ticket_ids: List[str], fields: Optional[List[str]] = None
+) -> Dict[str, Dict]:
+    """
+    Reads `$.raw_data` (or only `fields` of it) for HYDRATION_BATCH_SIZE
+    tickets per round trip. Missing documents are left out of the result,
+    a field missing from a document is returned as None.
+    returns: dict - ticket_id -> raw_data
+    """
+    documents = {}
+    for i in range(0, len(ticket_ids), HYDRATION_BATCH_SIZE):
+        batch = ticket_ids[i : i + HYDRATION_BATCH_SIZE]
+        keys = [f"{TEXT_KEY_NAME}:{ticket_id}" for ticket_id in batch]
+        if not fields:
+            for ticket_id, values in zip(batch, await r.json().mget(keys, "$.raw_data")):
+                if values:
+                    documents[ticket_id] = values[0]
+            continue
+
+        # one path per field: a union path drops the whole row when a field is missing
+        paths = ["$.raw_data[" + json.dumps(f, ensure_ascii=False) + "]" for f in fields]
+        pipeline = r.pipeline(transaction=False)
+        for key in keys:
+            await pipeline.json().get(key, *paths)
+        for ticket_id, values in zip(batch, await pipeline.execute()):
+            if values is None:
+                continue
+            if len(paths) == 1:
+                # JSON.GET with a single path returns its matches, not a path -> matches map
+                values = {paths[0]: values}
+            documents[ticket_id] = {
+                field: (values.get(path) or [None])[0] for field, path in zip(fields, paths)
+            }
+    return documents
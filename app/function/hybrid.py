@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from redis.commands.search.query import Query
+
+from app.config.config import SEARCH_PIPELINE_SIZE
+from app.function.batcher import encode_queries
+from app.function.geo import build_filter_clause, haversine
+from app.function.helper import (
+    hydrate_vector_results,
+    parse_coords,
+    parse_search_response,
+    preprocess_prompt_dict,
+    preprocess_raw_data,
+    process_result_similarity_query,
+)
+from app.function.metrics import stage_timer
+from app.function.vector_store import search_index_name, to_blob
+
+GEO_CLAUSE = "@location:[$longitude $latitude $radius m]"
+_FT_SEARCH_SECONDS = stage_timer("ft_search")
+
+
+@lru_cache(maxsize=256)
+def create_hybrid_query(pre_filter: str, top_k: int) -> Query:
+    return (
+        Query(f"({pre_filter})=>[KNN {top_k} @vector $query_vector AS similarity_score]")
+        .sort_by("similarity_score")
+        .return_fields(
+            "state",
+            "comment",
+            "type",
+            "address",
+            "district",
+            "province",
+            "subdistrict",
+            "location",
+            "similarity_score",
+        )
+        .paging(0, top_k)
+        .dialect(2)
+    )
+
+
+def fuse_result(result, origin, radius: float, similarity_weight: float) -> Dict:
+    """similarity and proximity (1 at the origin, 0 at the radius) blended linearly."""
+    processed = process_result_similarity_query(result)
+    point = parse_coords(getattr(result, "location", ""))
+    if origin and point:
+        distance = haversine(origin[0], origin[1], point[0], point[1])
+        proximity = max(0.0, 1 - distance / radius)
+    else:
+        distance, proximity = None, 0.0
+    fused = similarity_weight * processed["similarity_score"] + (1 - similarity_weight) * proximity
+    processed["distance"] = round(distance, 2) if distance is not None else None
+    processed["fused_score"] = round(fused, 4)
+    return processed
+
+
+async def query_all_texts_hybrid(
+    r,
+    queries: List[dict],
+    top_k: int = 5,
+    radius: float = 500,
+    filters: Optional[Dict[str, Optional[List[str]]]] = None,
+    similarity_weight: float = 0.7,
+) -> List[List[Dict]]:
+    """
+    One FT.SEARCH per query: KNN over the documents that pass the geo
+    radius (around the query coords) and attribute pre-filters, pipelined
+    like query_embeddings_by_similarity. Results are ordered by fused score.
+    """
+    queries = [preprocess_raw_data(q) for q in queries]
+    origins = [parse_coords(q.get("coords", "")) for q in queries]
+    texts = [preprocess_prompt_dict(q) for q in queries]
+    embeddings = await encode_queries(r, texts)
+    filter_clause = build_filter_clause(filters or {})
+
+    results = []
+    for i in range(0, len(queries), SEARCH_PIPELINE_SIZE):
+        pipeline = r.pipeline(transaction=False)
+        for origin, embedding in zip(
+            origins[i : i + SEARCH_PIPELINE_SIZE], embeddings[i : i + SEARCH_PIPELINE_SIZE]
+        ):
+            params = {"query_vector": to_blob(embedding)}
+            clauses = [filter_clause] if filter_clause else []
+            if origin:
+                clauses.insert(0, GEO_CLAUSE)
+                params.update({"longitude": origin[0], "latitude": origin[1], "radius": radius})
+            q = create_hybrid_query(" ".join(clauses) or "*", top_k)
+            args = ["PARAMS", 2 * len(params)]
+            for name, value in params.items():
+                args += [name, value]
+            await pipeline.execute_command("FT.SEARCH", search_index_name(), *q.get_args(), *args)
+        with _FT_SEARCH_SECONDS.time():
+            replies = await pipeline.execute()
+        responses = [parse_search_response(reply) for reply in replies]
+        responses = await hydrate_vector_results(r, responses)
+        for origin, response in zip(origins[i : i + SEARCH_PIPELINE_SIZE], responses):
+            fused = [
+                fuse_result(result, origin, radius, similarity_weight)
+                for result in response
+            ]
+            results.append(sorted(fused, key=lambda x: x["fused_score"], reverse=True))
+    return results
@@ -0,0 +1,148 @@
+import asyncio
+import csv
+import io
+import shutil
+import tempfile
+import time
+from typing import IO, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from loguru import logger
+
+from app.config.config import INGEST_CHUNK_SIZE, INGEST_WORKERS, INGEST_QUEUE_SIZE
+from app.function.helper import batch_add_data, generate_embeddings_redis
+from app.function.priority import score_pending_priorities
+from app.function.cluster import cluster_pending
+from app.function.metrics import gauge
+
+# chunks read but not yet picked up by a worker, over all running imports
+QUEUE_DEPTH = gauge("ingest_queue_depth", "Import chunks waiting for a worker")
+
+
+async def spool_upload(upload: UploadFile) -> IO[bytes]:
+    """
+    Copies the upload into a temporary file owned by the import, since the
+    request's own file is closed before background tasks run. The copy is
+    streamed, so memory use does not depend on the file size.
+    """
+    spooled = tempfile.TemporaryFile()
+    await upload.seek(0)
+    await asyncio.to_thread(shutil.copyfileobj, upload.file, spooled, 1024 * 1024)
+    spooled.seek(0)
+    return spooled
+
+
+def open_csv(file: IO[bytes]) -> Tuple[List[str], Iterator[List[str]]]:
+    rows = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    return next(rows), rows
+
+
+def iter_chunks(
+    header: List[str], rows: Iterator[List[str]], chunk_size: int = INGEST_CHUNK_SIZE
+) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(dict(zip(header, row)))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def process_chunk(
+    data_chunk, redis, chunk_number, seen_key: str = None, owner: str = None
+) -> Tuple[dict, int]:
+    """
+    params: owner: import job hash credited with the embeddings of the chunk's rows
+    returns: batch_add_data stats and documents embedded by this chunk's worker
+    """
+    logger.info(f"Processing data chunk: {chunk_number}")
+    stored = await batch_add_data(data_chunk, redis, seen_key=seen_key, owner=owner)
+    logger.info(f"Chunk {chunk_number}: stored {stored}")
+    embedded = await generate_embeddings_redis(redis)
+    logger.info(f"Chunk {chunk_number}: embedded {embedded} new documents")
+    scored = await score_pending_priorities(redis)
+    logger.info(f"Chunk {chunk_number}: scored {scored} documents")
+    clustered = await cluster_pending(redis)
+    logger.info(f"Chunk {chunk_number}: clustered {clustered} documents")
+    return stored, embedded
+
+
+async def run_ingestion(
+    chunks: Iterator[List[dict]],
+    redis,
+    workers: int = INGEST_WORKERS,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    job=None,
+) -> dict:
+    """
+    Reads chunks lazily and feeds them through a bounded queue to `workers`
+    concurrent store/embed workers. The reader blocks while the queue is
+    full, so at most `queue_size + workers` chunks are held in memory.
+    params:
+        job: optional ImportJob, receives progress and errors, is checked for
+            cancellation and throttled before each chunk is queued
+    returns: dict - rows read, rows written, chunks and failed chunks of this run
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stats = {"rows": 0, "written": 0, "chunks": 0, "failed_chunks": 0, "cancelled": False}
+    started = time.perf_counter()
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                QUEUE_DEPTH.dec()
+                number, chunk = item
+                seen_key = job.seen_key if job is not None else None
+                owner = job.key if job is not None else None
+                stored, _ = await process_chunk(chunk, redis, number, seen_key, owner)
+                stats["rows"] += stored["rows"]
+                stats["written"] += stored["written"] + stored["updated"]
+                if job is not None:
+                    await job.record_chunk(stored)
+            except Exception as e:
+                stats["failed_chunks"] += 1
+                logger.error(f"Chunk {number} failed: {str(e)}")
+                if job is not None:
+                    await job.record_error(f"chunk {number}: {str(e)}")
+            finally:
+                queue.task_done()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+    try:
+        while True:
+            if job is not None and await job.cancelled():
+                stats["cancelled"] = True
+                _drain(queue)
+                break
+            # parsing runs in a thread so a slow disk never stalls the loop
+            chunk: Optional[List[dict]] = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            stats["chunks"] += 1
+            if job is not None:
+                await job.record_read(len(chunk))
+                await job.throttle(len(chunk))
+            await queue.put((stats["chunks"], chunk))
+            QUEUE_DEPTH.inc()
+    finally:
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["rows"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def _drain(queue: asyncio.Queue):
+    """Drops chunks not yet picked up by a worker."""
+    while not queue.empty():
+        queue.get_nowait()
+        queue.task_done()
+        QUEUE_DEPTH.dec()
@@ -0,0 +1,269 @@
+import asyncio
+import time
+import uuid
+from typing import IO, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from app.config.config import (
+    IMPORT_JOB_KEY_NAME,
+    IMPORT_JOBS_KEY_NAME,
+    IMPORT_SLOTS_KEY_NAME,
+    IMPORT_RATE_KEY_NAME,
+    IMPORT_MAX_CONCURRENCY,
+    IMPORT_MAX_ROWS_PER_SECOND,
+    IMPORT_SLOT_TTL,
+    IMPORT_JOB_TTL,
+)
+from app.function.helper import remove_missing_tickets
+from app.function.ingest import iter_chunks, run_ingestion
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+COUNTERS = (
+    "rows_read",
+    "rows_stored",
+    "rows_unchanged",
+    "rows_embedded",
+    "rows_deleted",
+    "errors",
+)
+
+# drops leases not renewed within IMPORT_SLOT_TTL (crashed workers), then
+# takes a slot if one is free; re-acquiring an owned slot always succeeds
+_ACQUIRE_SLOT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZSCORE', KEYS[1], ARGV[3]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def job_key(job_id: str) -> str:
+    return f"{IMPORT_JOB_KEY_NAME}:{job_id}"
+
+
+class ImportJob:
+    """
+    Progress of one CSV import, kept in the `import:job:{id}` hash so any
+    API worker can report or cancel it while another one runs it.
+    """
+
+    def __init__(self, r, job_id: str, file: Optional[IO[bytes]] = None, full_export: bool = False):
+        self.r = r
+        self.id = job_id
+        self.key = job_key(job_id)
+        # spooled upload, its read position gives progress and ETA
+        self.file = file
+        # a full export lists every live ticket, the ids it contains are
+        # collected so tickets missing from it can be deleted at the end
+        self.full_export = full_export
+        self.seen_key = f"{self.key}:seen" if full_export else None
+
+    @classmethod
+    async def create(
+        cls,
+        r,
+        filename: str,
+        file: Optional[IO[bytes]] = None,
+        total_bytes: int = 0,
+        full_export: bool = False,
+    ):
+        job = cls(r, uuid.uuid4().hex, file, full_export)
+        now = time.time()
+        fields = {"id": job.id, "filename": filename, "state": "queued", "created_at": now}
+        fields["full_export"] = int(full_export)
+        fields.update({counter: 0 for counter in COUNTERS})
+        fields.update({"total_bytes": total_bytes, "bytes_read": 0})
+        pipeline = r.pipeline(transaction=False)
+        await pipeline.hset(job.key, mapping=fields)
+        await pipeline.zadd(IMPORT_JOBS_KEY_NAME, {job.id: now})
+        await pipeline.execute()
+        return job
+
+    async def set_state(self, state: str, **fields):
+        pipeline = self.r.pipeline(transaction=False)
+        await pipeline.hset(self.key, mapping={"state": state, **fields})
+        if state in FINISHED_STATES:
+            await pipeline.expire(self.key, IMPORT_JOB_TTL)
+        await pipeline.execute()
+
+    async def record_read(self, rows: int):
+        pipeline = self.r.pipeline(transaction=False)
+        await pipeline.hincrby(self.key, "rows_read", rows)
+        if self.file is not None:
+            await pipeline.hset(self.key, "bytes_read", self.file.tell())
+        await pipeline.execute()
+
+    async def record_chunk(self, stored: dict):
+        """
+        params: stored - batch_add_data stats of the chunk; rows_embedded is
+        counted by generate_embeddings_redis for the rows this job queued
+        """
+        pipeline = self.r.pipeline(transaction=False)
+        await pipeline.hincrby(self.key, "rows_stored", stored["written"] + stored["updated"])
+        await pipeline.hincrby(self.key, "rows_unchanged", stored["unchanged"] + stored["stale"])
+        if self.seen_key:
+            await pipeline.expire(self.seen_key, IMPORT_JOB_TTL)
+        await pipeline.execute()
+
+    async def record_error(self, error: str):
+        pipeline = self.r.pipeline(transaction=False)
+        await pipeline.hincrby(self.key, "errors", 1)
+        await pipeline.hset(self.key, "last_error", error)
+        await pipeline.execute()
+
+    async def cancelled(self) -> bool:
+        return await self.r.hget(self.key, "cancel") == b"1"
+
+    async def throttle(self, rows: int):
+        await acquire_rows(self.r, rows)
+
+
+def decode_job(raw: Dict[bytes, bytes]) -> dict:
+    """Job hash as a status dict with throughput, progress and ETA."""
+    job = {key.decode("utf-8"): value.decode("utf-8") for key, value in raw.items()}
+    for field in (*COUNTERS, "total_bytes", "bytes_read", "full_export"):
+        job[field] = int(job.get(field, 0))
+    for field in ("created_at", "started_at", "finished_at"):
+        job[field] = float(job[field]) if field in job else None
+    job["full_export"] = bool(job["full_export"])
+    job["cancel_requested"] = job.pop("cancel", "0") == "1"
+
+    elapsed = None
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    progress = job["bytes_read"] / job["total_bytes"] if job["total_bytes"] else None
+    if job["state"] == "completed":
+        progress = 1.0
+    job["elapsed_seconds"] = round(elapsed, 3) if elapsed is not None else None
+    job["rows_per_second"] = round(job["rows_stored"] / elapsed, 1) if elapsed else None
+    job["progress"] = round(progress, 4) if progress is not None else None
+    job["eta_seconds"] = None
+    if job["state"] == "running" and elapsed and progress:
+        job["eta_seconds"] = round(elapsed * (1 - progress) / progress, 1)
+    return job
+
+
+async def get_job(r, job_id: str) -> Optional[dict]:
+    raw = await r.hgetall(job_key(job_id))
+    return decode_job(raw) if raw else None
+
+
+async def list_jobs(r, limit: int = 20) -> List[dict]:
+    """Most recent jobs first; ids whose hash expired are dropped from the listing."""
+    job_ids = [i.decode("utf-8") for i in await r.zrevrange(IMPORT_JOBS_KEY_NAME, 0, limit - 1)]
+    pipeline = r.pipeline(transaction=False)
+    for job_id in job_ids:
+        await pipeline.hgetall(job_key(job_id))
+    jobs, expired = [], []
+    for job_id, raw in zip(job_ids, await pipeline.execute()):
+        if raw:
+            jobs.append(decode_job(raw))
+        else:
+            expired.append(job_id)
+    if expired:
+        await r.zrem(IMPORT_JOBS_KEY_NAME, *expired)
+    return jobs
+
+
+async def cancel_job(r, job_id: str) -> Optional[dict]:
+    """
+    Flags a job for cancellation; its runner stops reading at the next chunk,
+    and rows already stored are kept.
+    returns: the job status, None for an unknown job
+    """
+    job = await get_job(r, job_id)
+    if job is not None and job["state"] not in FINISHED_STATES:
+        await r.hset(job_key(job_id), "cancel", 1)
+        job["cancel_requested"] = True
+    return job
+
+
+async def acquire_slot(r, job_id: str) -> bool:
+    now = time.time()
+    acquired = await r.eval(
+        _ACQUIRE_SLOT, 1, IMPORT_SLOTS_KEY_NAME, now - IMPORT_SLOT_TTL, IMPORT_MAX_CONCURRENCY, job_id, now
+    )
+    return bool(acquired)
+
+
+async def release_slot(r, job_id: str):
+    await r.zrem(IMPORT_SLOTS_KEY_NAME, job_id)
+
+
+async def _renew_slot(r, job_id: str):
+    while True:
+        await asyncio.sleep(IMPORT_SLOT_TTL / 3)
+        await r.zadd(IMPORT_SLOTS_KEY_NAME, {job_id: time.time()}, xx=True)
+
+
+async def acquire_rows(r, rows: int, limit: int = IMPORT_MAX_ROWS_PER_SECOND):
+    """
+    Shared rows/second budget of all imports on all workers, counted in one
+    second windows. Waits for the next window when this one is spent; a
+    chunk larger than the whole budget gets a window to itself.
+    """
+    if limit <= 0:
+        return
+    while True:
+        now = time.time()
+        key = f"{IMPORT_RATE_KEY_NAME}:{int(now)}"
+        pipeline = r.pipeline(transaction=False)
+        await pipeline.incrby(key, rows)
+        await pipeline.expire(key, 2)
+        used, _ = await pipeline.execute()
+        if used <= limit or used == rows:
+            return
+        await r.decrby(key, rows)
+        await asyncio.sleep(int(now) + 1 - now)
+
+
+async def run_import_job(
+    r,
+    job: ImportJob,
+    header: List[str],
+    rows: Iterator[List[str]],
+    on_complete: Callable[[], Awaitable],
+    poll_interval: float = 1.0,
+):
+    """
+    Waits for one of the IMPORT_MAX_CONCURRENCY slots, ingests the rows while
+    holding it, then runs `on_complete` (index creation/migration). The job
+    hash records each state: queued, running, indexing, then completed,
+    cancelled or failed. A full export that read every chunk without error
+    also deletes the tickets it did not contain.
+    """
+    try:
+        while not await acquire_slot(r, job.id):
+            if await job.cancelled():
+                await job.set_state("cancelled", finished_at=time.time())
+                return
+            await asyncio.sleep(poll_interval)
+
+        renew = asyncio.create_task(_renew_slot(r, job.id))
+        try:
+            started_at = time.time()
+            await job.set_state("running", started_at=started_at)
+            stats = await run_ingestion(iter_chunks(header, rows), r, job=job)
+            logger.info(f"Import {job.id} ingestion finished: {stats}")
+            if stats["cancelled"]:
+                await job.set_state("cancelled", finished_at=time.time())
+                return
+            if job.full_export and not stats["failed_chunks"]:
+                deleted = await remove_missing_tickets(r, job.seen_key, started_at)
+                await r.hset(job.key, "rows_deleted", deleted)
+                logger.info(f"Import {job.id} deleted {deleted} tickets missing from the export")
+            await job.set_state("indexing")
+            await on_complete()
+            await job.set_state("completed", finished_at=time.time())
+        finally:
+            renew.cancel()
+            await release_slot(r, job.id)
+            if job.seen_key:
+                await r.delete(job.seen_key)
+    except Exception as e:
+        logger.error(f"Import {job.id} failed: {str(e)}")
+        await job.record_error(str(e))
+        await job.set_state("failed", finished_at=time.time())
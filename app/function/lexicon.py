@@ -0,0 +1,106 @@
+import csv
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from app.config.config import (
+    LEXICON_KEY_NAME,
+    LEXICON_VERSION_KEY_NAME,
+    LEXICON_REFRESH_INTERVAL,
+)
+
+SEVERITIES = ("HIGH", "MID", "LOW")  # highest first
+
+
+def read_lexicon_csv(path: str) -> Dict[str, List[str]]:
+    """
+    Reads the kumyarb csv, one column per severity level, with the csv
+    module; columns are ragged, so empty cells are skipped.
+    returns: dict - severity level -> words of that level
+    """
+    words = {level: [] for level in SEVERITIES}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for level in SEVERITIES:
+                word = (row.get(level) or "").strip()
+                if word:
+                    words[level].append(word)
+    return words
+
+
+class KumyarbLexicon:
+    """
+    In-memory word -> severity map of the kumyarb lexicon.
+    Matching is pure CPU: a word may span several consecutive tokens, so
+    profanity that the tokenizer splits apart is still caught.
+    """
+
+    def __init__(self, refresh_interval: float = LEXICON_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.severity: Dict[str, str] = {}
+        self.max_length = 0
+        self.version = None
+        self._checked_at = 0.0
+
+    def load(self, words: Dict[str, Iterable[str]]):
+        """params: words: dict - severity level -> words of that level"""
+        severity = {}
+        # lower severities first so a word listed twice keeps its highest level
+        for level in reversed(SEVERITIES):
+            for word in words.get(level, ()):
+                word = word.decode("utf-8") if isinstance(word, bytes) else word
+                word = word.strip()
+                if word:
+                    severity[word] = level
+        self.severity = severity
+        self.max_length = max(map(len, severity), default=0)
+
+    async def refresh(self, r):
+        pipeline = r.pipeline(transaction=False)
+        await pipeline.get(LEXICON_VERSION_KEY_NAME)
+        for level in SEVERITIES:
+            await pipeline.smembers(f"{LEXICON_KEY_NAME}:{level.lower()}")
+        version, *members = await pipeline.execute()
+        self.load(dict(zip(SEVERITIES, members)))
+        self.version = version
+        self._checked_at = time.monotonic()
+
+    async def refresh_if_changed(self, r):
+        """Reloads from Redis when the lexicon version changed, checked at most once per interval."""
+        if time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = time.monotonic()
+        if await r.get(LEXICON_VERSION_KEY_NAME) != self.version:
+            await self.refresh(r)
+
+    def match(self, tokens: List[str]) -> Tuple[List[dict], str]:
+        """
+        Censors tokens in a single pass, preferring the longest word that
+        starts at each token; whitespace tokens inside a span are ignored.
+        returns: (meta, censored) - matched words and the censored text
+        """
+        meta = []
+        censored = []
+        i = 0
+        while i < len(tokens):
+            best = None
+            joined = ""
+            for j in range(i, len(tokens)):
+                if j > i and tokens[j].isspace():
+                    continue
+                joined += tokens[j]
+                if len(joined) > self.max_length:
+                    break
+                if joined in self.severity:
+                    best = (j, joined)
+            if best is None:
+                censored.append(tokens[i])
+                i += 1
+                continue
+            j, word = best
+            meta.append({"word_num": i, "word": word, "severity": self.severity[word]})
+            censored.append("xxx")
+            i = j + 1
+        return meta, "".join(censored)
+
+
+kumyarb_lexicon = KumyarbLexicon()
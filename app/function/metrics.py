@@ -0,0 +1,332 @@
+import asyncio
+import json
+import os
+import re
+import socket
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.config.config import METRICS_KEY_NAME, METRICS_PUBLISH_INTERVAL
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+PREFIX = "intelisort_"
+_INVALID_NAME = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        buckets: Sequence[float],
+        description: str = "",
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        """`with histogram.time():` observes the block's duration in seconds."""
+        return _Timer(self)
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for bound, cumulative in self.snapshot()["buckets"].items():
+            samples.append(("_bucket", {**self.labels, "le": bound}, cumulative))
+        samples.append(("_sum", self.labels, self.sum))
+        samples.append(("_count", self.labels, self.count))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Counter:
+    """Monotonic counts keyed by the values of `label_names`."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = "", label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values: Dict[tuple, float] = defaultdict(float)
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] += amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [
+            ("", dict(zip(self.label_names, values)), value)
+            for values, value in sorted(self.values.items())
+        ]
+
+
+class Gauge:
+    """`mode` merges the values of several workers: "sum" (queue depths) or "max" (durations)."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        labels: Optional[Dict[str, str]] = None,
+        mode: str = "sum",
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.mode = mode
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [("", self.labels, self.value)]
+
+
+# (name, sorted labels) -> metric
+REGISTRY: Dict[tuple, object] = {}
+
+
+def histogram(
+    name: str, buckets: Sequence[float], description: str = "", labels: Optional[Dict[str, str]] = None
+) -> Histogram:
+    """Registered histogram of `name` and `labels`, created on first use."""
+    key = (name, tuple(sorted((labels or {}).items())))
+    if key not in REGISTRY:
+        REGISTRY[key] = Histogram(name, buckets, description, labels)
+    return REGISTRY[key]
+
+
+def counter(name: str, description: str = "", label_names: Sequence[str] = ()) -> Counter:
+    key = (name, ())
+    if key not in REGISTRY:
+        REGISTRY[key] = Counter(name, description, label_names)
+    return REGISTRY[key]
+
+
+def gauge(
+    name: str, description: str = "", labels: Optional[Dict[str, str]] = None, mode: str = "sum"
+) -> Gauge:
+    key = (name, tuple(sorted((labels or {}).items())))
+    if key not in REGISTRY:
+        REGISTRY[key] = Gauge(name, description, labels, mode)
+    return REGISTRY[key]
+
+
+def stage_timer(stage: str) -> Histogram:
+    """Histogram of one internal stage (tokenize, encode, ft_search, ...), used as `with stage_timer(...).time():`."""
+    return histogram(
+        "stage_seconds", LATENCY_BUCKETS, "Time spent in each internal stage", {"stage": stage}
+    )
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def collect() -> List[list]:
+    """
+    Samples of this process as JSON-friendly rows:
+    [family, kind, description, mode, suffix, labels, value]
+    """
+    rows = []
+    for metric in REGISTRY.values():
+        family = _INVALID_NAME.sub("_", PREFIX + metric.name)
+        mode = getattr(metric, "mode", "sum")
+        for suffix, labels, value in metric.samples():
+            rows.append([family, metric.kind, metric.description, mode, suffix, labels, value])
+    return rows
+
+
+def render_prometheus(rows: Optional[List[list]] = None) -> str:
+    """
+    Rows of one or more processes (default: this one) in the Prometheus
+    text exposition format. Samples of the same series are merged, summed
+    for counters and histograms, and by each gauge's mode.
+    """
+    families: Dict[str, dict] = {}
+    for family, kind, description, mode, suffix, labels, value in collect() if rows is None else rows:
+        entry = families.setdefault(family, {"kind": kind, "description": description, "series": {}})
+        series = (suffix, tuple(labels.items()))
+        if series not in entry["series"]:
+            entry["series"][series] = value
+        elif mode == "max":
+            entry["series"][series] = max(entry["series"][series], value)
+        else:
+            entry["series"][series] += value
+    lines = []
+    for name, entry in sorted(families.items()):
+        lines.append(f"# HELP {name} {entry['description']}")
+        lines.append(f"# TYPE {name} {entry['kind']}")
+        for (suffix, labels), value in entry["series"].items():
+            lines.append(f"{name}{suffix}{_format_labels(dict(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# -- Workers --
+# every API worker publishes its samples to one hash per host, so a scrape
+# answered by any worker covers all of them
+WORKER_ID = str(os.getpid())
+HOST_KEY = f"{METRICS_KEY_NAME}:{socket.gethostname()}"
+
+
+async def publish_metrics(r):
+    snapshot = {"at": time.time(), "rows": collect()}
+    await r.hset(HOST_KEY, WORKER_ID, json.dumps(snapshot, ensure_ascii=False))
+
+
+async def publish_metrics_forever(r, interval: float = METRICS_PUBLISH_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await publish_metrics(r)
+        except Exception as e:
+            logger.warning(f"Publishing metrics failed: {str(e)}")
+
+
+async def collect_workers(r, interval: float = METRICS_PUBLISH_INTERVAL) -> List[list]:
+    """
+    Rows of every worker of this host, this one up to date. Workers that
+    missed three publishes are dropped, their counters reset the way a
+    restarted process's would.
+    """
+    await publish_metrics(r)
+    rows, stale = [], []
+    now = time.time()
+    for worker, raw in (await r.hgetall(HOST_KEY)).items():
+        snapshot = json.loads(raw)
+        if now - snapshot["at"] > 3 * interval:
+            stale.append(worker)
+            continue
+        rows += snapshot["rows"]
+    if stale:
+        await r.hdel(HOST_KEY, *stale)
+    return rows
+
+
+# -- Redis commands --
+REDIS_COMMANDS = counter("redis_commands_total", "Redis commands sent, pipelined ones included", ("command",))
+_COMMAND_NAMES: Dict[object, str] = {}
+
+
+class CommandCounterMixin:
+    """Counts every command as it is packed, for single commands and pipelines alike."""
+
+    def pack_command(self, *args):
+        if args:
+            name = _COMMAND_NAMES.get(args[0])
+            if name is None:
+                raw = args[0].decode("utf-8") if isinstance(args[0], bytes) else str(args[0])
+                name = _COMMAND_NAMES.setdefault(args[0], raw.split(" ")[0].upper())
+            REDIS_COMMANDS.inc(name)
+        return super().pack_command(*args)
+
+
+def instrument_redis(client):
+    """Makes the client's pool create command-counting connections of its current class."""
+    pool = client.connection_pool
+    base = pool.connection_class
+    if not issubclass(base, CommandCounterMixin):
+        pool.connection_class = type(f"Counted{base.__name__}", (CommandCounterMixin, base), {})
+    return client
+
+
+# -- HTTP requests --
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware observing request latency per method, route template
+    and status. Routes are resolved from the matched endpoint, so path
+    parameters do not create new series.
+    """
+
+    def __init__(self, app, router=None):
+        self.app = app
+        self.router = router
+        self._paths: Dict[object, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            labels = {"method": scope["method"], "route": self._route(scope), "status": str(status[0])}
+            histogram(
+                "http_request_duration_seconds", LATENCY_BUCKETS, "HTTP request latency", labels
+            ).observe(time.perf_counter() - started)
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            routes = self.router.routes if self.router is not None else []
+            path = next(
+                (r.path for r in routes if getattr(r, "endpoint", None) is endpoint),
+                endpoint.__name__,
+            )
+            self._paths[endpoint] = path
+        return path
@@ -0,0 +1,262 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from redis.commands.search.query import Query
+
+from app.config.config import (
+    LOCATION_KEY_NAME,
+    TEXT_INDEX_NAME,
+    PENDING_PRIORITY_KEY_NAME,
+    PENDING_DENSITY_KEY_NAME,
+    PRIORITY_BATCH_SIZE,
+    PRIORITY_DENSITY_RADIUS,
+    PRIORITY_DENSITY_CAP,
+    PRIORITY_CLOSED_STATES,
+    PRIORITY_WEIGHTS,
+)
+from app.function.geo import build_filter_clause
+from app.function.helper import parse_coords, parse_search_response
+from app.function.lexicon import kumyarb_lexicon
+from app.function.registry import document_key, iter_ticket_keys
+from app.function.vector_store import ticket_id_of
+from app.function.tokenizer import tokenize_many
+
+SEVERITY_WEIGHT = {"HIGH": 1.0, "MID": 0.6, "LOW": 0.3}
+MONTH = 30 * 24 * 3600
+
+
+def curse_severity(tokens: List[str]) -> float:
+    meta, _ = kumyarb_lexicon.match(tokens)
+    return max((SEVERITY_WEIGHT[m["severity"]] for m in meta), default=0.0)
+
+
+def compute_priority_scores(
+    star: np.ndarray,
+    count_reopen: np.ndarray,
+    timestamp: np.ndarray,
+    last_activity: np.ndarray,
+    curse: np.ndarray,
+    neighbours: np.ndarray,
+    closed: np.ndarray,
+    weights: Dict[str, float] = PRIORITY_WEIGHTS,
+    now: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Vectorized priority over a batch of tickets; NaN marks a missing value
+    and contributes nothing. Closed tickets get NaN, they are not ranked.
+    params: now: epoch time ages are measured from, defaults to the current time
+    """
+    now = time.time() if now is None else now
+    dissatisfaction = np.nan_to_num((5 - np.clip(star, 1, 5)) / 4)
+    reopen = np.log1p(np.nan_to_num(np.clip(count_reopen, 0, None)))
+    # months since reported (or last touched) at scoring time, future dates count as 0
+    age = np.nan_to_num(np.clip((now - timestamp) / MONTH, 0, None))
+    inactivity = np.nan_to_num(np.clip((now - last_activity) / MONTH, 0, None))
+    density = np.log1p(neighbours) / np.log1p(PRIORITY_DENSITY_CAP)
+
+    score = (
+        weights["star"] * dissatisfaction
+        + weights["count_reopen"] * reopen
+        + weights["age"] * age
+        + weights["inactivity"] * inactivity
+        + weights["curse"] * curse
+        + weights["density"] * density
+    )
+    return np.where(closed, np.nan, np.round(score, 6))
+
+
+async def count_neighbours(r, coords: List[Optional[tuple]]) -> np.ndarray:
+    """Tickets within PRIORITY_DENSITY_RADIUS of each point (itself excluded), one pipeline."""
+    pipeline = r.pipeline(transaction=False)
+    queued = []
+    for point in coords:
+        if point is None:
+            continue
+        queued.append(point)
+        await pipeline.geosearch(
+            LOCATION_KEY_NAME,
+            longitude=point[0],
+            latitude=point[1],
+            radius=PRIORITY_DENSITY_RADIUS,
+            unit="m",
+            count=PRIORITY_DENSITY_CAP + 1,
+            any=True,
+        )
+    responses = iter(await pipeline.execute() if queued else [])
+    return np.array(
+        [max(0, len(next(responses)) - 1) if point else 0 for point in coords], dtype=np.float64
+    )
+
+
+async def score_tickets(r, keys: list) -> int:
+    """
+    Computes and stores `$.priority` for the given document keys; closed
+    tickets have it removed, which leaves them out of /top_priority.
+    """
+    pipeline = r.pipeline(transaction=False)
+    await pipeline.json().mget(keys, "$.raw_data")
+    await pipeline.json().mget(keys, "$.attrs")
+    raw_data, attrs = await pipeline.execute()
+    found = [(k, d[0], (a or [{}])[0]) for k, d, a in zip(keys, raw_data, attrs) if d]
+    if not found:
+        return 0
+    keys, raw_data, attrs = zip(*found)
+
+    def column(name):
+        return np.array([a.get(name, np.nan) for a in attrs], dtype=np.float64)
+
+    tokens = await tokenize_many([d.get("comment", "") for d in raw_data])
+    scores = compute_priority_scores(
+        star=column("star"),
+        count_reopen=column("count_reopen"),
+        timestamp=column("timestamp"),
+        last_activity=column("last_activity"),
+        curse=np.array([curse_severity(t) for t in tokens]),
+        neighbours=await count_neighbours(r, [parse_coords(d.get("coords", "")) for d in raw_data]),
+        closed=np.array([d.get("state") in PRIORITY_CLOSED_STATES for d in raw_data]),
+    )
+
+    pipeline = r.pipeline(transaction=False)
+    for key, score in zip(keys, scores):
+        if np.isnan(score):
+            await pipeline.json().delete(key, "$.priority")
+        else:
+            await pipeline.json().set(key, "$.priority", float(score))
+    await pipeline.execute()
+    return len(keys)
+
+
+async def requeue_neighbours(r, batch_size: int = PRIORITY_BATCH_SIZE) -> int:
+    """
+    Queues for scoring the tickets within PRIORITY_DENSITY_RADIUS of newly
+    located ones, whose density term the new ticket changed. Runs once per
+    import rather than per chunk. At most PRIORITY_DENSITY_CAP neighbours
+    are queued per ticket: the density term of a crowded area is capped and
+    does not change. Rescoring a neighbour does not queue its own neighbours.
+    returns: int - neighbours queued
+    """
+    queued = 0
+    while True:
+        keys = await r.spop(PENDING_DENSITY_KEY_NAME, batch_size)
+        if not keys:
+            return queued
+        try:
+            pipeline = r.pipeline(transaction=False)
+            for key in keys:
+                await pipeline.geosearch(
+                    LOCATION_KEY_NAME,
+                    member=f"{LOCATION_KEY_NAME}:{ticket_id_of(key)}",
+                    radius=PRIORITY_DENSITY_RADIUS,
+                    unit="m",
+                    count=PRIORITY_DENSITY_CAP,
+                    any=True,
+                )
+            # a ticket deleted or moved out of the set since it was queued fails its search
+            responses = await pipeline.execute(raise_on_error=False)
+            neighbours = {
+                document_key(ticket_id_of(member))
+                for response in responses
+                if not isinstance(response, Exception)
+                for member in response
+            }
+            if neighbours:
+                await r.sadd(PENDING_PRIORITY_KEY_NAME, *neighbours)
+                queued += len(neighbours)
+        except Exception:
+            await r.sadd(PENDING_DENSITY_KEY_NAME, *keys)
+            raise
+
+
+async def queue_all_priorities(r, batch_size: int = PRIORITY_BATCH_SIZE) -> int:
+    """
+    Queues every registered ticket for scoring. Ages are measured when a
+    ticket is scored, so a periodic full rescore keeps old scores comparable.
+    returns: int - tickets queued
+    """
+    queued = 0
+    async for keys in iter_ticket_keys(r, batch_size):
+        await r.sadd(PENDING_PRIORITY_KEY_NAME, *keys)
+        queued += len(keys)
+    return queued
+
+
+async def score_pending_priorities(r, batch_size: int = PRIORITY_BATCH_SIZE) -> int:
+    """Scores the tickets queued by batch_add_data, like generate_embeddings_redis does for embeddings."""
+    scored = 0
+    while True:
+        keys = await r.spop(PENDING_PRIORITY_KEY_NAME, batch_size)
+        if not keys:
+            return scored
+        try:
+            scored += await score_tickets(r, keys)
+        except Exception:
+            await r.sadd(PENDING_PRIORITY_KEY_NAME, *keys)
+            raise
+
+
+def parse_priority_cursor(cursor: Optional[str]) -> Tuple[Optional[str], int]:
+    """
+    Splits a "score:offset" cursor, offset counting the tickets of the last
+    score already returned; a bare score means offset 0.
+    """
+    if cursor is None:
+        return None, 0
+    score, _, offset = str(cursor).partition(":")
+    try:
+        float(score)
+        offset = int(offset or 0)
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}, expected the next_cursor of the previous page")
+    if offset < 0:
+        raise ValueError(f"Invalid cursor {cursor!r}, offset must not be negative")
+    return score, offset
+
+
+def create_top_priority_query(
+    filter_clause: str, page_size: int, score: Optional[str], offset: int = 0
+) -> Query:
+    clauses = [filter_clause] if filter_clause else []
+    if score is not None:
+        # keyset paging: at or below the last score of the previous page,
+        # skipping the tickets of that score it already returned
+        clauses.append(f"@priority:[-inf {score}]")
+    else:
+        clauses.append("@priority:[-inf +inf]")
+    return (
+        Query(" ".join(clauses))
+        .sort_by("priority", asc=False)
+        .return_fields("priority", "state", "comment", "type", "address", "district", "timestamp")
+        .paging(offset, page_size)
+        .dialect(2)
+    )
+
+
+def next_priority_cursor(
+    scores: List[str], page_size: int, score: Optional[str], offset: int
+) -> Optional[str]:
+    """Cursor after a page with `scores` (as returned by the index), None after the last page."""
+    if len(scores) < page_size:
+        return None
+    last = scores[-1]
+    ties = sum(1 for s in scores if s == last)
+    if score is not None and float(last) == float(score):
+        ties += offset
+    return f"{last}:{ties}"
+
+
+async def query_top_priority(
+    r, page_size: int = 20, cursor: Optional[str] = None, filters=None
+) -> Dict:
+    score, offset = parse_priority_cursor(cursor)
+    q = create_top_priority_query(build_filter_clause(filters or {}), page_size, score, offset)
+    response = await r.execute_command("FT.SEARCH", TEXT_INDEX_NAME, *q.get_args())
+    items, scores = [], []
+    for doc in parse_search_response(response):
+        item = doc.__dict__.copy()
+        item.pop("payload", None)
+        item["ticket_id"] = item.pop("id").split(":", 1)[-1]
+        scores.append(item["priority"])
+        item["priority"] = float(item["priority"])
+        items.append(item)
+    return {"items": items, "next_cursor": next_priority_cursor(scores, page_size, score, offset)}
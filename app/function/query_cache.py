@@ -0,0 +1,184 @@
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config.config import (
+    QUERY_CACHE_KEY_NAME,
+    QUERY_CACHE_GENERATION_KEY_NAME,
+    QUERY_CACHE_LOCAL_SIZE,
+    QUERY_CACHE_TTL,
+    QUERY_CACHE_COORD_PRECISION,
+)
+from app.function.metrics import counter
+
+_LOOKUPS = counter(
+    "query_cache_lookups_total", "Query result cache lookups by tier that answered", ("kind", "result")
+)
+
+
+def query_key(kind: str, *params) -> str:
+    """Digest of one query's normalized parameters."""
+    payload = json.dumps([kind, *params], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def round_coords(coords: Optional[str], precision: int = QUERY_CACHE_COORD_PRECISION) -> Optional[str]:
+    """"lon,lat" snapped to a grid of `precision` decimals, None when unparsable or not finite."""
+    try:
+        longitude, latitude = (float(c) for c in coords.split(","))
+    except (AttributeError, ValueError):
+        return None
+    if not (math.isfinite(longitude) and math.isfinite(latitude)):
+        return None
+    return f"{round(longitude, precision)},{round(latitude, precision)}"
+
+
+async def bump_generation(r):
+    """
+    Invalidates every cached result; works on a client or inside a write
+    pipeline. A missing counter starts from the clock, so a flushed
+    database never reuses a generation some worker still has entries for.
+    """
+    await r.set(QUERY_CACHE_GENERATION_KEY_NAME, time.time_ns(), nx=True)
+    await r.incr(QUERY_CACHE_GENERATION_KEY_NAME)
+
+
+class QueryCache:
+    """
+    Two-tier cache of per-query results keyed by the dataset generation
+    and a digest of the query's normalized parameters. Tier one is an
+    in-process LRU; tier two stores JSON in Redis with a short TTL, shared
+    by all workers. The generation is read from Redis once per request, so
+    a result is never served after an import or clear bumped it; entries
+    of older generations are dropped from the LRU and expire in Redis.
+    """
+
+    def __init__(
+        self,
+        local_size: int = QUERY_CACHE_LOCAL_SIZE,
+        ttl: int = QUERY_CACHE_TTL,
+        key_name: str = QUERY_CACHE_KEY_NAME,
+    ):
+        self.local_size = local_size
+        self.ttl = ttl
+        self.key_name = key_name
+        self._local: "OrderedDict[str, Any]" = OrderedDict()
+        self._generation: Optional[str] = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.local_size > 0 or self.ttl > 0
+
+    async def generation(self, r) -> str:
+        generation = await r.get(QUERY_CACHE_GENERATION_KEY_NAME)
+        if generation is None:
+            await bump_generation(r)
+            generation = await r.get(QUERY_CACHE_GENERATION_KEY_NAME)
+        generation = generation.decode("utf-8")
+        if generation != self._generation:
+            self._local.clear()
+            self._generation = generation
+        return generation
+
+    def _remember(self, key: str, value):
+        if self.local_size <= 0:
+            return
+        self._local[key] = value
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        r,
+        kind: str,
+        keys: List[Optional[str]],
+        compute: Callable[[List[int]], Awaitable[List]],
+    ) -> List:
+        """
+        Answers each query from the cache where possible and computes the
+        rest in one call; a query repeated within the request is computed once.
+        params:
+            keys: query_key per query, None for queries that must not be cached
+            compute: results for the given query indices, in that order
+        returns: list - one result per query, in order
+        """
+        if not self.enabled:
+            return await compute(list(range(len(keys))))
+
+        generation = await self.generation(r)
+        # generation-qualified, so an entry stored after a bump is never read as current
+        scoped = [f"{generation}:{key}" if key else None for key in keys]
+        results: Dict[int, Any] = {}
+        remote: Dict[str, List[int]] = {}
+        for i, key in enumerate(scoped):
+            if key is None:
+                continue
+            if key in self._local:
+                self._local.move_to_end(key)
+                results[i] = self._local[key]
+                self.local_hits += 1
+                _LOOKUPS.inc(kind, "local")
+            elif self.ttl > 0:
+                remote.setdefault(key, []).append(i)
+
+        if remote:
+            blobs = await r.mget([f"{self.key_name}:{key}" for key in remote])
+            for (key, indices), blob in zip(remote.items(), blobs):
+                if blob is None:
+                    continue
+                value = json.loads(blob)
+                self._remember(key, value)
+                for i in indices:
+                    results[i] = value
+                self.redis_hits += len(indices)
+                _LOOKUPS.inc(kind, "redis", amount=len(indices))
+
+        missing = [i for i in range(len(keys)) if i not in results]
+        if not missing:
+            return [results[i] for i in range(len(keys))]
+
+        first: Dict[str, int] = {}
+        to_compute = []
+        for i in missing:
+            if scoped[i] is None or scoped[i] not in first:
+                to_compute.append(i)
+                if scoped[i] is not None:
+                    first[scoped[i]] = i
+        computed = dict(zip(to_compute, await compute(to_compute)))
+        for i in missing:
+            results[i] = computed[i] if i in computed else computed[first[scoped[i]]]
+        self.misses += len(missing)
+        _LOOKUPS.inc(kind, "miss", amount=len(missing))
+
+        fresh = {key: computed[i] for key, i in first.items()}
+        for key, value in fresh.items():
+            self._remember(key, value)
+        if fresh and self.ttl > 0:
+            pipeline = r.pipeline(transaction=False)
+            for key, value in fresh.items():
+                await pipeline.set(
+                    f"{self.key_name}:{key}", json.dumps(value, ensure_ascii=False), ex=self.ttl
+                )
+            await pipeline.execute()
+        return [results[i] for i in range(len(keys))]
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "generation": self._generation,
+            "local_entries": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
+
+
+query_cache = QueryCache()
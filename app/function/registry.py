@@ -0,0 +1,90 @@
+import time
+from typing import AsyncIterator, Iterable, List
+
+from app.config.config import (
+    TEXT_KEY_NAME,
+    PREFIX_INDEX_KEY,
+    TICKET_REGISTRY_KEY_NAME,
+    REGISTRY_BATCH_SIZE,
+)
+from app.function.vector_store import ticket_id_of
+
+
+def document_key(ticket_id: str) -> str:
+    return f"{TEXT_KEY_NAME}:{ticket_id}"
+
+
+async def register_tickets(pipeline, keys: Iterable, imported_at: float = None):
+    """Queues a ZADD of the ticket ids of `keys`, scored by import time."""
+    imported_at = time.time() if imported_at is None else imported_at
+    mapping = {ticket_id_of(key): imported_at for key in keys}
+    if mapping:
+        await pipeline.zadd(TICKET_REGISTRY_KEY_NAME, mapping)
+
+
+async def unregister_tickets(pipeline, ticket_ids: Iterable[str]):
+    ticket_ids = list(ticket_ids)
+    if ticket_ids:
+        await pipeline.zrem(TICKET_REGISTRY_KEY_NAME, *ticket_ids)
+
+
+async def count_tickets(r) -> int:
+    return await r.zcard(TICKET_REGISTRY_KEY_NAME)
+
+
+async def iter_ticket_ids(
+    r, batch_size: int = REGISTRY_BATCH_SIZE, start="-inf", stop="+inf"
+) -> AsyncIterator[List[str]]:
+    """
+    Yields batches of registered ticket ids in import order, using the last
+    score seen as a cursor so each call is a bounded ZRANGEBYSCORE and
+    tickets imported meanwhile are picked up at the end.
+    params:
+        start, stop: import time range (epoch seconds)
+    """
+    min_score, offset = start, 0
+    while True:
+        rows = await r.zrangebyscore(
+            TICKET_REGISTRY_KEY_NAME, min_score, stop, start=offset, num=batch_size, withscores=True
+        )
+        if not rows:
+            return
+        yield [member.decode("utf-8") for member, _ in rows]
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][1]
+        # members sharing the last score are skipped by offset on the next call
+        ties = sum(1 for _, score in rows if score == last)
+        offset = ties + offset if last == min_score else ties
+        min_score = last
+
+
+async def iter_ticket_keys(r, batch_size: int = REGISTRY_BATCH_SIZE, **kwargs):
+    """Same as `iter_ticket_ids`, yielding `text:{id}` document keys."""
+    async for ticket_ids in iter_ticket_ids(r, batch_size, **kwargs):
+        yield [document_key(i) for i in ticket_ids]
+
+
+async def scan_batches(r, match: str, batch_size: int = REGISTRY_BATCH_SIZE):
+    """SCAN cursor iteration over `match`, yielded in lists of up to `batch_size` keys."""
+    keys = []
+    async for key in r.scan_iter(match=match, count=batch_size):
+        keys.append(key)
+        if len(keys) == batch_size:
+            yield keys
+            keys = []
+    if keys:
+        yield keys
+
+
+async def backfill_ticket_registry(r, batch_size: int = REGISTRY_BATCH_SIZE) -> int:
+    """
+    Registers documents stored before the registry existed, found with a
+    SCAN over the document prefix. Already registered ids keep their score.
+    returns: int - number of ids added
+    """
+    added = 0
+    async for keys in scan_batches(r, f"{PREFIX_INDEX_KEY}*", batch_size):
+        mapping = {ticket_id_of(key): time.time() for key in keys}
+        added += await r.zadd(TICKET_REGISTRY_KEY_NAME, mapping, nx=True)
+    return added
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from loguru import logger
+
+from app import IMPORT_STARTED
+from app.function.metrics import gauge
+
+# heavy modules imported lazily; the report shows which are loaded so far
+LAZY_MODULES = ("pandas", "pythainlp", "modal")
+
+
+class StartupProfile:
+    """
+    Seconds spent in each startup phase of this worker: `imports` from the
+    first app import to the startup hook, then the hook's own phases, then
+    the background warm-up tasks. Each phase is also exported as the
+    intelisort_startup_seconds{phase} gauge.
+    """
+
+    def __init__(self, import_started: float = IMPORT_STARTED):
+        self.import_started = import_started
+        self.phases: Dict[str, float] = {}
+        self.ready_seconds: Optional[float] = None
+        self.warm = False
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = round(seconds, 4)
+        gauge(
+            "startup_seconds", "Seconds spent in each startup phase, slowest worker", {"phase": phase}, "max"
+        ).set(seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def begin(self):
+        """Called first thing in the startup hook, closes the `imports` phase."""
+        self.record("imports", time.perf_counter() - self.import_started)
+
+    def ready(self):
+        """Called last thing in the startup hook, the worker serves requests from here on."""
+        self.ready_seconds = round(time.perf_counter() - self.import_started, 4)
+        self.record("ready", self.ready_seconds)
+        logger.info(f"Startup finished in {self.ready_seconds}s: {self.phases}")
+
+    def report(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "ready_seconds": self.ready_seconds,
+            "warm": self.warm,
+            "phases": dict(self.phases),
+            "lazy_modules_loaded": {name: name in sys.modules for name in LAZY_MODULES},
+        }
+
+
+startup_profile = StartupProfile()
+
+
+async def warm_up(tasks: Dict[str, Callable[[], None]]):
+    """
+    Runs blocking warm-up tasks one after another in a thread, so requests
+    are served meanwhile. A failed task is logged and left to load lazily
+    on first use.
+    """
+    for name, task in tasks.items():
+        try:
+            with startup_profile.phase(f"warm_up:{name}"):
+                await asyncio.to_thread(task)
+        except Exception as e:
+            logger.warning(f"Warm-up of {name} failed, it loads on first use: {str(e)}")
+    startup_profile.warm = True
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.config.config import (
+    TOKENIZER_WORKERS,
+    TOKENIZER_SHARD_SIZE,
+    TOKENIZER_INLINE_THRESHOLD,
+)
+from app.function.metrics import stage_timer
+
+ENGINE = "newmm"
+_TOKENIZE_SECONDS = stage_timer("tokenize")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def warm_up():
+    """Loads pythainlp and its dictionary trie once per process."""
+    from pythainlp.tokenize import word_tokenize
+
+    word_tokenize("ทดสอบการตัดคำ", engine=ENGINE)
+
+
+def _tokenize_shard(texts: List[str]) -> List[List[str]]:
+    from pythainlp.tokenize import word_tokenize
+
+    return [word_tokenize(text, engine=ENGINE) for text in texts]
+
+
+def start_tokenizer_pool(workers: int = TOKENIZER_WORKERS) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None and workers > 0:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up,
+        )
+        # workers are spawned lazily, one task each brings them all up now
+        for _ in range(workers):
+            _pool.submit(int)
+    return _pool
+
+
+def shutdown_tokenizer_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _shards(texts: List[str]) -> List[Tuple[int, List[str]]]:
+    return [
+        (i, texts[i : i + TOKENIZER_SHARD_SIZE])
+        for i in range(0, len(texts), TOKENIZER_SHARD_SIZE)
+    ]
+
+
+async def tokenize_many(texts: List[str]) -> List[List[str]]:
+    """
+    Tokenizes texts without blocking the event loop. Small batches run in a
+    thread, large ones are sharded across the process pool.
+    returns: list[list[str]] - tokens per text, in input order
+    """
+    with _TOKENIZE_SECONDS.time():
+        if _pool is None or len(texts) <= TOKENIZER_INLINE_THRESHOLD:
+            return await asyncio.to_thread(_tokenize_shard, texts)
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *[loop.run_in_executor(_pool, _tokenize_shard, shard) for _, shard in _shards(texts)]
+        )
+        return [tokens for shard in results for tokens in shard]
+
+
+async def iter_tokenized(texts: List[str]) -> AsyncIterator[Tuple[int, List[str]]]:
+    """Yields (index, tokens) pairs shard by shard, in completion order."""
+    if _pool is None:
+        for start, shard in _shards(texts):
+            with _TOKENIZE_SECONDS.time():
+                tokenized = await asyncio.to_thread(_tokenize_shard, shard)
+            for offset, tokens in enumerate(tokenized):
+                yield start + offset, tokens
+        return
+
+    loop = asyncio.get_running_loop()
+
+    async def run(start: int, shard: List[str]):
+        # timed per shard, the consumer's time between yields is not counted
+        with _TOKENIZE_SECONDS.time():
+            return start, await loop.run_in_executor(_pool, _tokenize_shard, shard)
+
+    for next_done in asyncio.as_completed([run(start, shard) for start, shard in _shards(texts)]):
+        start, tokenized = await next_done
+        for offset, tokens in enumerate(tokenized):
+            yield start + offset, tokens
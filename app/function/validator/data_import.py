@@ -1,5 +1,6 @@
 import csv
 import codecs
+from typing import List, Optional
 from fastapi import UploadFile
 
 def get_valid_columns() -> list[str]:
@@ -13,6 +14,12 @@ def get_valid_columns() -> list[str]:
 def is_column_valid(column: str) -> bool:
     return column in get_valid_columns()
 
+def validate_fields(fields: Optional[List[str]]):
+    """Raises ValueError when a requested result field is not a raw_data column."""
+    unknown = [field for field in fields or [] if not is_column_valid(field)]
+    if unknown:
+        raise ValueError(f"Unknown fields [{', '.join(unknown)}], valid: [{', '.join(get_valid_columns())}]")
+
 def validate_csv(file: UploadFile) -> tuple[bool, str]:
     try:
         if file.filename.endswith('.csv'):
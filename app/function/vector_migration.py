@@ -0,0 +1,97 @@
+"""
+Moves stored embeddings between the json and hash vector storage modes.
+
+usage:
+    python -m app.function.vector_migration --to hash            # copy $.embedding into vec:{id}
+    VECTOR_STORAGE=hash  (restart the API so queries use idx:vec)
+    python -m app.function.vector_migration --to hash --drop-source  # then free the JSON arrays
+"""
+import argparse
+import asyncio
+import os
+
+from loguru import logger
+from redis import asyncio as aioredis
+
+from app.config.config import (
+    TEXT_KEY_NAME,
+    VECTOR_KEY_NAME,
+    VECTOR_STORAGE_TYPE,
+    WRITE_PIPELINE_SIZE,
+)
+from app.function.helper import create_vector_index
+from app.function.registry import iter_ticket_keys, scan_batches
+from app.function.vector_store import (
+    fetch_hash_fields,
+    from_blob,
+    ticket_id_of,
+    to_blob,
+    vector_key,
+)
+
+
+async def json_to_hash(r, drop_source: bool = False, batch_size: int = WRITE_PIPELINE_SIZE) -> int:
+    moved = 0
+    async for keys in iter_ticket_keys(r, batch_size):
+        embeddings = await r.json().mget(keys, "$.embedding")
+        fields = await fetch_hash_fields(r, keys)
+        pipeline = r.pipeline(transaction=False)
+        for key, embedding, hash_fields in zip(keys, embeddings, fields):
+            if not embedding:
+                continue
+            blob = to_blob(embedding[0], VECTOR_STORAGE_TYPE)
+            await pipeline.hset(
+                vector_key(ticket_id_of(key)), mapping={"vector": blob, **hash_fields}
+            )
+            if drop_source:
+                await pipeline.json().delete(key, "$.embedding")
+            moved += 1
+        await pipeline.execute()
+    await create_vector_index(r)
+    return moved
+
+
+async def hash_to_json(r, drop_source: bool = False, batch_size: int = WRITE_PIPELINE_SIZE) -> int:
+    moved = 0
+    async for keys in scan_batches(r, f"{VECTOR_KEY_NAME}:*", batch_size):
+        pipeline = r.pipeline(transaction=False)
+        for key in keys:
+            await pipeline.hget(key, "vector")
+        blobs = await pipeline.execute()
+        pipeline = r.pipeline(transaction=False)
+        for key, blob in zip(keys, blobs):
+            if not blob:
+                continue
+            embedding = from_blob(blob, VECTOR_STORAGE_TYPE).tolist()
+            await pipeline.json().set(f"{TEXT_KEY_NAME}:{ticket_id_of(key)}", "$.embedding", embedding)
+            if drop_source:
+                await pipeline.delete(key)
+            moved += 1
+        await pipeline.execute()
+    return moved
+
+
+async def migrate_vector_storage(r, target: str, drop_source: bool = False) -> int:
+    if target == "hash":
+        return await json_to_hash(r, drop_source)
+    if target == "json":
+        return await hash_to_json(r, drop_source)
+    raise ValueError(f"Unsupported vector storage {target}, use json or hash")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--to", choices=("json", "hash"), required=True)
+    parser.add_argument("--drop-source", action="store_true", help="delete the copy being migrated from")
+    args = parser.parse_args()
+
+    r = await aioredis.from_url(os.environ.get("REDISCLOUD_URL", "redis://localhost"))
+    try:
+        moved = await migrate_vector_storage(r, args.to, args.drop_source)
+        logger.info(f"Moved {moved} embeddings to {args.to} storage ({VECTOR_STORAGE_TYPE})")
+    finally:
+        await r.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config.config import (
+    TEXT_KEY_NAME,
+    TEXT_INDEX_NAME,
+    VECTOR_STORAGE,
+    VECTOR_STORAGE_TYPE,
+    VECTOR_KEY_NAME,
+    VECTOR_INDEX_NAME,
+)
+
+VECTOR_DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16}
+
+
+def uses_hash_storage() -> bool:
+    return VECTOR_STORAGE == "hash"
+
+
+def search_index_name() -> str:
+    """The index KNN queries run against for the configured storage."""
+    return VECTOR_INDEX_NAME if uses_hash_storage() else TEXT_INDEX_NAME
+
+
+def to_blob(embedding, vector_type: str = None) -> bytes:
+    """Query/stored vector bytes; in json mode the index is always FLOAT32."""
+    if vector_type is None:
+        vector_type = VECTOR_STORAGE_TYPE if uses_hash_storage() else "FLOAT32"
+    return np.asarray(embedding, dtype=VECTOR_DTYPES[vector_type]).tobytes()
+
+
+def from_blob(blob: bytes, vector_type: str = VECTOR_STORAGE_TYPE) -> np.ndarray:
+    return np.frombuffer(blob, dtype=VECTOR_DTYPES[vector_type]).astype(np.float32)
+
+
+def ticket_id_of(key) -> str:
+    key = key.decode("utf-8") if isinstance(key, bytes) else key
+    return key.split(":", 1)[-1]
+
+
+def vector_key(ticket_id: str) -> str:
+    return f"{VECTOR_KEY_NAME}:{ticket_id}"
+
+
+def hash_fields(raw_data: dict, attrs: Optional[dict], location: Optional[str]) -> Dict[str, str]:
+    """Filterable attributes copied next to the vector so hybrid queries work on idx:vec."""
+    fields = {
+        "state": raw_data.get("state", ""),
+        "district": raw_data.get("district", ""),
+        "type": (attrs or {}).get("type", ""),
+    }
+    if location:
+        fields["location"] = location
+    return fields
+
+
+async def fetch_hash_fields(r, keys: list) -> List[Dict[str, str]]:
+    pipeline = r.pipeline(transaction=False)
+    await pipeline.json().mget(keys, "$.raw_data")
+    await pipeline.json().mget(keys, "$.attrs")
+    await pipeline.json().mget(keys, "$.location")
+    raw_data, attrs, locations = await pipeline.execute()
+    return [
+        hash_fields((d or [{}])[0], (a or [{}])[0], (l or [None])[0])
+        for d, a, l in zip(raw_data, attrs, locations)
+    ]
+
+
+async def write_embeddings(r, pipeline, keys: list, embeddings: List[List[float]]):
+    """Queues the embeddings of text:{id} documents on `pipeline` in the configured storage."""
+    if not uses_hash_storage():
+        for key, embedding in zip(keys, embeddings):
+            await pipeline.json().set(key, "$.embedding", embedding)
+        return
+    for key, embedding, fields in zip(keys, embeddings, await fetch_hash_fields(r, keys)):
+        await pipeline.hset(
+            vector_key(ticket_id_of(key)), mapping={"vector": to_blob(embedding), **fields}
+        )
+
+
+async def read_embeddings(r, ticket_ids: List[str]) -> List[Optional[np.ndarray]]:
+    """Stored embeddings as FLOAT32 arrays, None where a ticket has none yet."""
+    if not ticket_ids:
+        return []
+    if uses_hash_storage():
+        pipeline = r.pipeline(transaction=False)
+        for ticket_id in ticket_ids:
+            await pipeline.hget(vector_key(ticket_id), "vector")
+        return [from_blob(b) if b else None for b in await pipeline.execute()]
+    keys = [f"{TEXT_KEY_NAME}:{ticket_id}" for ticket_id in ticket_ids]
+    return [
+        np.asarray(e[0], dtype=np.float32) if e else None
+        for e in await r.json().mget(keys, "$.embedding")
+    ]
@@ -1,11 +1,14 @@
-from fastapi.responses import JSONResponse
-from fastapi.security import APIKeyHeader
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 from app.api.v1 import intelisort
+from app.db.redis import get_redis
+from app.function.metrics import RequestMetricsMiddleware, collect_workers, render_prometheus
 from fastapi import FastAPI, HTTPException, Request, Security, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
 from dotenv import load_dotenv
 import os
+import secrets
 
 load_dotenv()
 
@@ -14,6 +17,8 @@ title = "Intelisort API"
 description = "City Issues Priority Sorting, Grouping and Curse Detection API"
 summary = "API Specs for Intelisort Service"
 API_KEY = os.getenv("API_KEY")
+# bearer token of the Prometheus scraper, the API key unless set
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or API_KEY
 
 app = FastAPI(
     title=title,
@@ -37,6 +42,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# outermost, so latency includes every other middleware
+app.add_middleware(RequestMetricsMiddleware, router=app.router)
 
 # API key header dependency
 api_key_header = APIKeyHeader(name="api-key")
@@ -59,14 +66,32 @@ app.include_router(
 
 @app.get("/")
 def root(request: Request):
-    # Access and log the host header
-    host_header = request.headers.get("host")
-    print("host_header:", host_header)
-    # request ip
-    ip = request.client.host
-    print("ip:", ip)
     return {"message": "Up And Running!"}
 
+
+metrics_bearer = HTTPBearer(auto_error=False)
+
+def validate_metrics_token(credentials: HTTPAuthorizationCredentials = Security(metrics_bearer)):
+    if (
+        credentials is None
+        or not METRICS_TOKEN
+        or not secrets.compare_digest(credentials.credentials, METRICS_TOKEN)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+        )
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(validate_metrics_token)])
+async def metrics(redis=Depends(get_redis)):
+    """
+    Prometheus text format: request latency per route, stage timings, Redis
+    commands, queue depths, merged over every API worker of this host.
+    """
+    rows = await collect_workers(redis)
+    return PlainTextResponse(render_prometheus(rows), media_type="text/plain; version=0.0.4")
+
 @app.get('/docs', include_in_schema=False)
 def get_docs():
     return get_swagger_ui_html(openapi_url="/openapi.json", title="docs")
@@ -1,5 +1,5 @@
 from typing import List, Any, Union, NewType, Literal, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.model.base_response import BaseResponseModel
 
@@ -37,6 +37,55 @@ class QueryDistanceRequest(BaseModel):
     queries: List[QueryDistanceInput]
     top_k: int = 5
     radius: int = 600
+    # only return these raw_data fields, e.g. ["state", "comment"]
+    fields: Optional[List[str]] = None
+
+
+class QueryAreaInput(BaseModel):
+    # origin "lon,lat" results are sorted from, defaults to the polygon centroid
+    coords: Optional[str] = None
+    radius: Optional[float] = None
+    width: Optional[float] = None
+    height: Optional[float] = None
+    # district boundary as [[lon, lat], ...]
+    polygon: Optional[List[List[float]]] = None
+
+
+class QueryAreaRequest(BaseModel):
+    queries: List[QueryAreaInput]
+    top_k: int = 10
+    state: Optional[List[str]] = None
+    type: Optional[List[str]] = None
+    district: Optional[List[str]] = None
+    # stop at the first top_k matches instead of the top_k nearest
+    any: bool = False
+    fields: Optional[List[str]] = None
+
+
+class QueryHybridRequest(BaseModel):
+    # comment is embedded, coords is the center of the radius pre-filter
+    queries: List[QuerySimilarityInput]
+    top_k: int = 5
+    radius: int = 500
+    state: Optional[List[str]] = None
+    type: Optional[List[str]] = None
+    district: Optional[List[str]] = None
+    # fused_score = w * similarity + (1 - w) * proximity
+    similarity_weight: float = Field(0.7, ge=0, le=1)
+
+
+class TopPriorityRequest(BaseModel):
+    page_size: int = Field(20, ge=1, le=1000)
+    # next_cursor of the previous page, "score:offset"
+    cursor: Optional[str] = None
+    state: Optional[List[str]] = None
+    type: Optional[List[str]] = None
+    district: Optional[List[str]] = None
+
+
+class TopPriorityResponseModel(BaseResponseModel):
+    success: bool
+    content: dict
 
 
 class QuerySimilarityModel(BaseModel):
@@ -54,6 +103,11 @@ class QuerySimilarityResponseModel(BaseResponseModel):
     content: List[Union[List[QuerySimilarityModel], Any]]
 
 
+class QueryHybridResponseModel(BaseResponseModel):
+    success: bool
+    content: List[List[dict]]
+
+
 class QueryDistanceModel(BaseModel):
     distance: float
     latitude: Optional[float] = None
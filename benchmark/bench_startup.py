@@ -0,0 +1,90 @@
+"""
+Import-time profile of the API process.
+
+Imports app.main in fresh interpreters with `python -X importtime` and
+reports the median wall time, the slowest top-level packages by
+cumulative import time, and whether the lazily loaded modules (pandas,
+pythainlp, modal) were pulled in at import. Startup hook phases of a
+running worker are served by GET /intelisort/startup_info.
+
+usage:
+    python -m benchmark.bench_startup --runs 5 --top 15
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from app.function.startup import LAZY_MODULES
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """returns: (depth, cumulative_us, module) of every `import time:` line"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, int(cumulative), name.strip()))
+    return imports
+
+
+def profile_once(module: str) -> Tuple[float, Dict[str, int], set]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+    imports = parse_importtime(result.stderr)
+    packages = defaultdict(int)
+    for depth, cumulative, name in imports:
+        # nested imports are already part of their top-level parent
+        if depth == 0:
+            packages[name.split(".")[0]] += cumulative
+    return elapsed, packages, {name.split(".")[0] for _, _, name in imports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default="bench_startup.json")
+    args = parser.parse_args()
+
+    walls, per_package, loaded = [], defaultdict(list), set()
+    for _ in range(args.runs):
+        elapsed, packages, modules = profile_once(args.module)
+        walls.append(elapsed)
+        loaded |= modules
+        for name, cumulative in packages.items():
+            per_package[name].append(cumulative)
+
+    medians = {name: statistics.median(times) / 1000 for name, times in per_package.items()}
+    slowest = sorted(medians.items(), key=lambda item: item[1], reverse=True)[: args.top]
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "imports_ms": round(sum(medians.values()), 1),
+        "slowest_packages_ms": {name: round(ms, 1) for name, ms in slowest},
+        "lazy_modules_imported": {name: name in loaded for name in LAZY_MODULES},
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
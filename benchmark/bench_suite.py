@@ -0,0 +1,219 @@
+"""
+End-to-end benchmark of import, similarity, distance and curse-check.
+
+For every size, a fresh subprocess flushes the local redis-stack, imports
+synthetic Bangkok tickets (benchmark.tickets) through the import job path
+with the deterministic LocalEncoderBackend in place of the Modal encoder,
+then times the route handlers in-process (HTTP framing is not included).
+It reports import rows/sec, p50/p95/p99 latency per route and peak RSS of
+the API process and its tokenizer workers. The report records the git
+commit so runs can be compared with benchmark.compare.
+
+usage:
+    docker-compose up -d
+    REDISCLOUD_URL=redis://localhost python -m benchmark.bench_suite \
+        --sizes 10000 100000 1000000 --flush
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from benchmark.bench_vector_index import summarize
+from benchmark.tickets import generate_tickets, write_csv
+
+KUMYARB_CSV = "app/api/v1/static/kumyarb.csv"
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def worker_peak_rss_mb() -> Optional[float]:
+    """Summed VmHWM of live child processes (tokenizer pool), Linux only."""
+    total = 0
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return round(total / 1024, 1)
+
+
+async def measure(call: Callable[[object], Awaitable], payloads: list, concurrency: int) -> dict:
+    """Runs `call` once per payload with `concurrency` callers, returns latency percentiles."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(payload):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(payload)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(p) for p in payloads))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(payloads),
+        "requests_per_s": round(len(payloads) / elapsed, 1),
+        **summarize(np.array(latencies) * 1000),
+    }
+
+
+def curse_texts(tickets: List[dict], seed: int) -> List[str]:
+    """Ticket comments with a lexicon word spliced into every third one."""
+    with open(KUMYARB_CSV, encoding="utf-8") as f:
+        words = [w for row in islice(csv.reader(f), 1, None) for w in row if w]
+    rng = np.random.default_rng(seed)
+    return [
+        f"{t['comment']} {words[rng.integers(len(words))]}" if i % 3 == 0 else t["comment"]
+        for i, t in enumerate(tickets)
+    ]
+
+
+async def run_size(size: int, args) -> dict:
+    from redis import asyncio as aioredis
+
+    from app.api.v1 import intelisort
+    from app.db.redis import get_redis
+    from app.function.encoder import LocalEncoderBackend, set_encoder_backend
+    from app.function.ingest import open_csv
+    from app.function.jobs import ImportJob, get_job, run_import_job
+    from app.function.query_cache import query_cache
+    from app.model import query
+
+    url = os.environ.get("REDISCLOUD_URL", "redis://localhost")
+    r = await aioredis.from_url(url)
+    if await r.dbsize() and not args.flush:
+        raise SystemExit(f"{url} is not empty, pass --flush to clear it for the benchmark")
+    await r.flushall()
+    await r.close()
+
+    set_encoder_backend(LocalEncoderBackend())
+    if not args.query_cache:
+        # probes repeat comments, cached answers would hide the query path
+        query_cache.local_size = query_cache.ttl = 0
+    await intelisort.startup_event()
+    redis = get_redis()
+    result = {"size": size}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tickets.csv")
+            write_csv(path, size, args.seed)
+            with open(path, "rb") as spooled:
+                header, rows = open_csv(spooled)
+                job = await ImportJob.create(redis, "bench.csv", spooled, os.path.getsize(path))
+                started = time.perf_counter()
+                await run_import_job(
+                    redis, job, header, rows, lambda: intelisort.complete_processing(redis)
+                )
+                elapsed = time.perf_counter() - started
+        status = await get_job(redis, job.id)
+        result["import"] = {
+            "state": status["state"],
+            "errors": status["errors"],
+            "rows_embedded": status["rows_embedded"],
+            "seconds": round(elapsed, 3),
+            "rows_per_s": round(size / elapsed, 1),
+        }
+
+        # queries come from a different seed, so they are not copies of stored tickets
+        probes = list(generate_tickets(args.queries, args.seed + 1))
+        similarity = [
+            query.QuerySimilarityRequest(queries=[query.QuerySimilarityInput(**t)], top_k=args.top_k)
+            for t in probes
+        ]
+        distance = [
+            query.QueryDistanceRequest(
+                queries=[query.QueryDistanceInput(coords=t["coords"])], top_k=args.top_k
+            )
+            for t in probes
+        ]
+        texts = [[t] for t in curse_texts(probes, args.seed)]
+        result["query_from_similarity"] = await measure(
+            lambda request: intelisort.query_data_from_similarity(request, redis),
+            similarity,
+            args.concurrency,
+        )
+        result["query_from_distance"] = await measure(
+            lambda request: intelisort.query_data_from_distance(request, redis),
+            distance,
+            args.concurrency,
+        )
+        result["curse_check"] = await measure(
+            lambda text: intelisort.curse_check(text, redis), texts, args.concurrency
+        )
+        result["peak_rss_mb"] = peak_rss_mb()
+        result["peak_rss_workers_mb"] = worker_peak_rss_mb()
+    finally:
+        await intelisort.shutdown_event()
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--flush", action="store_true", help="clear a non-empty database first")
+    parser.add_argument("--query-cache", action="store_true", help="keep the query result cache on")
+    parser.add_argument("--output", default="bench_suite.json")
+    # internal: run one size in this process and print its result
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        print(json.dumps(asyncio.run(run_size(args.run_size, args)), ensure_ascii=False))
+        return
+
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("run_size", "output")},
+        "runs": [],
+    }
+    for size in args.sizes:
+        # one process per size, so peak RSS belongs to that size only
+        command = [sys.executable, "-m", "benchmark.bench_suite", "--run-size", str(size)]
+        command += ["--queries", str(args.queries), "--top-k", str(args.top_k)]
+        command += ["--concurrency", str(args.concurrency), "--seed", str(args.seed)]
+        if args.flush or report["runs"]:
+            command.append("--flush")
+        if args.query_cache:
+            command.append("--query-cache")
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        report["runs"].append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
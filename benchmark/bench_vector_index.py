@@ -0,0 +1,152 @@
+"""
+Recall-vs-latency benchmark of the FLAT and HNSW vector indexes.
+
+Loads synthetic clustered 384-dim embeddings into a scratch key prefix,
+builds one index per configuration with the same attributes as
+`create_index_text`, and reports build time, KNN latency percentiles and
+recall@k of every configuration against exact FLAT results.
+
+usage:
+    REDISCLOUD_URL=redis://localhost python -m benchmark.bench_vector_index \
+        --docs 100000 --queries 500 --top-k 10 --ef-runtime 10 50 200
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import redis
+from redis.commands.search.field import VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+
+from app.config.config import VECTOR_DIMENSION
+from app.function.helper import vector_index_attributes
+
+PREFIX = "bench:vec:"
+
+
+def synthetic_embeddings(n: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, VECTOR_DIMENSION)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)]
+    vectors += 0.35 * rng.standard_normal((n, VECTOR_DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load(r: redis.Redis, vectors: np.ndarray, batch: int = 1000):
+    for i in range(0, len(vectors), batch):
+        pipeline = r.pipeline(transaction=False)
+        for j, vector in enumerate(vectors[i : i + batch], start=i):
+            pipeline.json().set(f"{PREFIX}{j}", "$", {"embedding": vector.tolist()})
+        pipeline.execute()
+
+
+def build(r: redis.Redis, name: str, algorithm: str) -> float:
+    field = VectorField(
+        "$.embedding", algorithm, vector_index_attributes(algorithm), as_name="vector"
+    )
+    started = time.perf_counter()
+    r.ft(name).create_index(
+        [field], definition=IndexDefinition(prefix=[PREFIX], index_type=IndexType.JSON)
+    )
+    while float(r.ft(name).info()["percent_indexed"]) < 1:
+        time.sleep(0.2)
+    return time.perf_counter() - started
+
+
+def search(r: redis.Redis, name: str, queries: np.ndarray, top_k: int, ef_runtime=None):
+    clause = f"KNN {top_k} @vector $vec" + (f" EF_RUNTIME {ef_runtime}" if ef_runtime else "")
+    q = (
+        Query(f"*=>[{clause} AS score]")
+        .sort_by("score")
+        .return_fields("score")
+        .paging(0, top_k)
+        .dialect(2)
+    )
+    ids, latencies = [], []
+    for vector in queries:
+        started = time.perf_counter()
+        result = r.ft(name).search(q, {"vec": vector.tobytes()})
+        latencies.append(time.perf_counter() - started)
+        ids.append([doc.id for doc in result.docs])
+    return ids, np.array(latencies) * 1000
+
+
+def recall(truth, found) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def summarize(latencies: np.ndarray) -> dict:
+    return {
+        f"p{p}_ms": round(float(np.percentile(latencies, p)), 3) for p in (50, 95, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--ef-runtime", type=int, nargs="*", default=[10, 50, 200])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="bench_vector_index.json")
+    parser.add_argument("--keep", action="store_true", help="keep scratch keys")
+    args = parser.parse_args()
+
+    r = redis.Redis.from_url(os.environ.get("REDISCLOUD_URL", "redis://localhost"))
+    vectors = synthetic_embeddings(args.docs + args.queries, args.clusters, args.seed)
+    corpus, queries = vectors[: args.docs], vectors[args.docs :]
+    load(r, corpus)
+
+    report = {"docs": args.docs, "queries": args.queries, "top_k": args.top_k, "runs": []}
+    try:
+        flat_build = build(r, "bench:idx:flat", "FLAT")
+        truth, latencies = search(r, "bench:idx:flat", queries, args.top_k)
+        report["runs"].append(
+            {"algorithm": "FLAT", "build_s": round(flat_build, 3), "recall": 1.0, **summarize(latencies)}
+        )
+
+        hnsw_build = build(r, "bench:idx:hnsw", "HNSW")
+        for ef_runtime in args.ef_runtime:
+            found, latencies = search(r, "bench:idx:hnsw", queries, args.top_k, ef_runtime)
+            report["runs"].append(
+                {
+                    "algorithm": "HNSW",
+                    "ef_runtime": ef_runtime,
+                    "build_s": round(hnsw_build, 3),
+                    "recall": round(recall(truth, found), 4),
+                    **summarize(latencies),
+                }
+            )
+    finally:
+        for name in ("bench:idx:flat", "bench:idx:hnsw"):
+            try:
+                r.ft(name).dropindex(delete_documents=False)
+            except redis.ResponseError:
+                pass
+        if not args.keep:
+            for keys in _batched(r.scan_iter(f"{PREFIX}*", count=1000), 1000):
+                r.delete(*keys)
+
+    print(json.dumps(report, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+if __name__ == "__main__":
+    main()
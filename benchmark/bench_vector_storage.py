@@ -0,0 +1,110 @@
+"""
+Memory and throughput comparison of the vector storage modes.
+
+Writes the same synthetic 384-dim embeddings as JSON float arrays (the
+`VECTOR_STORAGE=json` layout) and as FLOAT32 / FLOAT16 blobs in hashes
+(`VECTOR_STORAGE=hash`), indexes each copy, and reports write rate, bytes
+per document (MEMORY USAGE), vector index size and KNN latency.
+
+usage:
+    REDISCLOUD_URL=redis://localhost python -m benchmark.bench_vector_storage \
+        --docs 50000 --modes json hash:FLOAT32 hash:FLOAT16
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import redis
+from redis.commands.search.field import VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+
+from app.config.config import VECTOR_DIMENSION
+from app.function.helper import vector_index_attributes
+from app.function.vector_store import to_blob
+from benchmark.bench_vector_index import _batched, summarize, synthetic_embeddings
+
+
+def write(r: redis.Redis, mode: str, prefix: str, vectors: np.ndarray, batch: int = 1000) -> float:
+    started = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        pipeline = r.pipeline(transaction=False)
+        for j, vector in enumerate(vectors[i : i + batch], start=i):
+            if mode == "json":
+                pipeline.json().set(f"{prefix}{j}", "$", {"embedding": vector.tolist()})
+            else:
+                pipeline.hset(f"{prefix}{j}", mapping={"vector": to_blob(vector, mode.split(":")[1])})
+        pipeline.execute()
+    return len(vectors) / (time.perf_counter() - started)
+
+
+def build(r: redis.Redis, mode: str, prefix: str, name: str):
+    if mode == "json":
+        field = VectorField("$.embedding", "FLAT", vector_index_attributes("FLAT"), as_name="vector")
+        definition = IndexDefinition(prefix=[prefix], index_type=IndexType.JSON)
+    else:
+        attributes = vector_index_attributes("FLAT", mode.split(":")[1])
+        field = VectorField("vector", "FLAT", attributes, as_name="vector")
+        definition = IndexDefinition(prefix=[prefix], index_type=IndexType.HASH)
+    r.ft(name).create_index([field], definition=definition)
+    while float(r.ft(name).info()["percent_indexed"]) < 1:
+        time.sleep(0.2)
+
+
+def run(r: redis.Redis, mode: str, vectors: np.ndarray, queries: np.ndarray, top_k: int) -> dict:
+    tag = mode.replace(":", "").lower()
+    prefix, name = f"bench:{tag}:", f"bench:idx:{tag}"
+    rate = write(r, mode, prefix, vectors)
+    build(r, mode, prefix, name)
+
+    sample = [f"{prefix}{i}" for i in range(0, len(vectors), max(1, len(vectors) // 200))]
+    bytes_per_doc = np.mean([r.memory_usage(key, samples=0) or 0 for key in sample])
+    info = r.ft(name).info()
+
+    vector_type = "FLOAT32" if mode == "json" else mode.split(":")[1]
+    q = Query(f"*=>[KNN {top_k} @vector $vec AS score]").sort_by("score").paging(0, top_k).dialect(2)
+    latencies = []
+    for vector in queries:
+        started = time.perf_counter()
+        r.ft(name).search(q, {"vec": to_blob(vector, vector_type)})
+        latencies.append(time.perf_counter() - started)
+
+    r.ft(name).dropindex(delete_documents=False)
+    for keys in _batched(r.scan_iter(f"{prefix}*", count=1000), 1000):
+        r.delete(*keys)
+    return {
+        "mode": mode,
+        "writes_per_s": round(rate, 1),
+        "bytes_per_doc": round(float(bytes_per_doc), 1),
+        "vector_index_mb": float(info.get("vector_index_sz_mb", 0) or 0),
+        **summarize(np.array(latencies) * 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["json", "hash:FLOAT32", "hash:FLOAT16"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="bench_vector_storage.json")
+    args = parser.parse_args()
+
+    r = redis.Redis.from_url(os.environ.get("REDISCLOUD_URL", "redis://localhost"))
+    vectors = synthetic_embeddings(args.docs + args.queries, 200, args.seed)
+    corpus, queries = vectors[: args.docs], vectors[args.docs :]
+
+    report = {"docs": args.docs, "dimension": VECTOR_DIMENSION, "runs": []}
+    for mode in args.modes:
+        report["runs"].append(run(r, mode, corpus, queries, args.top_k))
+
+    print(json.dumps(report, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
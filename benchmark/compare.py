@@ -0,0 +1,62 @@
+"""
+Side-by-side comparison of two bench_suite reports.
+
+usage:
+    python -m benchmark.compare bench_suite_main.json bench_suite.json
+"""
+import argparse
+import json
+
+# metric, True when higher is better
+METRICS = [
+    ("import.rows_per_s", True),
+    ("query_from_similarity.p50_ms", False),
+    ("query_from_similarity.p95_ms", False),
+    ("query_from_similarity.p99_ms", False),
+    ("query_from_distance.p50_ms", False),
+    ("query_from_distance.p95_ms", False),
+    ("query_from_distance.p99_ms", False),
+    ("curse_check.p50_ms", False),
+    ("curse_check.p95_ms", False),
+    ("curse_check.p99_ms", False),
+    ("peak_rss_mb", False),
+]
+
+
+def lookup(run: dict, path: str):
+    for part in path.split("."):
+        run = (run or {}).get(part)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline {baseline.get('commit')} vs candidate {candidate.get('commit')}")
+    before = {run["size"]: run for run in baseline["runs"]}
+    for run in candidate["runs"]:
+        old = before.get(run["size"])
+        if old is None:
+            continue
+        print(f"\n{run['size']} tickets")
+        for metric, higher_is_better in METRICS:
+            a, b = lookup(old, metric), lookup(run, metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a * 100
+            better = change > 0 if higher_is_better else change < 0
+            # changes under 5% are treated as noise
+            mark = " " if abs(change) < 5 else "+" if better else "-"
+            print(f"  {mark} {metric:32} {a:>10} -> {b:>10} ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Synthetic Bangkok city-issue tickets with the 16 columns accepted by
+/import/csv. Comments are Thai, built from a fixed vocabulary so texts
+repeat the way real reports do, and coords are scattered around district
+centres. The same seed always yields the same tickets.
+
+usage:
+    python -m benchmark.tickets --rows 100000 --output tickets_100k.csv
+"""
+import argparse
+import csv
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
+
+COLUMNS = [
+    "ticket_id",
+    "type",
+    "organization",
+    "comment",
+    "coords",
+    "photo",
+    "photo_after",
+    "address",
+    "subdistrict",
+    "district",
+    "province",
+    "timestamp",
+    "state",
+    "star",
+    "count_reopen",
+    "last_activity",
+]
+
+# district: (lon, lat, subdistricts)
+DISTRICTS = {
+    "ปทุมวัน": (100.5231, 13.7443, ["ลุมพินี", "รองเมือง", "วังใหม่", "ปทุมวัน"]),
+    "บางรัก": (100.5243, 13.7300, ["สีลม", "สุริยวงศ์", "มหาพฤฒาราม", "บางรัก"]),
+    "จตุจักร": (100.5600, 13.8282, ["ลาดยาว", "จตุจักร", "จอมพล", "เสนานิคม"]),
+    "ห้วยขวาง": (100.5794, 13.7765, ["ห้วยขวาง", "สามเสนนอก", "บางกะปิ"]),
+    "ลาดพร้าว": (100.6076, 13.8039, ["ลาดพร้าว", "จรเข้บัว"]),
+    "คลองเตย": (100.5838, 13.7082, ["คลองเตย", "คลองตัน", "พระโขนง"]),
+    "สาทร": (100.5262, 13.7081, ["ยานนาวา", "ทุ่งวัดดอน", "ทุ่งมหาเมฆ"]),
+    "ดินแดง": (100.5532, 13.7699, ["ดินแดง", "รัชดาภิเษก"]),
+    "บางนา": (100.6045, 13.6680, ["บางนาเหนือ", "บางนาใต้"]),
+    "ราชเทวี": (100.5342, 13.7589, ["ทุ่งพญาไท", "ถนนพญาไท", "ถนนเพชรบุรี", "มักกะสัน"]),
+    "พระนคร": (100.4991, 13.7643, ["พระบรมมหาราชวัง", "วังบูรพาภิรมย์", "ชนะสงคราม"]),
+    "บางกะปิ": (100.6470, 13.7658, ["คลองจั่น", "หัวหมาก"]),
+}
+
+# type tags and the problems reported under them
+PROBLEMS = {
+    "ถนน": ["ถนนชำรุดเป็นหลุมบ่อ", "ผิวถนนยุบตัว", "ฝาท่อบนถนนหาย"],
+    "ทางเท้า": ["ทางเท้าชำรุด", "กระเบื้องทางเท้าแตก", "มีหาบเร่แผงลอยกีดขวางทางเท้า"],
+    "ความสะอาด": ["ขยะไม่ได้จัดเก็บหลายวัน", "มีการทิ้งขยะริมคลอง", "ถังขยะล้น"],
+    "น้ำท่วม": ["น้ำท่วมขังหลังฝนตก", "ท่อระบายน้ำอุดตัน", "น้ำเน่าเสียส่งกลิ่นเหม็น"],
+    "แสงสว่าง": ["ไฟฟ้าส่องสว่างดับ", "เสาไฟเอียงจะล้ม", "ไฟกระพริบทั้งคืน"],
+    "กีดขวาง": ["จอดรถกีดขวางทางเข้าออก", "วางของกีดขวางทางสัญจร"],
+    "เสียง": ["เสียงดังรบกวนยามวิกาล", "ก่อสร้างเสียงดังช่วงกลางคืน"],
+    "ต้นไม้": ["กิ่งไม้หักพาดสายไฟ", "ต้นไม้บังป้ายจราจร"],
+}
+PLACES = ["หน้าซอย", "ปากซอย", "ข้างตลาด", "หน้าโรงเรียน", "ใกล้ป้ายรถเมล์", "หน้าร้านสะดวกซื้อ", "ตรงข้ามวัด", "ใต้สะพาน"]
+DETAILS = ["", "", "รบกวนช่วยแก้ไขด่วน", "เป็นมาหลายสัปดาห์แล้ว", "อันตรายต่อผู้สัญจร", "แจ้งไปแล้วยังไม่มีการแก้ไข"]
+STATES = ["รอรับเรื่อง", "กำลังดำเนินการ", "ส่งต่อ", "เสร็จสิ้น"]
+STATE_WEIGHTS = [0.25, 0.3, 0.1, 0.35]
+
+START = datetime(2022, 1, 1, tzinfo=timezone.utc)
+SPAN_SECONDS = 2 * 365 * 24 * 3600
+
+
+def generate_tickets(n: int, seed: int = 7) -> Iterator[dict]:
+    rng = random.Random(seed)
+    districts = list(DISTRICTS)
+    types = list(PROBLEMS)
+    for i in range(n):
+        district = rng.choice(districts)
+        lon, lat, subdistricts = DISTRICTS[district]
+        tags = rng.sample(types, rng.choice([1, 1, 1, 2]))
+        soi = rng.randint(1, 120)
+        place = rng.choice(PLACES)
+        if place in ("หน้าซอย", "ปากซอย"):
+            place = f"{place} {soi}"
+        comment = " ".join(
+            part for part in (rng.choice(PROBLEMS[tags[0]]), place, rng.choice(DETAILS)) if part
+        )
+        created = START + timedelta(seconds=rng.randrange(SPAN_SECONDS))
+        last_activity = created + timedelta(seconds=rng.randrange(30 * 24 * 3600))
+        state = rng.choices(STATES, STATE_WEIGHTS)[0]
+        subdistrict = rng.choice(subdistricts)
+        ticket_id = f"BKK-{i:07d}"
+        yield {
+            "ticket_id": ticket_id,
+            "type": "{" + ",".join(tags) + "}",
+            "organization": f"เขต{district}",
+            "comment": comment,
+            # ~1.5 km spread around the district centre, "lon,lat"
+            "coords": f"{lon + rng.gauss(0, 0.012):.5f},{lat + rng.gauss(0, 0.012):.5f}",
+            "photo": f"https://storage.example.com/photo/{ticket_id}.jpg",
+            "photo_after": f"https://storage.example.com/photo/{ticket_id}_after.jpg" if state == "เสร็จสิ้น" else "",
+            "address": f"{rng.randint(1, 999)} ซอย {soi} แขวง{subdistrict} เขต{district} กรุงเทพมหานคร",
+            "subdistrict": subdistrict,
+            "district": district,
+            "province": "กรุงเทพมหานคร",
+            "timestamp": created.strftime("%Y-%m-%d %H:%M:%S.%f+00"),
+            "state": state,
+            "star": str(rng.randint(1, 5)) if state == "เสร็จสิ้น" and rng.random() < 0.6 else "",
+            "count_reopen": str(rng.choices([0, 1, 2, 3], [0.85, 0.1, 0.04, 0.01])[0]),
+            "last_activity": last_activity.strftime("%Y-%m-%d %H:%M:%S.%f+00"),
+        }
+
+
+def write_csv(path: str, n: int, seed: int = 7):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(generate_tickets(n, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="tickets.csv")
+    args = parser.parse_args()
+    write_csv(args.output, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 #!/bin/bash
 docker-compose up -d
 export PORT=8000
-poetry run gunicorn -w 1 -k uvicorn.workers.UvicornWorker --bind "[::]:$PORT" app.main:app --timeout 300
\ No newline at end of file
+poetry run gunicorn -w ${WEB_CONCURRENCY:-4} -k uvicorn.workers.UvicornWorker --bind "[::]:$PORT" app.main:app --timeout 300
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from app.function import batcher
+from app.function.batcher import MicroBatcher
+
+
+class RecordingHandler:
+    def __init__(self, results=None):
+        self.batches = []
+        self.results = results
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        return self.results if self.results is not None else [item * 2 for item in items]
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    handler = RecordingHandler()
+    micro = MicroBatcher(handler, max_batch_size=3, max_wait_ms=10_000, name="test_size")
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(micro.submit(1), micro.submit(2), micro.submit(3))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+    assert results == [2, 4, 6]
+    assert handler.batches == [[1, 2, 3]]
+    assert elapsed < 1
+
+
+def test_partial_batch_is_dispatched_after_the_wait_window():
+    handler = RecordingHandler()
+    micro = MicroBatcher(handler, max_batch_size=10, max_wait_ms=50, name="test_timeout")
+
+    async def run():
+        started = time.perf_counter()
+        results = await asyncio.gather(micro.submit(1), micro.submit_many([2, 3]))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+    assert results == [2, [4, 6]]
+    assert handler.batches == [[1, 2, 3]]
+    assert elapsed >= 0.04
+
+
+def test_oversized_submission_is_split_into_batches():
+    handler = RecordingHandler()
+    micro = MicroBatcher(handler, max_batch_size=2, max_wait_ms=10_000, name="test_split")
+    assert asyncio.run(micro.submit_many([1, 2, 3, 4, 5])) == [2, 4, 6, 8, 10]
+    assert handler.batches == [[1, 2], [3, 4], [5]]
+
+
+def test_short_handler_result_fails_every_future():
+    micro = MicroBatcher(RecordingHandler(results=[0]), max_batch_size=2, name="test_short")
+    with pytest.raises(RuntimeError, match="returned 1 results for 2 items"):
+        asyncio.run(micro.submit_many([1, 2]))
+
+
+def test_handler_error_reaches_callers():
+    async def failing(items):
+        raise ConnectionError("encoder down")
+
+    micro = MicroBatcher(failing, max_batch_size=1, name="test_error")
+    with pytest.raises(ConnectionError):
+        asyncio.run(micro.submit("x"))
+
+
+def test_encode_queries_reads_the_cache_with_each_callers_client(monkeypatch):
+    calls = []
+
+    async def fake_encode_with_cache(r, texts):
+        calls.append((r, list(texts)))
+        return [f"{r}:{text}" for text in texts]
+
+    monkeypatch.setattr(batcher, "encode_with_cache", fake_encode_with_cache)
+    items = [("r1", "a"), ("r2", "b"), ("r1", "c")]
+    assert asyncio.run(batcher._encode_queries(items)) == ["r1:a", "r2:b", "r1:c"]
+    assert calls == [("r1", ["a", "c"]), ("r2", ["b"])]
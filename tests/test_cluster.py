@@ -0,0 +1,49 @@
+from app.function.cluster import UnionFind, cell_size, forward_neighbours, geohash
+
+BANGKOK = (100.5018, 13.7563)
+
+
+def test_geohash_matches_the_reference_encoding():
+    assert geohash(-5.6, 42.6, precision=5) == "ezs42"
+    assert len(geohash(*BANGKOK)) == 6
+
+
+def test_nearby_points_share_a_cell():
+    assert geohash(*BANGKOK) == geohash(BANGKOK[0] + 1e-5, BANGKOK[1] + 1e-5)
+
+
+def test_forward_neighbours_cover_every_adjacent_pair_once():
+    width, height = cell_size()
+    longitude, latitude = BANGKOK
+    cell = geohash(longitude, latitude)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx == dy == 0:
+                continue
+            other = (longitude + dx * width, latitude + dy * height)
+            covered = (cell in forward_neighbours(*other)) + (geohash(*other) in forward_neighbours(longitude, latitude))
+            assert covered == 1, (dx, dy)
+
+
+def test_forward_neighbours_are_distinct_cells():
+    cells = forward_neighbours(*BANGKOK)
+    assert len(set(cells)) == 4
+    assert geohash(*BANGKOK) not in cells
+
+
+def test_union_find_names_clusters_by_the_smallest_id():
+    union = UnionFind()
+    union.union("3", "5")
+    union.union("5", "1")
+    union.union("7", "8")
+    assert {union.find(i) for i in ("1", "3", "5")} == {"1"}
+    assert union.find("8") == "7"
+    assert union.find("9") == "9"
+
+
+def test_union_find_compresses_paths():
+    union = UnionFind()
+    for a, b in (("d", "e"), ("c", "d"), ("b", "c"), ("a", "b")):
+        union.union(a, b)
+    assert union.find("e") == "a"
+    assert union.parent["e"] == "a"
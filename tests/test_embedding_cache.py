@@ -0,0 +1,120 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.function import embedding_cache as cache_module
+from app.function.embedding_cache import EmbeddingCache, encode_with_cache, text_hash
+
+
+class FakeRedis:
+    """Strings with TTLs and one sorted set, enough for the embedding cache."""
+
+    def __init__(self):
+        self.strings = {}
+        self.zset = {}
+
+    async def mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.strings[key] = value
+
+    async def expire(self, key, seconds):
+        return key in self.strings
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+
+    async def zadd(self, key, mapping):
+        self.zset.update(mapping)
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zset.pop(member, None)
+
+    async def zremrangebyscore(self, key, low, high):
+        for member, score in list(self.zset.items()):
+            if score <= high:
+                del self.zset[member]
+
+    async def zcard(self, key):
+        return len(self.zset)
+
+    async def zpopmin(self, key, count):
+        oldest = sorted(self.zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in oldest:
+            del self.zset[member]
+        return [(member.encode("utf-8"), score) for member, score in oldest]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, r):
+        self.r = r
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def queue(*args, **kwargs):
+            self.calls.append(getattr(self.r, name)(*args, **kwargs))
+
+        return queue
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    calls = []
+
+    async def encode_sentences(sentences):
+        calls.append(list(sentences))
+        return [[float(len(s)), 1.0] for s in sentences]
+
+    monkeypatch.setattr(cache_module, "encode_sentences", encode_sentences)
+    monkeypatch.setattr(cache_module, "embedding_cache", EmbeddingCache(local_size=8, ttl=60))
+    return calls
+
+
+def run(r, texts):
+    return asyncio.run(encode_with_cache(r, texts))
+
+
+def test_normalized_duplicates_are_encoded_once_as_sent(encoder):
+    embeddings = run(FakeRedis(), ["ไฟ  ดับ", "ไฟ ดับ ", "ถนน"])
+    assert encoder == [["ไฟ  ดับ", "ถนน"]]
+    assert embeddings[0] == embeddings[1] == [7.0, 1.0]
+    assert embeddings[2] == [3.0, 1.0]
+
+
+def test_redis_tier_is_shared_and_promoted_to_the_local_tier(encoder):
+    r = FakeRedis()
+    run(r, ["ไฟดับ"])
+    # another worker: empty local tier, same Redis
+    cache_module.embedding_cache = other = EmbeddingCache(local_size=8, ttl=60)
+    assert run(r, ["ไฟดับ"]) == [[5.0, 1.0]]
+    assert run(r, ["ไฟดับ"]) == [[5.0, 1.0]]
+    assert len(encoder) == 1
+    assert (other.redis_hits, other.local_hits) == (1, 1)
+
+
+def test_expired_blob_leaves_the_lru_set():
+    r, cache = FakeRedis(), EmbeddingCache(local_size=0, ttl=60)
+    digest = text_hash("ไฟดับ")
+    asyncio.run(cache.set_many(r, {digest: np.ones(2, dtype=np.float32)}))
+    r.strings.clear()
+    assert asyncio.run(cache.get_many(r, [digest])) == {}
+    assert digest not in r.zset
+
+
+def test_oldest_entries_are_evicted_over_max_entries():
+    r, cache = FakeRedis(), EmbeddingCache(local_size=0, ttl=3600, max_entries=2)
+    vector = np.ones(2, dtype=np.float32)
+    for digest in ("a", "b", "c"):
+        asyncio.run(cache.set_many(r, {digest: vector}))
+    assert set(r.zset) == {"b", "c"}
+    assert set(r.strings) == {"embcache:b", "embcache:c"}
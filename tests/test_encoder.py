@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.function.encoder import EncoderClient, LocalEncoderBackend
+
+
+class FlakyBackend(LocalEncoderBackend):
+    """Fails the first `failures` calls, records the batches it was given."""
+
+    def __init__(self, failures: int = 0, short: bool = False):
+        super().__init__(dimension=8)
+        self.failures = failures
+        self.short = short
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def encode(self, sentences):
+        with self._lock:
+            self.batches.append(list(sentences))
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("encoder unavailable")
+        embeddings = super().encode(sentences)
+        return embeddings[:-1] if self.short else embeddings
+
+
+def encode(client, sentences):
+    return asyncio.run(client.encode(sentences))
+
+
+def test_local_backend_is_deterministic_and_normalized():
+    backend = LocalEncoderBackend(dimension=8)
+    first, again, other = backend.encode(["ถนนเป็นหลุม", "ถนนเป็นหลุม", "ไฟดับ"])
+    assert first == again
+    assert first != other
+    assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-6)
+
+
+def test_batches_keep_input_order():
+    backend = FlakyBackend()
+    client = EncoderClient(backend, batch_size=3, max_concurrency=2, retry_backoff=0)
+    sentences = [f"ticket {i}" for i in range(10)]
+    assert encode(client, sentences) == LocalEncoderBackend(dimension=8).encode(sentences)
+    assert sorted(len(batch) for batch in backend.batches) == [1, 3, 3, 3]
+
+
+def test_failed_batches_are_retried():
+    backend = FlakyBackend(failures=2)
+    client = EncoderClient(backend, batch_size=4, max_retries=2, retry_backoff=0)
+    assert len(encode(client, ["a", "b"])) == 2
+    assert len(backend.batches) == 3
+
+
+def test_gives_up_after_max_retries():
+    backend = FlakyBackend(failures=5)
+    client = EncoderClient(backend, max_retries=1, retry_backoff=0)
+    with pytest.raises(ConnectionError):
+        encode(client, ["a"])
+    assert len(backend.batches) == 2
+
+
+def test_short_response_is_an_error():
+    client = EncoderClient(FlakyBackend(short=True), max_retries=0, retry_backoff=0)
+    with pytest.raises(ValueError):
+        encode(client, ["a", "b"])
+
+
+def test_empty_input():
+    assert encode(EncoderClient(FlakyBackend()), []) == []
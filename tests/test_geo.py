@@ -0,0 +1,77 @@
+import pytest
+
+from app.function.geo import (
+    build_filter_clause,
+    escape_tag_value,
+    haversine,
+    in_box,
+    point_in_polygon,
+    polygon_box,
+    polygon_centroid,
+)
+
+SQUARE = [[100.50, 13.70], [100.60, 13.70], [100.60, 13.80], [100.50, 13.80]]
+# concave "U" opening to the north
+U_SHAPE = [
+    [100.50, 13.70],
+    [100.60, 13.70],
+    [100.60, 13.80],
+    [100.57, 13.80],
+    [100.57, 13.74],
+    [100.53, 13.74],
+    [100.53, 13.80],
+    [100.50, 13.80],
+]
+
+
+def test_point_in_polygon():
+    assert point_in_polygon(100.55, 13.75, SQUARE)
+    assert not point_in_polygon(100.65, 13.75, SQUARE)
+    assert not point_in_polygon(100.55, 13.85, SQUARE)
+
+
+def test_point_in_polygon_accepts_closed_rings():
+    assert point_in_polygon(100.55, 13.75, SQUARE + [SQUARE[0]])
+
+
+def test_point_in_polygon_concave():
+    assert point_in_polygon(100.51, 13.78, U_SHAPE)
+    assert point_in_polygon(100.55, 13.72, U_SHAPE)
+    assert not point_in_polygon(100.55, 13.78, U_SHAPE)
+
+
+def test_in_box():
+    origin = (100.5, 13.75)
+    assert in_box(100.505, 13.75, origin, 2000, 2000)
+    assert in_box(100.5, 13.755, origin, 2000, 2000)
+    assert not in_box(100.52, 13.75, origin, 2000, 2000)
+    assert not in_box(100.5, 13.76, origin, 2000, 500)
+
+
+def test_polygon_box_covers_every_vertex():
+    origin = polygon_centroid(SQUARE)
+    assert origin == pytest.approx((100.55, 13.75))
+    width, height = polygon_box(origin, SQUARE)
+    for lon, lat in SQUARE:
+        assert in_box(lon, lat, origin, width, height)
+    assert height == pytest.approx(haversine(100.55, 13.70, 100.55, 13.80) + 1, rel=1e-6)
+
+
+def test_build_filter_clause():
+    clause = build_filter_clause({"state": ["finish", "start"], "type": ["ถนน"], "district": None})
+    assert clause == "@state:{finish | start} @type:{ถนน}"
+
+
+def test_build_filter_clause_skips_blank_values():
+    assert build_filter_clause({"state": ["", "  "], "type": []}) == ""
+    assert build_filter_clause({}) == ""
+
+
+def test_escape_tag_value():
+    assert escape_tag_value(" ถนน ") == "ถนน"
+    assert escape_tag_value("in-progress") == "in\\-progress"
+    assert escape_tag_value("a b,c|d") == "a\\ b\\,c\\|d"
+
+
+def test_build_filter_clause_escapes_values():
+    assert build_filter_clause({"district": ["บาง รัก"]}) == "@district:{บาง\\ รัก}"
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+from app.function.helper import classify_change, document_attributes, parse_timestamp
+
+
+def document(content_hash="h2", comment="ถนนเป็นหลุม", last_activity=200.0):
+    return {
+        "content_hash": content_hash,
+        "preprocess_prompt": comment,
+        "attrs": {"last_activity": last_activity},
+    }
+
+
+def stored(content_hash="h1", comment="ถนนเป็นหลุม", last_activity=100.0):
+    return {
+        "content_hash": content_hash,
+        "preprocess_prompt": comment,
+        "last_activity": last_activity,
+        "location": None,
+        "cluster_id": None,
+    }
+
+
+def test_new_ticket():
+    assert classify_change(document(), None) == "new"
+
+
+def test_same_content_is_unchanged():
+    assert classify_change(document(content_hash="h1"), stored()) == "unchanged"
+
+
+def test_older_row_is_stale():
+    assert classify_change(document(last_activity=50.0), stored()) == "stale"
+
+
+def test_changed_comment_needs_a_new_embedding():
+    assert classify_change(document(comment="ไฟดับ"), stored()) == "comment"
+    assert classify_change(document(), stored(comment=None)) == "comment"
+
+
+def test_whitespace_only_comment_change_keeps_the_embedding():
+    assert classify_change(document(comment="ถนนเป็นหลุม  "), stored()) == "fields"
+
+
+def test_metadata_change_without_last_activity():
+    assert classify_change(document(last_activity=None), stored()) == "fields"
+
+
+def test_parse_timestamp_export_format():
+    expected = datetime(2024, 2, 3, 12, 29, 5, 727076, tzinfo=timezone.utc).timestamp()
+    assert parse_timestamp("2024-02-03 12:29:05.727076+00") == expected
+
+
+def test_parse_timestamp_offsets_and_fractions():
+    noon_utc = datetime(2024, 2, 3, 12, 29, 5, tzinfo=timezone.utc).timestamp()
+    assert parse_timestamp("2024-02-03T19:29:05+07:00") == noon_utc
+    assert parse_timestamp("2024-02-03 19:29:05.5+0700") == noon_utc + 0.5
+    assert parse_timestamp("2024-02-03 19:29:05") == noon_utc + 7 * 3600
+    assert parse_timestamp("2024-02-03 12:29:05Z") == parse_timestamp("2024-02-03 12:29:05")
+
+
+def test_parse_timestamp_rejects_malformed_values():
+    for value in ("", "nan", None, "2024-02-30 12:00:00", "03/02/2024 12:00"):
+        assert parse_timestamp(value) is None
+
+
+def test_document_attributes():
+    attrs = document_attributes(
+        {
+            "type": "{ถนน, ทางเท้า,}",
+            "timestamp": "2024-02-03 12:29:05.727076+00",
+            "last_activity": "",
+            "star": "4.0",
+            "count_reopen": "nan",
+        }
+    )
+    assert attrs == {
+        "type": "ถนน,ทางเท้า",
+        "timestamp": parse_timestamp("2024-02-03 12:29:05.727076+00"),
+        "star": 4.0,
+    }
+
+
+def test_document_attributes_empty_row():
+    assert document_attributes({}) == {"type": ""}
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.function.geo import haversine
+from app.function.hybrid import fuse_result
+
+ORIGIN = (100.5, 13.75)
+
+
+def result(location, distance=0.2):
+    return SimpleNamespace(
+        similarity_score=str(distance),
+        state="start",
+        comment="ถนนเป็นหลุม",
+        type="ถนน",
+        address="",
+        district="ปทุมวัน",
+        province="กรุงเทพมหานคร",
+        subdistrict="",
+        location=location,
+    )
+
+
+def test_ticket_at_the_origin_gets_full_proximity():
+    fused = fuse_result(result("100.5,13.75"), ORIGIN, 1000, 0.7)
+    assert fused["similarity_score"] == 0.8
+    assert fused["distance"] == 0
+    assert fused["fused_score"] == pytest.approx(0.7 * 0.8 + 0.3)
+
+
+def test_proximity_falls_off_linearly_to_the_radius():
+    distance = haversine(*ORIGIN, 100.5, 13.7545)
+    fused = fuse_result(result("100.5,13.7545"), ORIGIN, 1000, 0.5)
+    assert fused["distance"] == round(distance, 2)
+    assert fused["fused_score"] == pytest.approx(0.5 * 0.8 + 0.5 * (1 - distance / 1000), abs=1e-4)
+
+
+def test_outside_the_radius_or_without_location_scores_on_similarity_only():
+    far = fuse_result(result("100.6,13.75"), ORIGIN, 1000, 0.7)
+    assert far["fused_score"] == pytest.approx(0.56)
+    missing = fuse_result(result(""), ORIGIN, 1000, 0.7)
+    assert missing["distance"] is None
+    assert missing["fused_score"] == pytest.approx(0.56)
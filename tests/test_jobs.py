@@ -0,0 +1,46 @@
+import pytest
+
+from app.function import jobs
+from app.function.jobs import decode_job
+
+
+def raw_job(**fields):
+    fields = {"state": "running", "created_at": 990, "started_at": 1000, **fields}
+    return {
+        key.encode("utf-8"): str(value).encode("utf-8")
+        for key, value in fields.items()
+        if value is not None
+    }
+
+
+@pytest.fixture
+def now(monkeypatch):
+    monkeypatch.setattr(jobs.time, "time", lambda: 1010.0)
+
+
+def test_running_job_eta_from_bytes_read(now):
+    job = decode_job(raw_job(total_bytes=400, bytes_read=100, rows_stored=50))
+    assert job["elapsed_seconds"] == 10.0
+    assert job["progress"] == 0.25
+    assert job["eta_seconds"] == 30.0
+    assert job["rows_per_second"] == 5.0
+
+
+def test_running_job_without_progress_has_no_eta(now):
+    job = decode_job(raw_job(total_bytes=400, bytes_read=0))
+    assert job["progress"] == 0.0
+    assert job["eta_seconds"] is None
+
+
+def test_finished_job(now):
+    job = decode_job(raw_job(state="completed", finished_at=1004, total_bytes=400, bytes_read=400, cancel=1))
+    assert job["elapsed_seconds"] == 4.0
+    assert job["progress"] == 1.0
+    assert job["eta_seconds"] is None
+    assert job["cancel_requested"] is True
+
+
+def test_queued_job(now):
+    job = decode_job(raw_job(state="queued", started_at=None))
+    assert job["elapsed_seconds"] is None
+    assert job["eta_seconds"] is None
@@ -0,0 +1,38 @@
+import pytest
+
+from app.function.lexicon import KumyarbLexicon
+
+
+@pytest.fixture
+def lexicon():
+    lexicon = KumyarbLexicon()
+    lexicon.load({"HIGH": ["เหี้ย", "ควาย".encode("utf-8")], "MID": ["โง่", "ควาย"], "LOW": ["บ้า", "บ้าบอ"]})
+    return lexicon
+
+
+def test_word_split_by_the_tokenizer_is_matched(lexicon):
+    meta, censored = lexicon.match(["ถนน", "เห", "ี้ย", "มาก"])
+    assert meta == [{"word_num": 1, "word": "เหี้ย", "severity": "HIGH"}]
+    assert censored == "ถนนxxxมาก"
+
+
+def test_whitespace_inside_a_split_word_is_ignored(lexicon):
+    meta, censored = lexicon.match(["เห", " ", "ี้ย"])
+    assert [m["word"] for m in meta] == ["เหี้ย"]
+    assert censored == "xxx"
+
+
+def test_longest_word_wins(lexicon):
+    meta, censored = lexicon.match(["บ้า", "บอ", "จริง"])
+    assert [m["word"] for m in meta] == ["บ้าบอ"]
+    assert censored == "xxxจริง"
+
+
+def test_word_listed_twice_keeps_its_highest_level(lexicon):
+    meta, _ = lexicon.match(["ควาย"])
+    assert meta[0]["severity"] == "HIGH"
+
+
+def test_clean_text_is_unchanged(lexicon):
+    assert lexicon.match(["ไฟ", " ", "ดับ"]) == ([], "ไฟ ดับ")
+    assert lexicon.match([]) == ([], "")
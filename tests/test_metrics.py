@@ -0,0 +1,45 @@
+from app.function.metrics import Counter, Gauge, Histogram, render_prometheus
+
+
+def rows_of(*metrics):
+    return [
+        ["intelisort_" + m.name, m.kind, m.description, getattr(m, "mode", "sum"), suffix, labels, value]
+        for m in metrics
+        for suffix, labels, value in m.samples()
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", (0.1, 1), "Latency", {"route": "/q"})
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    text = render_prometheus(rows_of(histogram))
+    assert "# TYPE intelisort_latency_seconds histogram" in text
+    assert 'intelisort_latency_seconds_bucket{route="/q",le="0.1"} 1' in text
+    assert 'intelisort_latency_seconds_bucket{route="/q",le="1"} 2' in text
+    assert 'intelisort_latency_seconds_bucket{route="/q",le="+Inf"} 3' in text
+    assert 'intelisort_latency_seconds_count{route="/q"} 3' in text
+
+
+def test_label_values_are_escaped():
+    counter = Counter("requests_total", "Requests", ("path",))
+    counter.inc('a"b\\c\nd')
+    text = render_prometheus(rows_of(counter))
+    assert 'intelisort_requests_total{path="a\\"b\\\\c\\nd"} 1' in text
+
+
+def test_workers_are_merged_by_kind_and_mode():
+    workers = []
+    for value in (1.5, 0.5):
+        counter = Counter("imports_total", "Imports", ("state",))
+        counter.inc("completed", amount=2)
+        depth = Gauge("queue_depth", "Queued chunks")
+        depth.set(3)
+        startup = Gauge("startup_seconds", "Startup", {"phase": "imports"}, mode="max")
+        startup.set(value)
+        workers += rows_of(counter, depth, startup)
+    text = render_prometheus(workers)
+    assert 'intelisort_imports_total{state="completed"} 4' in text
+    assert "intelisort_queue_depth 6" in text
+    assert 'intelisort_startup_seconds{phase="imports"} 1.5' in text
+    assert text.count("# TYPE intelisort_imports_total counter") == 1
@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.function.priority import (
+    compute_priority_scores,
+    next_priority_cursor,
+    parse_priority_cursor,
+)
+
+NOW = 1_700_000_000.0
+DAY = 24 * 3600
+
+
+def scores(**columns):
+    n = len(next(iter(columns.values())))
+    defaults = {
+        "star": [np.nan] * n,
+        "count_reopen": [0] * n,
+        "timestamp": [NOW] * n,
+        "last_activity": [NOW] * n,
+        "curse": [0] * n,
+        "neighbours": [0] * n,
+        "closed": [False] * n,
+    }
+    defaults.update(columns)
+    arrays = {k: np.asarray(v, dtype=float) for k, v in defaults.items()}
+    return compute_priority_scores(**arrays, now=NOW)
+
+
+def test_lower_star_ranks_higher():
+    low, high = scores(star=[1, 5])
+    assert low > high
+
+
+def test_more_reopens_rank_higher():
+    once, often = scores(count_reopen=[1, 6])
+    assert often > once
+
+
+def test_older_and_staler_tickets_rank_higher():
+    old, new = scores(timestamp=[NOW - 90 * DAY, NOW], last_activity=[NOW - 90 * DAY, NOW])
+    assert old > new
+
+
+def test_curse_and_density_raise_the_score():
+    plain, cursed, crowded = scores(curse=[0, 1, 0], neighbours=[0, 0, 20])
+    assert cursed > plain
+    assert crowded > plain
+
+
+def test_scores_are_positive_and_missing_values_contribute_nothing():
+    result = scores(star=[np.nan, 3], timestamp=[np.nan, NOW], last_activity=[np.nan, NOW])
+    assert np.all(result >= 0)
+    assert result[0] < result[1]
+
+
+def test_undated_tickets_rank_like_tickets_reported_now():
+    undated, today, old = scores(
+        star=[2, 2, 2],
+        timestamp=[np.nan, NOW, NOW - 365 * DAY],
+        last_activity=[np.nan, NOW, NOW - 365 * DAY],
+    )
+    assert undated == today
+    assert old - undated < 2
+
+
+def test_future_dates_do_not_lower_the_score():
+    future, today = scores(timestamp=[NOW + 30 * DAY, NOW], last_activity=[NOW + 30 * DAY, NOW])
+    assert future == today
+
+
+def test_closed_tickets_are_not_ranked():
+    open_, closed = scores(star=[1, 1], closed=[False, True])
+    assert open_ > 0
+    assert math.isnan(closed)
+
+
+def test_parse_priority_cursor():
+    assert parse_priority_cursor(None) == (None, 0)
+    assert parse_priority_cursor("138.873") == ("138.873", 0)
+    assert parse_priority_cursor("138.873:2") == ("138.873", 2)
+
+
+@pytest.mark.parametrize("cursor", ["abc", "1.5:x", "1.5:-1"])
+def test_parse_priority_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        parse_priority_cursor(cursor)
+
+
+def test_next_priority_cursor_counts_ties_of_the_last_score():
+    assert next_priority_cursor(["9", "8", "8"], 3, None, 0) == "8:2"
+    # the page continued a run of ties, the offset carries over
+    assert next_priority_cursor(["8", "8", "8"], 3, "8", 2) == "8:5"
+    assert next_priority_cursor(["8", "7", "7"], 3, "8", 2) == "7:2"
+
+
+def test_next_priority_cursor_ends_on_a_short_page():
+    assert next_priority_cursor(["9", "8"], 3, None, 0) is None
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.config.config import QUERY_CACHE_GENERATION_KEY_NAME
+from app.function.query_cache import QueryCache, query_key, round_coords
+
+
+class FakeRedis:
+    """Just enough of a client for the generation counter."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        value = self.data.get(key)
+        return None if value is None else str(value).encode("utf-8")
+
+    async def set(self, key, value, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = int(value)
+        return True
+
+    async def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+
+def run(cache, r, keys, calls):
+    async def compute(indices):
+        calls.append(indices)
+        return [f"result {i}" for i in indices]
+
+    return asyncio.run(cache.get_or_compute(r, "test", keys, compute))
+
+
+def test_repeated_queries_are_computed_once():
+    cache, r, calls = QueryCache(local_size=16, ttl=0), FakeRedis(), []
+    results = run(cache, r, ["a", "b", "a", None, None], calls)
+    assert calls == [[0, 1, 3, 4]]
+    assert results == ["result 0", "result 1", "result 0", "result 3", "result 4"]
+
+
+def test_cached_queries_skip_compute():
+    cache, r, calls = QueryCache(local_size=16, ttl=0), FakeRedis(), []
+    run(cache, r, ["a", "b"], calls)
+    results = run(cache, r, ["b", "c", "a"], calls)
+    assert calls == [[0, 1], [1]]
+    assert results == ["result 1", "result 1", "result 0"]
+    assert cache.stats()["local_hits"] == 2
+
+
+def test_a_generation_bump_drops_cached_results():
+    cache, r, calls = QueryCache(local_size=16, ttl=0), FakeRedis(), []
+    run(cache, r, ["a"], calls)
+    asyncio.run(r.incr(QUERY_CACHE_GENERATION_KEY_NAME))
+    run(cache, r, ["a"], calls)
+    assert calls == [[0], [0]]
+
+
+def test_round_coords_snaps_to_the_grid():
+    assert round_coords("100.5018234,13.7563111", precision=3) == "100.502,13.756"
+
+
+@pytest.mark.parametrize("coords", [None, "", "100.5", "a,b", "nan,13.7", "100.5,inf", "-inf,nan"])
+def test_round_coords_rejects_unusable_points(coords):
+    assert round_coords(coords) is None
+
+
+def test_query_key_depends_on_every_parameter():
+    key = query_key("distance", "100.5,13.7", 5, 600, None)
+    assert key == query_key("distance", "100.5,13.7", 5, 600, None)
+    assert key != query_key("distance", "100.5,13.7", 5, 600, ["state"])
+    assert key != query_key("distance", "100.5,13.7", 10, 600, None)
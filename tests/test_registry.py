@@ -0,0 +1,75 @@
+import asyncio
+
+from app.function.registry import iter_ticket_ids, iter_ticket_keys
+
+
+class FakeRedis:
+    """Sorted set of the ticket registry, ordered by (score, member) like redis."""
+
+    def __init__(self, scores):
+        self.scores = dict(scores)
+        self.calls = 0
+
+    async def zrangebyscore(self, key, min, max, start=None, num=None, withscores=False):
+        self.calls += 1
+        low, high = float(min), float(max)
+        rows = sorted((score, member) for member, score in self.scores.items() if low <= score <= high)
+        rows = rows[start : start + num]
+        return [(member.encode("utf-8"), score) for score, member in rows]
+
+
+def collect(r, **kwargs):
+    async def run():
+        return [batch async for batch in iter_ticket_ids(r, **kwargs)]
+
+    return asyncio.run(run())
+
+
+def flatten(batches):
+    return [ticket_id for batch in batches for ticket_id in batch]
+
+
+def test_all_ids_sharing_one_score():
+    r = FakeRedis({f"t{i}": 1.0 for i in range(5)})
+    batches = collect(r, batch_size=2)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert flatten(batches) == [f"t{i}" for i in range(5)]
+
+
+def test_ties_across_batch_boundaries():
+    scores = {"a": 1.0, "b": 2.0, "c": 2.0, "d": 2.0, "e": 2.0, "f": 3.0, "g": 3.0, "h": 4.0}
+    batches = collect(FakeRedis(scores), batch_size=3)
+    assert flatten(batches) == list("abcdefgh")
+
+
+def test_exact_multiple_of_batch_size_ends_on_empty_page():
+    r = FakeRedis({"a": 1.0, "b": 1.0, "c": 2.0, "d": 2.0})
+    assert flatten(collect(r, batch_size=2)) == list("abcd")
+    assert r.calls == 3
+
+
+def test_ids_registered_during_iteration_come_last():
+    r = FakeRedis({"a": 1.0, "b": 2.0, "c": 3.0})
+
+    async def run():
+        seen = []
+        async for batch in iter_ticket_ids(r, batch_size=2):
+            seen.extend(batch)
+            r.scores.setdefault("z", 9.0)
+        return seen
+
+    assert asyncio.run(run()) == ["a", "b", "c", "z"]
+
+
+def test_import_time_range():
+    r = FakeRedis({"a": 1.0, "b": 2.0, "c": 2.0, "d": 3.0, "e": 4.0})
+    assert flatten(collect(r, batch_size=1, start=2, stop=3)) == ["b", "c", "d"]
+
+
+def test_iter_ticket_keys():
+    r = FakeRedis({"1": 1.0, "2": 1.0})
+
+    async def run():
+        return [batch async for batch in iter_ticket_keys(r, batch_size=10)]
+
+    assert asyncio.run(run()) == [["text:1", "text:2"]]